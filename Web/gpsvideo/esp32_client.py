@@ -0,0 +1,208 @@
+# esp32_client.py - ESP32 HTTP客户端（长连接 + 熔断）
+"""
+所有轮询ESP32的地方（GPS数据保存线程、检测监控的GPS更新、连接测试）共用一个客户端：
+    - 一个 requests.Session，连接池保持长连接，不再每秒为一次请求新建TCP连接。
+      ESP32的httpd可用的socket很少，弱WiFi下三次握手又占了大部分延迟
+    - 每个接口有各自的 (连接, 读取) 超时，见 ENDPOINT_TIMEOUTS
+    - 按接口统计请求数、失败数和延迟（最近 LATENCY_WINDOW 次），以及实际新建的连接数
+    - 熔断：连续失败 failure_threshold 次后暂停请求 reset_timeout 秒（之后每次失败加倍，
+      最长 max_reset_timeout 秒），期间调用立即抛出 CircuitOpenError，不再逐个等待超时；
+      暂停结束后放行一次试探请求，成功则恢复
+
+    client = shared_client("http://192.168.4.1")   同一地址的调用方共用一个实例
+    response = client.get('/gps/json')
+
+本模块不依赖Qt。
+"""
+import time
+import threading
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 各接口的 (连接超时, 读取超时)，秒
+ENDPOINT_TIMEOUTS = {
+    '/gps/json': (1.0, 1.5),
+    '/status': (2.0, 3.0),
+    '/stream': (3.0, 5.0),
+    '/': (3.0, 3.0),
+}
+DEFAULT_TIMEOUT = (2.0, 3.0)
+POOL_SIZE = 2             # 每个设备最多保持的连接数
+LATENCY_WINDOW = 100      # 延迟统计保留的最近请求数
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT = 5.0
+MAX_RESET_TIMEOUT = 60.0
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """熔断期间的请求（按连接错误处理）"""
+
+
+class _EndpointStats:
+    __slots__ = ('requests', 'failures', 'latencies')
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def summary(self):
+        result = {'requests': self.requests, 'failures': self.failures}
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            result.update(
+                avg_ms=sum(ordered) / len(ordered) * 1000,
+                p50_ms=ordered[len(ordered) // 2] * 1000,
+                p95_ms=ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+                max_ms=ordered[-1] * 1000,
+            )
+        return result
+
+
+class ESP32Client:
+    """
+    一个ESP32设备的HTTP客户端（线程安全）
+
+    base_url 为 http://IP[:端口]；get() 返回 requests.Response，
+    网络错误照常抛出 requests 的异常，熔断期间抛出 CircuitOpenError。
+    """
+
+    def __init__(self, base_url, timeouts=None, pool_size=POOL_SIZE, failure_threshold=FAILURE_THRESHOLD,
+                 reset_timeout=RESET_TIMEOUT, max_reset_timeout=MAX_RESET_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.timeouts = dict(ENDPOINT_TIMEOUTS, **(timeouts or {}))
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self._session = requests.Session()
+        # 重试由 get() 处理（只重试一次被设备关闭的空闲连接），连接池不自动重试
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount('http://', self._adapter)
+
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._state = CLOSED
+        self._failures = 0
+        self._open_until = 0.0
+        self._backoff = reset_timeout
+        self._trial_running = False
+
+    # ---- 熔断 ----
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self._open_until:
+                return HALF_OPEN
+            return self._state
+
+    def retry_in(self):
+        """熔断剩余秒数（未熔断为0）"""
+        with self._lock:
+            return max(0.0, self._open_until - time.monotonic()) if self._state == OPEN else 0.0
+
+    def _before_request(self):
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and time.monotonic() < self._open_until:
+                raise CircuitOpenError(f"ESP32暂时不可用，{self._open_until - time.monotonic():.0f} 秒后重试")
+            # 暂停结束：只放行一个试探请求
+            if self._trial_running:
+                raise CircuitOpenError("ESP32连接恢复中")
+            self._state = HALF_OPEN
+            self._trial_running = True
+
+    def _record(self, path, latency, ok):
+        with self._lock:
+            stats = self._stats.setdefault(path, _EndpointStats())
+            stats.requests += 1
+            if ok:
+                stats.latencies.append(latency)
+                self._state, self._failures, self._backoff = CLOSED, 0, self.reset_timeout
+            else:
+                stats.failures += 1
+                self._failures += 1
+                if self._state == HALF_OPEN:
+                    self._backoff = min(self._backoff * 2, self.max_reset_timeout)
+                if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                    if self._state != OPEN:
+                        print(f"ESP32连续 {self._failures} 次请求失败，暂停 {self._backoff:.0f} 秒")
+                    self._state = OPEN
+                    self._open_until = time.monotonic() + self._backoff
+            self._trial_running = False
+
+    def reset(self):
+        """手动恢复（例如用户重新点击连接）"""
+        with self._lock:
+            self._state, self._failures, self._backoff = CLOSED, 0, self.reset_timeout
+            self._trial_running = False
+
+    # ---- 请求 ----
+
+    def get(self, path='/', timeout=None, stream=False):
+        self._before_request()
+        url = self.base_url + path
+        timeout = timeout or self.timeouts.get(path, DEFAULT_TIMEOUT)
+        started = time.perf_counter()
+        try:
+            try:
+                response = self._session.get(url, timeout=timeout, stream=stream)
+            except requests.exceptions.ConnectionError as e:
+                # 池中的空闲连接可能已被设备关闭，立即用新连接重试一次；超时不重试
+                if isinstance(e, requests.exceptions.Timeout):
+                    raise
+                response = self._session.get(url, timeout=timeout, stream=stream)
+        except requests.exceptions.RequestException:
+            self._record(path, time.perf_counter() - started, False)
+            raise
+        self._record(path, time.perf_counter() - started, response.status_code < 500)
+        return response
+
+    def get_json(self, path):
+        """GET并解析JSON；HTTP错误抛出 requests.HTTPError"""
+        response = self.get(path)
+        response.raise_for_status()
+        return response.json()
+
+    # ---- 统计 ----
+
+    def connections_opened(self):
+        """连接池实际新建过的TCP连接数"""
+        pools = self._adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def stats(self):
+        with self._lock:
+            endpoints = {path: stats.summary() for path, stats in self._stats.items()}
+        return {'state': self.state, 'connections': self.connections_opened(), 'endpoints': endpoints}
+
+    def format_stats(self):
+        stats = self.stats()
+        parts = [f"连接 {stats['connections']} 次"]
+        for path, s in stats['endpoints'].items():
+            latency = f"，平均 {s['avg_ms']:.0f} ms，p95 {s['p95_ms']:.0f} ms" if 'avg_ms' in s else ""
+            parts.append(f"{path}: {s['requests']} 次请求，失败 {s['failures']} 次{latency}")
+        return "；".join(parts)
+
+    def close(self):
+        self._session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(base_url):
+    """同一地址共用一个客户端（连接池和熔断状态也共用）"""
+    key = base_url.rstrip('/')
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = ESP32Client(key)
+        return client
@@ -0,0 +1,220 @@
+# gps_analytics.py - 轨迹统计（NumPy向量化）
+"""
+一次计算整条轨迹的统计量：每段距离、累计距离、由时间戳推算的速度、航向、
+运动/静止时间和最大速度。所有量都是几次数组运算得到的，不再逐段循环。
+
+实时轨迹使用 LiveTrackStats 逐点增量更新，汇总值的含义与 TrackStats 相同。
+压缩过停留段的轨迹（见 gps_dwell）传入每个点的停留时长，停留时间计入总时长和静止时间。
+
+本模块不依赖Qt，地图信息面板、批量处理和目录统计共用。
+"""
+import math
+import numpy as np
+
+EARTH_RADIUS = 6371000  # 地球半径（米）
+STOP_SPEED = 0.5        # 低于该速度（米/秒）的时段记为静止
+MAX_GAP = 300.0         # 相邻两点时间间隔超过该秒数视为信号中断，不计入运动/静止时间
+SECONDS_PER_DAY = 86400
+
+
+def _segments(latitude, longitude, headings=True):
+    """每段距离（米）和起始方位角（度），三角函数值在两者之间共用"""
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    if len(lat) < 2:
+        return np.empty(0), np.empty(0)
+    cos_lat = np.cos(lat)
+    d_lon = np.diff(lon)
+    a = np.sin(np.diff(lat) / 2) ** 2 + cos_lat[:-1] * cos_lat[1:] * np.sin(d_lon / 2) ** 2
+    distance = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    if not headings:
+        return distance, None
+    sin_lat = np.sin(lat)
+    y = np.sin(d_lon) * cos_lat[1:]
+    x = cos_lat[:-1] * sin_lat[1:] - sin_lat[:-1] * cos_lat[1:] * np.cos(d_lon)
+    return distance, np.degrees(np.arctan2(y, x)) % 360.0
+
+
+def segment_distances(latitude, longitude):
+    """相邻点之间的球面距离（米，Haversine公式），长度为 N-1"""
+    return _segments(latitude, longitude, headings=False)[0]
+
+
+def segment_headings(latitude, longitude):
+    """每段的起始方位角（度，正北为0，顺时针0~360），长度为 N-1"""
+    return _segments(latitude, longitude)[1]
+
+
+def segment_durations(times, dwell=None):
+    """
+    相邻点的时间间隔（秒），长度为 N-1；时间未知为NaN
+
+    只有当天秒数的时间（没有日期）跨过午夜时会倒退约一天，这里补回一天。
+    dwell 为每个点的停留时长，下一段从停留结束时算起。
+    """
+    times = np.asarray(times, dtype=np.float64)
+    if len(times) < 2:
+        return np.empty(0)
+    if dwell is None:
+        dt = np.diff(times)
+    else:
+        dt = times[1:] - (times[:-1] + np.asarray(dwell, dtype=np.float64)[:-1])
+    return np.where(dt < -SECONDS_PER_DAY / 2, dt + SECONDS_PER_DAY, dt)
+
+
+class TrackStats:
+    """
+    一条轨迹的统计结果
+
+    逐段数组（长度 N-1）:
+        segment_m    每段距离（米）
+        duration_s   每段时间间隔（秒），时间未知为NaN
+        speed_mps    每段平均速度（米/秒），无法计算时为NaN
+        heading_deg  每段航向（度）
+    逐点数组（长度 N）:
+        cumulative_m 从起点开始的累计距离（米）
+    汇总:
+        total_distance_m, elapsed_s, moving_time_s, stopped_time_s,
+        max_speed_mps, avg_speed_mps, moving_speed_mps
+        dwell_s      压缩掉的停留时间（秒），已计入 elapsed_s 和 stopped_time_s
+    """
+
+    def __init__(self, segment_m, duration_s, heading_deg, stop_speed=STOP_SPEED, max_gap=MAX_GAP,
+                 dwell_s=0.0):
+        self.segment_m = segment_m
+        self.duration_s = duration_s
+        self.heading_deg = heading_deg
+        self.cumulative_m = np.concatenate(([0.0], np.cumsum(segment_m)))
+
+        timed = np.isfinite(duration_s) & (duration_s > 0)
+        self.speed_mps = np.full(len(segment_m), np.nan)
+        np.divide(segment_m, duration_s, out=self.speed_mps, where=timed)
+
+        # 信号中断的时段既不算运动也不算静止
+        counted = timed & (duration_s <= max_gap)
+        moving = counted & (self.speed_mps >= stop_speed)
+        stopped = counted & ~moving
+
+        self.total_distance_m = float(self.cumulative_m[-1])
+        self.dwell_s = dwell_s
+        self.elapsed_s = float(duration_s[timed].sum()) + dwell_s
+        self.moving_time_s = float(duration_s[moving].sum())
+        self.stopped_time_s = float(duration_s[stopped].sum()) + dwell_s
+        self.max_speed_mps = float(self.speed_mps[counted].max()) if np.any(counted) else 0.0
+        self.avg_speed_mps = (float(segment_m[timed].sum()) / self.elapsed_s) if self.elapsed_s else 0.0
+        self.moving_speed_mps = (float(segment_m[moving].sum()) / self.moving_time_s
+                                 if self.moving_time_s else 0.0)
+
+    def summary(self):
+        """汇总值字典（可直接放入 info 或批量处理的统计）"""
+        return {
+            'distance_m': self.total_distance_m,
+            'elapsed_s': self.elapsed_s,
+            'moving_time_s': self.moving_time_s,
+            'stopped_time_s': self.stopped_time_s,
+            'max_speed_mps': self.max_speed_mps,
+            'avg_speed_mps': self.avg_speed_mps,
+            'moving_speed_mps': self.moving_speed_mps,
+        }
+
+
+class LiveTrackStats:
+    """
+    实时轨迹的增量统计
+
+    每加入一个点只与上一个点比较，耗时与轨迹长度无关；
+    summary() 的字段与 TrackStats.summary() 相同，另含点数 points。
+    """
+
+    def __init__(self, stop_speed=STOP_SPEED, max_gap=MAX_GAP):
+        self.stop_speed = stop_speed
+        self.max_gap = max_gap
+        self.points = 0
+        self.total_distance_m = 0.0
+        self.elapsed_s = 0.0
+        self.moving_time_s = 0.0
+        self.stopped_time_s = 0.0
+        self.max_speed_mps = 0.0
+        self.speed_mps = float('nan')  # 最近一段的速度
+        self._timed_m = 0.0            # 有时间间隔的各段距离之和
+        self._moving_m = 0.0
+        self._last = None
+
+    def update(self, latitude, longitude, t=None):
+        """加入一个点（十进制度，时间为秒或None），返回与上一个点的距离（米）"""
+        last, self._last = self._last, (latitude, longitude, t)
+        self.points += 1
+        if last is None:
+            return 0.0
+
+        lat1, lat2 = math.radians(last[0]), math.radians(latitude)
+        a = (math.sin((lat2 - lat1) / 2) ** 2 +
+             math.cos(lat1) * math.cos(lat2) * math.sin(math.radians(longitude - last[1]) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0)))
+        self.total_distance_m += distance
+
+        self.speed_mps = float('nan')
+        if t is None or last[2] is None:
+            return distance
+        dt = t - last[2]
+        if dt < -SECONDS_PER_DAY / 2:
+            dt += SECONDS_PER_DAY
+        if not dt > 0:
+            return distance
+        self.speed_mps = distance / dt
+        self.elapsed_s += dt
+        self._timed_m += distance
+        if dt <= self.max_gap:
+            self.max_speed_mps = max(self.max_speed_mps, self.speed_mps)
+            if self.speed_mps >= self.stop_speed:
+                self.moving_time_s += dt
+                self._moving_m += distance
+            else:
+                self.stopped_time_s += dt
+        return distance
+
+    @property
+    def avg_speed_mps(self):
+        return self._timed_m / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def moving_speed_mps(self):
+        return self._moving_m / self.moving_time_s if self.moving_time_s else 0.0
+
+    def summary(self):
+        return {
+            'points': self.points,
+            'distance_m': self.total_distance_m,
+            'elapsed_s': self.elapsed_s,
+            'moving_time_s': self.moving_time_s,
+            'stopped_time_s': self.stopped_time_s,
+            'max_speed_mps': self.max_speed_mps,
+            'avg_speed_mps': self.avg_speed_mps,
+            'moving_speed_mps': self.moving_speed_mps,
+        }
+
+
+def analyze_track(latitude, longitude, times=None, stop_speed=STOP_SPEED, max_gap=MAX_GAP, dwell=None):
+    """
+    计算轨迹统计，返回 TrackStats
+
+    latitude / longitude  十进制度数组
+    times                 每个点的时间（秒），None 表示没有时间，此时只统计距离和航向
+    dwell                 每个点的停留时长（秒，GPSColumns.dwell），None 表示没有压缩过停留段
+    """
+    segment_m, heading_deg = _segments(latitude, longitude)
+    dwell_s = 0.0
+    if times is None:
+        duration_s = np.full(len(segment_m), np.nan)
+    else:
+        duration_s = segment_durations(times, dwell)
+        if dwell is not None:
+            dwell = np.asarray(dwell, dtype=np.float64)
+            dwell_s = float(dwell[np.isfinite(dwell)].sum())
+    return TrackStats(segment_m, duration_s, heading_deg, stop_speed, max_gap, dwell_s)
+
+
+def format_duration(seconds):
+    """秒数 → H:MM:SS"""
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
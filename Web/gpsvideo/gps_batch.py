@@ -0,0 +1,135 @@
+# gps_batch.py - GPS数据目录批量处理
+"""
+用进程池并行处理整个 gps_data 目录：每个文件在子进程中解析、转换坐标并统计，
+主进程把结果按文件名排序合并为一个多轨迹结果。
+
+任务按文件大小从大到小提交，大文件先开始，各进程的负载更均衡；
+子进程只返回NumPy数组和统计数字，传输开销与点数成正比。
+原地停留的连续定位在子进程中先合并为停留点（gps_dwell），不参与转换和传输。
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from gps_columns import load_gps_columns
+from gps_coords import convert_positions
+from gps_track import TRACK_SUFFIX, load_track_columns
+from gps_catalog import FORMAT_MODES, sniff_format
+from gps_analytics import analyze_track
+from gps_dwell import compress_dwell
+
+BATCH_SUFFIXES = ('.txt', '.nmea', '.log', TRACK_SUFFIX)
+
+
+class TrackResult:
+    """单个文件的处理结果"""
+
+    def __init__(self, file_path, positions=None, stats=None, error=None):
+        self.file_path = file_path
+        self.name = os.path.basename(file_path)
+        self.positions = positions if positions is not None else np.empty((0, 2))  # 转换后的 [经度, 纬度]
+        self.stats = stats or {}
+        self.error = error
+
+
+class BatchResult:
+    """
+    整个目录的处理结果
+
+        tracks    每个文件一个 TrackResult（按文件名排序）
+        positions 所有轨迹拼接后的 (N, 2) 数组
+        offsets   第i条轨迹在 positions 中的范围为 offsets[i]:offsets[i+1]
+        summary   合计统计
+    """
+
+    def __init__(self, tracks, elapsed, workers):
+        self.tracks = tracks
+        valid = [t for t in tracks if len(t.positions)]
+        sizes = [len(t.positions) for t in tracks]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.positions = (np.concatenate([t.positions for t in valid]) if valid
+                          else np.empty((0, 2)))
+        self.summary = {
+            'files': len(tracks),
+            'failed': sum(1 for t in tracks if t.error),
+            'points': int(self.offsets[-1]),
+            'distance_m': sum(t.stats.get('distance_m', 0.0) for t in tracks),
+            'elapsed': elapsed,
+            'workers': workers,
+        }
+
+
+def process_file(file_path, conversion_mode="auto"):
+    """
+    在子进程中处理单个文件
+
+    解析方式总是按文件内容选择（二进制轨迹 / NMEA / TXT）；
+    conversion_mode 只决定坐标："no_conversion" 时保留WGS-84坐标，其他模式转换为GCJ-02
+    """
+    started = time.perf_counter()
+    try:
+        fmt = sniff_format(file_path)
+        if fmt == 'track':
+            columns = load_track_columns(file_path)
+        else:
+            columns = load_gps_columns(file_path, FORMAT_MODES[fmt])
+        columns, _ = compress_dwell(columns)
+
+        wgs84 = columns.positions
+        positions = wgs84 if conversion_mode == "no_conversion" else convert_positions(wgs84)
+
+        times = columns.time[np.isfinite(columns.time)]
+        analytics = analyze_track(columns.latitude, columns.longitude, columns.time, dwell=columns.dwell)
+        stats = {
+            'format': fmt,
+            'points': len(columns),
+            'bytes': os.path.getsize(file_path),
+            'start_time': float(times.min()) if len(times) else None,
+            'end_time': float(np.nanmax(columns.time + columns.dwell)) if len(times) else None,
+            'start_text': columns.time_display(0) if len(columns) else None,
+            'end_text': columns.time_display(len(columns) - 1) if len(columns) else None,
+            **analytics.summary(),  # 距离、运动/静止时间、速度
+            'seconds': time.perf_counter() - started,
+        }
+        return TrackResult(file_path, positions, stats)
+    except Exception as e:
+        return TrackResult(file_path, error=str(e))
+
+
+def list_batch_files(directory, suffixes=BATCH_SUFFIXES):
+    files = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(suffixes)]
+    return sorted(f for f in files if os.path.isfile(f) and os.path.getsize(f) > 0)
+
+
+def process_directory(directory, conversion_mode="auto", workers=None, progress_callback=None):
+    """
+    并行处理目录下的所有GPS文件，返回 BatchResult
+
+    progress_callback(完成数, 总数, 文件名) 在每个文件完成时调用
+    """
+    files = list_batch_files(directory)
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(files) or 1))
+    started = time.perf_counter()
+
+    results = {}
+    if workers == 1:
+        for done, path in enumerate(files, 1):
+            results[path] = process_file(path, conversion_mode)
+            if progress_callback:
+                progress_callback(done, len(files), os.path.basename(path))
+    else:
+        # 大文件先提交，避免最后只剩一个进程在处理大文件
+        ordered = sorted(files, key=os.path.getsize, reverse=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(process_file, path, conversion_mode): path for path in ordered}
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                results[path] = future.result()
+                if progress_callback:
+                    progress_callback(done, len(files), os.path.basename(path))
+
+    tracks = [results[path] for path in files]
+    return BatchResult(tracks, time.perf_counter() - started, workers)
@@ -0,0 +1,265 @@
+# gps_cache.py - GPS解析结果缓存
+"""
+缓存解析后的GPS列和转换后的坐标，切换转换模式或重新打开文件时不再重新解析。
+
+缓存键为 (路径, 文件大小, 修改时间, 解析器版本, 转换模式)：
+    - 内存中保留最近使用的若干条（LRU）
+    - 磁盘上每个 (路径, 解析器版本, 转换模式) 一个 .npz 文件，总大小超限时删除最久未用的
+文件只在末尾增长时（采集中的日志），从上次解析到的位置继续解析新增部分，
+已转换的坐标也只转换新增的点。
+"""
+import os
+import json
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from gps_columns import (GPSColumns, ParseState, PARSER_VERSION, MODE_PARSERS, parse_nmea_buffer,
+                         iter_gps_columns, load_gps_columns, merge_epochs)
+
+DEFAULT_CACHE_DIR = ".gps_cache"
+FINGERPRINT_SIZE = 4096  # 校验文件头和已解析末尾的字节数
+
+
+def _fingerprint(f, start, end):
+    """文件 [start, end) 区间的CRC32，用来确认已解析的部分没有被改写"""
+    f.seek(start)
+    return zlib.crc32(f.read(max(0, end - start)))
+
+
+def _file_fingerprints(file_path, offset):
+    with open(file_path, 'rb') as f:
+        head = _fingerprint(f, 0, min(FINGERPRINT_SIZE, offset))
+        tail = _fingerprint(f, max(0, offset - FINGERPRINT_SIZE), offset)
+    return head, tail
+
+
+def _columns_to_arrays(prefix, columns):
+    return {f"{prefix}{name}": getattr(columns, name) for name in GPSColumns.FIELDS}
+
+
+def _columns_from_arrays(prefix, data):
+    return GPSColumns(**{name: data[f"{prefix}{name}"] for name in GPSColumns.FIELDS})
+
+
+class _CacheEntry:
+    """一个文件在某个转换模式下的解析结果"""
+
+    def __init__(self, meta, completed, state, converted):
+        self.meta = meta            # 路径、大小、修改时间、版本、模式、校验值
+        self.completed = completed  # 已完整解析的记录
+        self.state = state          # 续传状态
+        self.converted = converted  # completed 对应的转换后坐标 (N, 2)
+
+    def matches(self, size, mtime_ns):
+        return self.meta['size'] == size and self.meta['mtime_ns'] == mtime_ns
+
+    def can_resume(self, file_path, size):
+        """文件只在末尾追加了数据时才能续传"""
+        meta = self.meta
+        if not meta.get('resumable') or size < meta['size']:
+            return False
+        try:
+            return _file_fingerprints(file_path, self.state.offset) == (meta['head_crc'], meta['tail_crc'])
+        except OSError:
+            return False
+
+
+class GPSParseCache:
+    """
+    解析结果缓存（线程安全）
+
+    get() 返回 (columns, positions, source)：
+        columns   GPSColumns（与 load_gps_columns 结果相同）
+        positions 经过 convert 转换后的 [经度, 纬度] 列表，convert 为None时为原始坐标
+                  （convert 接受并返回 (N, 2) 数组）
+        source    'memory' / 'disk' / 'tail'（只解析了新增部分）/ 'parse'（完整解析）
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, memory_entries=8, disk_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry_name(self, file_path, conversion_mode):
+        key = f"{os.path.abspath(file_path)}|{PARSER_VERSION}|{conversion_mode}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, file_path, conversion_mode, convert=None, progress_callback=None, stats=None):
+        st = os.stat(file_path)
+        name = self._entry_name(file_path, conversion_mode)
+
+        with self._lock:
+            entry = self._memory.get(name)
+            if entry is not None:
+                self._memory.move_to_end(name)
+        source = 'memory'
+        if entry is None:
+            entry = self._load_disk(name)
+            source = 'disk'
+
+        if entry is not None and entry.matches(st.st_size, st.st_mtime_ns):
+            if source == 'disk':
+                self._remember(name, entry)
+        else:
+            if entry is not None and entry.can_resume(file_path, st.st_size):
+                source = 'tail'
+                entry = self._parse(file_path, conversion_mode, convert, progress_callback, stats, entry)
+            else:
+                source = 'parse'
+                entry = self._parse(file_path, conversion_mode, convert, progress_callback, stats)
+            entry.meta.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+            self._remember(name, entry)
+            self._save_disk(name, entry)
+
+        columns, positions = self._display(file_path, conversion_mode, convert, entry)
+        return columns, positions, source
+
+    def _parse(self, file_path, conversion_mode, convert, progress_callback, stats, entry=None):
+        """完整解析，或在已有条目基础上只解析新增部分"""
+        if entry is not None:
+            # 复制续传状态，解析中途失败不会破坏原条目
+            old = entry.state
+            state = ParseState(old.offset, old.carry_date, old.carry_seconds, old.pending)
+            parts, converted = [entry.completed], [entry.converted]
+        else:
+            state = ParseState()
+            parts, converted = [], []
+
+        for columns, consumed, total in iter_gps_columns(file_path, conversion_mode, stats=stats, state=state):
+            parts.append(columns)
+            converted.append(_convert(convert, columns))
+            if progress_callback:
+                progress_callback(consumed, total)
+        completed = GPSColumns.concat(parts)
+        resumable = True
+
+        if entry is None and not len(completed) and not len(state.pending) and \
+                MODE_PARSERS.get(conversion_mode, parse_nmea_buffer) is parse_nmea_buffer:
+            # 语句不在行首：备用解析方法只能整体解析，不支持续传
+            completed = load_gps_columns(file_path, conversion_mode)
+            converted = [_convert(convert, completed)]
+            state = ParseState(offset=os.path.getsize(file_path))
+            resumable = False
+
+        head_crc, tail_crc = _file_fingerprints(file_path, state.offset)
+        meta = {
+            'path': os.path.abspath(file_path),
+            'version': PARSER_VERSION,
+            'mode': conversion_mode,
+            'resumable': resumable,
+            'head_crc': head_crc,
+            'tail_crc': tail_crc,
+        }
+        return _CacheEntry(meta, completed, state, np.concatenate(converted) if converted else _empty_positions())
+
+    def _display(self, file_path, conversion_mode, convert, entry):
+        """已完成的记录加上最后一个历元和文件末尾未写完的半行"""
+        state = entry.state
+        tail = state.pending
+        size = entry.meta['size']
+        if entry.meta.get('resumable') and state.offset < size:
+            with open(file_path, 'rb') as f:
+                f.seek(state.offset)
+                fragment = f.read(size - state.offset)
+            parser = MODE_PARSERS.get(conversion_mode, parse_nmea_buffer)
+            if parser is parse_nmea_buffer:
+                tail = GPSColumns.concat([tail, parse_nmea_buffer(
+                    fragment, carry_date=state.carry_date, carry_seconds=state.carry_seconds)])
+            else:
+                tail = GPSColumns.concat([tail, parser(fragment)])
+        if len(tail) and MODE_PARSERS.get(conversion_mode, parse_nmea_buffer) is parse_nmea_buffer:
+            tail = merge_epochs(tail)
+        columns = GPSColumns.concat([entry.completed, tail])
+        positions = np.concatenate([entry.converted, _convert(convert, tail)])
+        return columns, positions.tolist()
+
+    def _remember(self, name, entry):
+        with self._lock:
+            self._memory[name] = entry
+            self._memory.move_to_end(name)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _cache_path(self, name):
+        return os.path.join(self.cache_dir, f"{name}.npz")
+
+    def _load_disk(self, name):
+        path = self._cache_path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta']))
+                if meta.get('version') != PARSER_VERSION:
+                    return None
+                state = ParseState(offset=meta['offset'], carry_date=meta['carry_date'],
+                                   carry_seconds=np.nan if meta['carry_seconds'] is None else meta['carry_seconds'],
+                                   pending=_columns_from_arrays('p_', data))
+                entry = _CacheEntry(meta, _columns_from_arrays('c_', data), state, data['converted'])
+            os.utime(path)  # 更新访问时间，供LRU淘汰使用
+            return entry
+        except Exception as e:
+            print(f"读取解析缓存失败，将重新解析: {e}")
+            return None
+
+    def _save_disk(self, name, entry):
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            state = entry.state
+            meta = dict(entry.meta, offset=state.offset, carry_date=state.carry_date,
+                        carry_seconds=None if np.isnan(state.carry_seconds) else float(state.carry_seconds))
+            arrays = _columns_to_arrays('c_', entry.completed)
+            arrays.update(_columns_to_arrays('p_', state.pending))
+            # 先写临时文件再替换，写到一半被中断也不会留下损坏的缓存
+            tmp_path = self._cache_path(name) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, meta=np.array(json.dumps(meta)), converted=entry.converted, **arrays)
+            os.replace(tmp_path, self._cache_path(name))
+            self._evict_disk()
+        except Exception as e:
+            print(f"保存解析缓存失败: {e}")
+
+    def _evict_disk(self):
+        """磁盘缓存超过 disk_bytes 时删除最久未使用的文件"""
+        files = []
+        for file_name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, file_name)
+            if file_name.endswith('.npz'):
+                st = os.stat(path)
+                files.append((st.st_mtime, st.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files[:-1]:
+            if total <= self.disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if os.path.exists(self.cache_dir):
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith(('.npz', '.tmp')):
+                    os.remove(os.path.join(self.cache_dir, file_name))
+
+
+def _empty_positions():
+    return np.empty((0, 2), dtype=np.float64)
+
+
+def _convert(convert, columns):
+    """转换一批记录的坐标，返回 (N, 2) 数组"""
+    if not len(columns):
+        return _empty_positions()
+    positions = columns.positions
+    if convert is None:
+        return positions
+    return np.asarray(convert(positions), dtype=np.float64).reshape(-1, 2)
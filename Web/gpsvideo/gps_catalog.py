@@ -0,0 +1,230 @@
+# gps_catalog.py - GPS轨迹文件目录（SQLite）
+"""
+为保存的GPS数据文件维护一个SQLite目录。
+
+每个文件一行：大小、修改时间、点数、时间范围、经纬度范围、轨迹长度、行数和前20行预览。
+界面的文件列表、预览以及按区域/时间搜索都只查询这张表，不再打开文件；
+文件的新增或变化由后台线程调用 scan() 增量更新（只重新统计大小或修改时间变化的文件）。
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from gps_columns import PARSER_VERSION, load_gps_columns
+from gps_analytics import segment_distances
+from gps_track import TRACK_SUFFIX, is_track_file, read_track, load_track_columns, format_track_lines
+
+CATALOG_FILE = "catalog.sqlite"
+PREVIEW_LINES = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path        TEXT PRIMARY KEY,
+    name        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    format      TEXT,
+    point_count INTEGER,
+    line_count  INTEGER,
+    start_time  REAL,
+    end_time    REAL,
+    min_lat     REAL,
+    max_lat     REAL,
+    min_lon     REAL,
+    max_lon     REAL,
+    distance_m  REAL,
+    preview     TEXT,
+    version     INTEGER,
+    updated_at  REAL
+);
+CREATE INDEX IF NOT EXISTS tracks_time ON tracks (start_time, end_time);
+CREATE INDEX IF NOT EXISTS tracks_bbox ON tracks (min_lat, max_lat, min_lon, max_lon);
+"""
+
+_COLUMNS = ('path', 'name', 'size', 'mtime_ns', 'format', 'point_count', 'line_count',
+            'start_time', 'end_time', 'min_lat', 'max_lat', 'min_lon', 'max_lon',
+            'distance_m', 'preview', 'version', 'updated_at')
+
+
+def sniff_format(file_path):
+    """根据文件开头判断格式: 'track' / 'nmea' / 'txt'"""
+    if is_track_file(file_path):
+        return 'track'
+    with open(file_path, 'rb') as f:
+        head = f.read(4096)
+    return 'nmea' if b'$G' in head else 'txt'
+
+
+FORMAT_MODES = {'nmea': 'wgs84_to_gcj02', 'txt': 'txt_to_gcj02'}
+
+
+def track_distance(latitude, longitude):
+    """相邻点之间的球面距离之和（米）"""
+    return float(segment_distances(latitude, longitude).sum())
+
+
+def _count_lines(file_path, block_size=1024 * 1024):
+    count = 0
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            count += block.count(b'\n')
+    return count
+
+
+def text_preview(file_path, limit=PREVIEW_LINES):
+    lines = []
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            lines.append(line)
+            if len(lines) >= limit:
+                break
+    return "".join(lines)
+
+
+def summarize_file(file_path):
+    """统计单个文件，返回目录表的一行（字典）"""
+    st = os.stat(file_path)
+    fmt = sniff_format(file_path)
+    if fmt == 'track':
+        records = read_track(file_path)
+        columns = load_track_columns(file_path)
+        line_count = len(records)
+        preview = "".join(format_track_lines(records[:PREVIEW_LINES]))
+    else:
+        columns = load_gps_columns(file_path, FORMAT_MODES[fmt])
+        line_count = _count_lines(file_path)
+        preview = text_preview(file_path)
+
+    row = {
+        'path': os.path.abspath(file_path),
+        'name': os.path.basename(file_path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'format': fmt,
+        'point_count': len(columns),
+        'line_count': line_count,
+        'start_time': None, 'end_time': None,
+        'min_lat': None, 'max_lat': None, 'min_lon': None, 'max_lon': None,
+        'distance_m': 0.0,
+        'preview': preview,
+        'version': PARSER_VERSION,
+        'updated_at': time.time(),
+    }
+    if len(columns):
+        times = columns.time[np.isfinite(columns.time)]
+        if len(times):
+            row['start_time'] = float(times.min())
+            row['end_time'] = float(np.nanmax(columns.time + columns.dwell))  # 停留点按停留结束算
+        row['min_lat'] = float(columns.latitude.min())
+        row['max_lat'] = float(columns.latitude.max())
+        row['min_lon'] = float(columns.longitude.min())
+        row['max_lon'] = float(columns.longitude.max())
+        row['distance_m'] = track_distance(columns.latitude, columns.longitude)
+    return row
+
+
+class GPSCatalog:
+    """
+    GPS轨迹目录（线程安全，单个连接加锁使用）
+
+    scan() 可以在后台线程中调用；list_tracks / get / search 只查询数据库。
+    """
+
+    def __init__(self, directory="gps_data", db_path=None, suffixes=('.txt', TRACK_SUFFIX)):
+        self.directory = directory
+        self.suffixes = suffixes
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.db_path = db_path or os.path.join(directory, CATALOG_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def _list_files(self):
+        files = {}
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.suffixes):
+                st = entry.stat()
+                files[os.path.abspath(entry.path)] = (st.st_size, st.st_mtime_ns)
+        return files
+
+    def scan(self, progress_callback=None):
+        """
+        增量同步目录：新增或变化的文件重新统计，已删除的文件移出目录
+
+        返回 (更新数, 删除数)
+        """
+        files = self._list_files()
+        with self._lock:
+            known = {row['path']: (row['size'], row['mtime_ns'], row['version'])
+                     for row in self._conn.execute("SELECT path, size, mtime_ns, version FROM tracks")}
+        stale = [path for path, identity in files.items()
+                 if known.get(path) != identity + (PARSER_VERSION,)]
+        removed = [path for path in known if path not in files]
+
+        updated = 0
+        for i, path in enumerate(sorted(stale, reverse=True)):
+            try:
+                row = summarize_file(path)
+            except Exception as e:
+                print(f"统计GPS文件失败 {os.path.basename(path)}: {e}")
+                continue
+            self._upsert(row)
+            updated += 1
+            if progress_callback:
+                progress_callback(i + 1, len(stale))
+
+        if removed:
+            with self._lock, self._conn:
+                self._conn.executemany("DELETE FROM tracks WHERE path = ?", [(p,) for p in removed])
+        return updated, len(removed)
+
+    def _upsert(self, row):
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO tracks ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+                [row[name] for name in _COLUMNS])
+
+    def remove(self, file_path):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tracks WHERE path = ?", (os.path.abspath(file_path),))
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def list_tracks(self):
+        """按文件名倒序（即按时间倒序）列出所有文件"""
+        return self._query("SELECT * FROM tracks ORDER BY name DESC")
+
+    def get(self, file_path):
+        rows = self._query("SELECT * FROM tracks WHERE path = ?", (os.path.abspath(file_path),))
+        return rows[0] if rows else None
+
+    def search(self, bbox=None, time_range=None):
+        """
+        按区域和/或时间搜索
+
+        bbox       (min_lat, min_lon, max_lat, max_lon)，返回轨迹范围与之相交的文件
+        time_range (start, end)，秒，返回时间范围与之重叠的文件
+        """
+        conditions, params = [], []
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            conditions.append("max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?")
+            params += [min_lat, max_lat, min_lon, max_lon]
+        if time_range is not None:
+            conditions.append("end_time >= ? AND start_time <= ?")
+            params += list(time_range)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._query(f"SELECT * FROM tracks {where} ORDER BY name DESC", params)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,722 @@
+# gps_columns.py - GPS数据列式解析引擎
+"""
+把NMEA / 已解析TXT / 北斗原始值三类GPS文件解析为NumPy列。
+
+解析过程不再为每一行构造字典：整块文本先用预编译的正则一次性切出字段，
+再整列转换为数值。只有界面真正需要某个点的详细信息（例如弹窗）时，
+GPSColumns 才按下标临时生成与旧版解析器相同结构的字典。
+"""
+import re
+import numpy as np
+
+from gps_stream import DEFAULT_CHUNK_SIZE, iter_line_chunks
+
+# 记录类型位标志（与旧版字典中的 'type' 字段对应）
+# 同一历元合并后的记录为多个标志按位或，例如 RMC+GGA
+KIND_RMC = 1
+KIND_GGA = 2
+KIND_VTG = 4
+KIND_ZDA = 8
+KIND_TXT = 16
+KIND_RAW = 32
+KIND_BIN = 64   # 二进制遥测帧（gps_telemetry）
+KIND_NAMES = {KIND_RMC: 'RMC', KIND_GGA: 'GGA', KIND_VTG: 'VTG', KIND_ZDA: 'ZDA',
+              KIND_TXT: 'TXT', KIND_RAW: 'RAW', KIND_BIN: 'BIN'}
+KIND_POSITION = KIND_RMC | KIND_GGA
+
+# 解析器版本：解析结果的含义变化时加1，使磁盘上的解析缓存失效
+PARSER_VERSION = 4
+
+# 中国范围验证（与旧版解析器一致）
+CHINA_LAT_RANGE = (18.0, 54.0)
+CHINA_LON_RANGE = (73.0, 136.0)
+
+KNOTS_TO_MPS = 0.51444
+
+_F = rb'([^,\r\n*]*)'
+_OPT_F = rb'(?:,' + _F + rb')?'
+
+# RMC/GGA/VTG/ZDA 合并为一个正则，保证结果保持文件中的先后顺序
+# 每个分支的第一个分组捕获语句类型，用于区分分支
+NMEA_PATTERN = re.compile(
+    rb'^[ \t]*\$G[NP](?:'
+    rb'(RMC),' + b','.join([_F] * 6) + _OPT_F * 3 +
+    rb'|(GGA),' + b','.join([_F] * 9) +
+    rb'|(VTG),' + _F + rb',[^,\r\n]*,[^,\r\n]*,[^,\r\n]*,' + _F +
+    rb'|(ZDA),' + b','.join([_F] * 4) +
+    rb')',
+    re.M
+)
+
+# 已解析的.txt格式: 时间, 纬度, 经度[, 海拔, 速度, 航向, 卫星数]
+TXT_PATTERN = re.compile(
+    rb'^' + b','.join([_F] * 3) + _OPT_F * 4,
+    re.M
+)
+
+# 北斗原始值格式（与 parse_raw_gps_data 中的正则相同）
+RAW_LAT_PATTERN = re.compile(rb'(\d{4,5})\.(\d{5})')
+RAW_LON_PATTERN = re.compile(rb'(\d{5,6})\.(\d{5})')
+
+
+class GPSColumns:
+    """
+    列式GPS数据
+
+    每个字段是一个等长的NumPy数组：
+        time        浮点秒。已知日期时为Unix时间戳，否则为当天秒数
+        date        YYYYMMDD 整数，未知为0
+        latitude    纬度（十进制度）
+        longitude   经度（十进制度）
+        speed_knots 速度（节），未知为NaN
+        course      航向（度），未知为NaN
+        satellites  卫星数，未知为0
+        hdop        水平精度因子，未知为NaN
+        altitude    海拔（米），未知为NaN
+        fix_type    定位质量（GGA的质量指示，RMC有效定位记为1）
+        kind        记录来源，见 KIND_* 常量
+        raw_lat     原始度分值（仅原始数据模式），否则为NaN
+        raw_lon     同上
+        dwell       停留时长（秒），普通点为0；停留点的 time 为停留开始时间（见 gps_dwell）
+
+    作为序列使用时（len、下标、迭代）按需返回旧版解析器的字典格式。
+    """
+    FIELDS = {
+        'time': np.float64,
+        'date': np.int32,
+        'latitude': np.float64,
+        'longitude': np.float64,
+        'speed_knots': np.float64,
+        'course': np.float64,
+        'satellites': np.int16,
+        'hdop': np.float64,
+        'altitude': np.float64,
+        'fix_type': np.int8,
+        'kind': np.int8,
+        'raw_lat': np.float64,
+        'raw_lon': np.float64,
+        'dwell': np.float64,
+    }
+    DEFAULTS = {
+        'time': np.nan, 'date': 0, 'speed_knots': np.nan, 'course': np.nan,
+        'satellites': 0, 'hdop': np.nan, 'altitude': np.nan, 'fix_type': 0,
+        'kind': 0, 'raw_lat': np.nan, 'raw_lon': np.nan, 'dwell': 0.0,
+    }
+
+    def __init__(self, **columns):
+        n = len(columns['latitude'])
+        for name, dtype in self.FIELDS.items():
+            values = columns.get(name)
+            if values is None:
+                values = np.full(n, self.DEFAULTS.get(name, 0), dtype=dtype)
+            else:
+                values = np.asarray(values, dtype=dtype)
+                if len(values) != n:
+                    raise ValueError(f"列 {name} 长度 {len(values)} 与纬度列长度 {n} 不一致")
+            setattr(self, name, values)
+
+    @classmethod
+    def empty(cls):
+        return cls(latitude=np.empty(0), longitude=np.empty(0))
+
+    @classmethod
+    def concat(cls, parts):
+        """按顺序拼接多个GPSColumns"""
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        return cls(**{name: np.concatenate([getattr(p, name) for p in parts]) for name in cls.FIELDS})
+
+    def take(self, index):
+        """按布尔掩码或下标数组取子集"""
+        return GPSColumns(**{name: getattr(self, name)[index] for name in self.FIELDS})
+
+    @property
+    def positions(self):
+        """(N, 2) 数组，每行为 [经度, 纬度]（与旧版positions顺序一致）"""
+        return np.column_stack((self.longitude, self.latitude))
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) or not np.isscalar(index):
+            return self.take(index)
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError(index)
+        return self.record(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def time_display(self, i):
+        """第i个点的时间显示字符串"""
+        t = self.time[i]
+        if np.isnan(t):
+            return None
+        if self.kind[i] & KIND_TXT:
+            text = str(np.datetime64(int(round(t * 1000)), 'ms')).replace('T', ' ')
+            return text[:-4] if text.endswith('.000') else text
+        sod = int(t % 86400)
+        return f"{sod // 3600:02d}:{sod % 3600 // 60:02d}:{sod % 60:02d}"
+
+    def date_display(self, i):
+        d = int(self.date[i])
+        if not d:
+            return ""
+        return f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}"
+
+    def record(self, i):
+        """按需生成第i个点的字典（字段与旧版解析器保持一致）"""
+        kind = int(self.kind[i])
+        data = {
+            'latitude': float(self.latitude[i]),
+            'longitude': float(self.longitude[i]),
+            'type': kind_name(kind),
+        }
+        time_text = self.time_display(i)
+        if time_text is not None:
+            data['time'] = time_text
+
+        if kind & (KIND_RMC | KIND_VTG):
+            speed_knots = _nan_to_zero(self.speed_knots[i])
+            data['date'] = self.date_display(i)
+            data['speed_knots'] = speed_knots
+            data['speed_mps'] = speed_knots * KNOTS_TO_MPS
+            data['course'] = _nan_to_zero(self.course[i])
+        if kind & KIND_GGA:
+            data['satellites'] = int(self.satellites[i])
+            data['hdop'] = _nan_to_zero(self.hdop[i])
+            data['altitude'] = _nan_to_zero(self.altitude[i])
+        if kind & KIND_TXT:
+            data['altitude'] = _nan_to_zero(self.altitude[i])
+            data['speed'] = _nan_to_zero(self.speed_knots[i])
+            data['course'] = _nan_to_zero(self.course[i])
+            data['satellites'] = int(self.satellites[i])
+        if kind & KIND_RAW:
+            data['raw_lat_str'] = f"{self.raw_lat[i]:.5f}"
+            data['raw_lon_str'] = f"{self.raw_lon[i]:.5f}"
+            data['wgs84_lat'] = data['latitude']
+            data['wgs84_lon'] = data['longitude']
+        if self.dwell[i] > 0:
+            data['dwell_seconds'] = float(self.dwell[i])
+        return data
+
+
+def kind_name(kind):
+    """记录类型标志 → 'RMC' / 'RMC+GGA' 等"""
+    names = [name for flag, name in KIND_NAMES.items() if kind & flag]
+    return '+'.join(names) if names else 'UNKNOWN'
+
+
+def _nan_to_zero(value):
+    value = float(value)
+    return 0.0 if value != value else value
+
+
+def _float_column(values):
+    """bytes字段列表 → float64数组，空值或非法值为NaN"""
+    if not len(values):
+        return np.empty(0, dtype=np.float64)
+    arr = np.array(values, dtype='S32')
+    arr[arr == b''] = b'nan'
+    try:
+        return arr.astype(np.float64)
+    except ValueError:
+        # 少数损坏字段，逐个转换
+        out = np.empty(len(arr), dtype=np.float64)
+        for i, v in enumerate(arr):
+            try:
+                out[i] = float(v)
+            except ValueError:
+                out[i] = np.nan
+        return out
+
+
+def _str_len(values):
+    return np.char.str_len(np.asarray(values, dtype='S32'))
+
+
+def ddmm_to_degrees(values):
+    """度分格式 (ddmm.mmmm / dddmm.mmmm) → 十进制度，支持数组"""
+    values = np.asarray(values, dtype=np.float64)
+    degrees = np.floor(values / 100.0)
+    return degrees + (values - degrees * 100.0) / 60.0
+
+
+def hhmmss_to_seconds(values):
+    """hhmmss.sss → 当天秒数，支持数组"""
+    values = np.asarray(values, dtype=np.float64)
+    hours = np.floor(values / 10000.0)
+    minutes = np.floor(values / 100.0) % 100.0
+    return hours * 3600.0 + minutes * 60.0 + values % 100.0
+
+
+def days_from_civil(year, month, day):
+    """公历日期 → 1970-01-01 起的天数（向量化）"""
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    day = np.asarray(day, dtype=np.int64)
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    yoe = year - era * 400
+    mp = (month + 9) % 12
+    doy = (153 * mp + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _in_china(lat, lon):
+    return ((lat >= CHINA_LAT_RANGE[0]) & (lat <= CHINA_LAT_RANGE[1]) &
+            (lon >= CHINA_LON_RANGE[0]) & (lon <= CHINA_LON_RANGE[1]))
+
+
+# 十六进制字符 → 数值（非法字符为255）
+_HEX_LUT = np.full(256, 255, dtype=np.uint8)
+_HEX_LUT[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10)
+_HEX_LUT[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+_HEX_LUT[np.frombuffer(b'abcdef', dtype=np.uint8)] = np.arange(10, 16)
+
+
+def _next_position(positions, starts, size):
+    """每个起点之后第一个positions中的位置，没有则为size"""
+    positions = np.append(positions, size)
+    return positions[np.searchsorted(positions, starts)]
+
+
+def mask_bad_checksums(buffer):
+    """
+    校验窗口内每条NMEA语句的 *hh 校验和
+
+    整个窗口用前缀异或一次算出所有语句的校验值；校验失败或缺少校验和的
+    语句把开头的 '$' 替换为 '!'，这样后续正则不会匹配到它们。
+    返回 (处理后的缓冲区, 丢弃的语句数)
+    """
+    arr = np.frombuffer(buffer, dtype=np.uint8)
+    dollars = np.flatnonzero(arr == 0x24)
+    if not len(dollars):
+        return buffer, 0
+    size = len(arr)
+    stars = np.flatnonzero(arr == 0x2A)
+    newlines = np.flatnonzero(arr == 0x0A)
+
+    star = _next_position(stars, dollars, size)
+    line_end = _next_position(newlines, dollars, size)
+    has_sum = star + 2 < line_end
+    star = np.where(has_sum, star, dollars + 1)
+
+    prefix = np.bitwise_xor.accumulate(arr)
+    computed = prefix[star - 1] ^ prefix[dollars]
+    hi = _HEX_LUT[arr[np.minimum(star + 1, size - 1)]]
+    lo = _HEX_LUT[arr[np.minimum(star + 2, size - 1)]]
+    ok = has_sum & (hi < 16) & (lo < 16) & (((hi << 4) | lo) == computed)
+
+    bad = dollars[~ok]
+    if not len(bad):
+        return buffer, 0
+    masked = bytearray(buffer)
+    np.frombuffer(masked, dtype=np.uint8)[bad] = ord('!')
+    return masked, len(bad)
+
+
+def parse_nmea_buffer(buffer, anchored=True, carry_date=0, carry_seconds=np.nan,
+                      verify_checksum=True, stats=None):
+    """
+    解析一段NMEA文本（bytes），返回逐条语句的GPSColumns（未合并历元）
+
+    只保留有效的RMC/GGA定位语句以及VTG/ZDA辅助语句；VTG没有时间字段，
+    沿用它前面一条语句的时间。
+    anchored=False 时允许语句出现在行中间（备用解析方法使用）
+    carry_date / carry_seconds 为上一窗口最后的日期（YYYYMMDD）和当日秒数，
+    用于本窗口开头缺少日期的GGA和缺少时间的VTG
+    stats 字典（可选）累计 'checksum_errors' 与 'sentences'
+    """
+    dropped = 0
+    if verify_checksum:
+        buffer, dropped = mask_bad_checksums(buffer)
+    pattern = NMEA_PATTERN if anchored else _NMEA_UNANCHORED
+    matches = pattern.findall(buffer)
+    if stats is not None:
+        stats['checksum_errors'] = stats.get('checksum_errors', 0) + dropped
+        stats['sentences'] = stats.get('sentences', 0) + len(matches)
+    if not matches:
+        return GPSColumns.empty()
+
+    (t_rmc, r_time, r_status, r_lat, r_ns, r_lon, r_ew, r_speed, r_course, r_date,
+     t_gga, g_time, g_lat, g_ns, g_lon, g_ew, g_quality, g_sats, g_hdop, g_alt,
+     t_vtg, v_course, v_speed,
+     t_zda, z_time, z_day, z_month, z_year) = zip(*matches)
+
+    n = len(matches)
+    is_rmc = np.array(t_rmc) != b''
+    is_gga = np.array(t_gga) != b''
+    is_vtg = np.array(t_vtg) != b''
+    is_zda = ~(is_rmc | is_gga | is_vtg)
+    kind = (is_rmc * KIND_RMC) | (is_gga * KIND_GGA) | (is_vtg * KIND_VTG) | (is_zda * KIND_ZDA)
+
+    # 不同分支的同名字段按行合并（其余分支的分组为空字符串）
+    def pick(rmc, gga, other=None):
+        rmc = np.array(rmc, dtype='S32')
+        merged = np.where(is_gga, np.array(gga, dtype='S32'), rmc)
+        if other is not None:
+            merged = np.where(is_zda, np.array(other, dtype='S32'), merged)
+        return merged
+
+    time_s = pick(r_time, g_time, z_time)
+    lat_s = pick(r_lat, g_lat)
+    lon_s = pick(r_lon, g_lon)
+    ns = pick(r_ns, g_ns)
+    ew = pick(r_ew, g_ew)
+
+    valid = np.ones(n, dtype=bool)
+    valid[is_rmc] = np.array(r_status, dtype='S1')[is_rmc] == b'A'
+    valid[is_gga] = np.array(g_quality, dtype='S2')[is_gga] != b'0'
+    has_position = is_rmc | is_gga
+    valid &= ~has_position | ((_str_len(lat_s) >= 4) & (_str_len(lon_s) >= 5))
+
+    latitude = ddmm_to_degrees(_float_column(lat_s))
+    longitude = ddmm_to_degrees(_float_column(lon_s))
+    latitude = np.where(ns == b'S', -latitude, latitude)
+    longitude = np.where(ew == b'W', -longitude, longitude)
+    valid &= ~has_position | _in_china(latitude, longitude)
+
+    # VTG沿用前一条语句的时间
+    seconds = np.append(carry_seconds, hhmmss_to_seconds(_float_column(time_s)))
+    timed = np.where(~np.isnan(seconds), np.arange(n + 1), 0)
+    np.maximum.accumulate(timed, out=timed)
+    seconds = seconds[timed[1:]]
+
+    # 日期：RMC为ddmmyy，ZDA为 日,月,年
+    rmc_date = np.nan_to_num(_float_column(r_date), nan=0.0).astype(np.int64)
+    rmc_date[~is_rmc | (_str_len(r_date) != 6)] = 0
+    date = np.where(rmc_date > 0,
+                    (2000 + rmc_date % 100) * 10000 + rmc_date // 100 % 100 * 100 + rmc_date // 10000,
+                    0)
+    zda_date = (np.nan_to_num(_float_column(z_year), nan=0.0) * 10000 +
+                np.nan_to_num(_float_column(z_month), nan=0.0) * 100 +
+                np.nan_to_num(_float_column(z_day), nan=0.0)).astype(np.int64)
+    date = np.where(is_zda & (zda_date > 19800000), zda_date, date)
+
+    # 没有日期的语句沿用之前最近的日期
+    last = np.where(date > 0, np.arange(n), 0)
+    np.maximum.accumulate(last, out=last)
+    date = np.where(date[last] > 0, date[last], carry_date)
+    days = days_from_civil(date // 10000, date // 100 % 100, date % 100)
+    time = np.where(date > 0, days * 86400.0 + seconds, seconds)
+
+    speed = np.where(is_rmc, _float_column(r_speed), np.where(is_vtg, _float_column(v_speed), np.nan))
+    course = np.where(is_rmc, _float_column(r_course), np.where(is_vtg, _float_column(v_course), np.nan))
+
+    columns = GPSColumns(
+        time=time,
+        date=date,
+        latitude=np.where(has_position, latitude, np.nan),
+        longitude=np.where(has_position, longitude, np.nan),
+        speed_knots=speed,
+        course=course,
+        satellites=np.where(is_gga, np.nan_to_num(_float_column(g_sats), nan=0.0), 0),
+        hdop=np.where(is_gga, _float_column(g_hdop), np.nan),
+        altitude=np.where(is_gga, _float_column(g_alt), np.nan),
+        fix_type=np.where(is_gga, np.nan_to_num(_float_column(g_quality), nan=1.0), has_position),
+        kind=kind,
+    )
+    return columns.take(valid)
+
+
+def _group_pick(group, mask, values, count, default):
+    """每组取第一个满足mask的行的值，没有则为default"""
+    out = np.full(count, default, dtype=values.dtype)
+    rows = np.flatnonzero(mask)
+    if len(rows):
+        groups, first = np.unique(group[rows], return_index=True)
+        out[groups] = values[rows[first]]
+    return out
+
+
+def epoch_boundaries(columns):
+    """相邻且UTC时间相同的语句属于同一历元，返回每个历元的起始行"""
+    key = np.round(columns.time * 1000.0)
+    start = np.ones(len(key), dtype=bool)
+    start[1:] = key[1:] != key[:-1]
+    return np.flatnonzero(start)
+
+
+def merge_epochs(sentences):
+    """
+    把同一UTC时刻的RMC/GGA/VTG/ZDA语句合并为一条记录
+
+    位置优先取RMC，其次GGA；速度/航向取RMC，缺失时取VTG；
+    卫星数、HDOP、海拔和定位质量取GGA；没有位置的历元被丢弃。
+    """
+    n = len(sentences)
+    if n == 0:
+        return sentences
+    starts = epoch_boundaries(sentences)
+    count = len(starts)
+    group = np.zeros(n, dtype=np.int64)
+    group[starts[1:]] = 1
+    np.cumsum(group, out=group)
+
+    kind = sentences.kind
+    is_rmc = (kind & KIND_RMC) != 0
+    is_gga = (kind & KIND_GGA) != 0
+    is_vtg = (kind & KIND_VTG) != 0
+    has_position = is_rmc | is_gga
+    # 位置优先RMC：RMC行排在同组GGA行之前参与选取
+    pos_rank = np.where(is_rmc, 0, 1)
+    order = np.lexsort((pos_rank, group))
+    pos_rows = order[has_position[order]]
+
+    def pick(mask, values, default):
+        return _group_pick(group, mask, values, count, default)
+
+    def pick_position(values):
+        out = np.full(count, np.nan)
+        if len(pos_rows):
+            groups, first = np.unique(group[pos_rows], return_index=True)
+            out[groups] = values[pos_rows[first]]
+        return out
+
+    speed = pick(is_rmc, sentences.speed_knots, np.nan)
+    speed = np.where(np.isnan(speed), pick(is_vtg, sentences.speed_knots, np.nan), speed)
+    course = pick(is_rmc, sentences.course, np.nan)
+    course = np.where(np.isnan(course), pick(is_vtg, sentences.course, np.nan), course)
+
+    merged = GPSColumns(
+        time=sentences.time[starts],
+        date=np.maximum.reduceat(sentences.date, starts),
+        latitude=pick_position(sentences.latitude),
+        longitude=pick_position(sentences.longitude),
+        speed_knots=speed,
+        course=course,
+        satellites=pick(is_gga, sentences.satellites, 0),
+        hdop=pick(is_gga, sentences.hdop, np.nan),
+        altitude=pick(is_gga, sentences.altitude, np.nan),
+        fix_type=np.maximum(pick(is_gga, sentences.fix_type, 0), pick(is_rmc, sentences.fix_type, 0)),
+        kind=np.bitwise_or.reduceat(kind, starts),
+    )
+    return merged.take(~np.isnan(merged.latitude))
+
+
+_NMEA_UNANCHORED = re.compile(NMEA_PATTERN.pattern.replace(rb'^[ \t]*', b'', 1), re.M)
+
+
+def _txt_table(buffer):
+    """
+    快速路径：每行恰好7个字段时整体切分为 (N, 7) 表，
+    否则返回None，由正则逐字段匹配
+    """
+    lines = list(filter(None, buffer.splitlines()))
+    flat = b','.join(lines).split(b',')
+    if not lines or len(flat) != 7 * len(lines):
+        return None
+    table = np.array(flat).reshape(-1, 7)
+    try:
+        # 行间字段错位时时间字符串会落入数值列，转换失败即退回正则路径
+        numbers = table[:, 1:].astype(np.float64)
+    except ValueError:
+        return None
+    return table[:, 0], numbers.T
+
+
+def parse_txt_buffer(buffer):
+    """解析已解析的.txt文本（时间, 纬度, 经度, 海拔, 速度, 航向, 卫星数）"""
+    table = _txt_table(buffer)
+    if table is not None:
+        stamps, (latitude, longitude, altitude, speed, course, sats) = table
+    else:
+        matches = TXT_PATTERN.findall(buffer)
+        if not matches:
+            return GPSColumns.empty()
+        time_s, lat_s, lon_s, alt_s, speed_s, course_s, sats_s = zip(*matches)
+        stamps = np.array(time_s)
+        latitude = _float_column(lat_s)
+        longitude = _float_column(lon_s)
+        altitude = _float_column(alt_s)
+        speed = _float_column(speed_s)
+        course = _float_column(course_s)
+        sats = _float_column(sats_s)
+
+    valid = (latitude != 0) & (longitude != 0) & _in_china(latitude, longitude)
+    if not valid.any():
+        return GPSColumns.empty()
+
+    stamps = np.char.strip(stamps)
+    try:
+        time = stamps.astype('datetime64[ms]').astype(np.int64) / 1000.0
+    except ValueError:
+        time = np.array([_parse_stamp(t) for t in stamps], dtype=np.float64)
+    finite = np.isfinite(time)
+    days = np.where(finite, np.floor(time / 86400.0), 0).astype(np.int64).astype('datetime64[D]')
+    date = np.where(finite, _date_column(days), 0)
+
+    n = len(latitude)
+    columns = GPSColumns(
+        time=time,
+        date=date,
+        latitude=latitude,
+        longitude=longitude,
+        altitude=np.nan_to_num(altitude, nan=0.0),
+        speed_knots=np.nan_to_num(speed, nan=0.0),
+        course=np.nan_to_num(course, nan=0.0),
+        satellites=np.nan_to_num(sats, nan=0.0),
+        fix_type=np.ones(n),
+        kind=np.full(n, KIND_TXT),
+    )
+    return columns.take(valid)
+
+
+def _date_column(days):
+    """datetime64[D] 数组 → YYYYMMDD 整数数组"""
+    years = days.astype('datetime64[Y]')
+    months = days.astype('datetime64[M]')
+    year = years.astype(np.int64) + 1970
+    month = (months - years.astype('datetime64[M]')).astype(np.int64) + 1
+    day = (days - months.astype('datetime64[D]')).astype(np.int64) + 1
+    return (year * 10000 + month * 100 + day).astype(np.int32)
+
+
+def _parse_stamp(text):
+    try:
+        return np.datetime64(text.decode('ascii', 'ignore'), 'ms').astype(np.int64) / 1000.0
+    except ValueError:
+        return np.nan
+
+
+def parse_raw_buffer(buffer):
+    """解析北斗原始值文本（纬度 ddmm.mmmmm, 经度 dddmm.mmmmm）"""
+    lat_int, lat_frac, lon_int, lon_frac = [], [], [], []
+    lat_search = RAW_LAT_PATTERN.search
+    lon_search = RAW_LON_PATTERN.search
+    for line in buffer.splitlines():
+        lat_match = lat_search(line)
+        if lat_match is None:
+            continue
+        lon_match = lon_search(line)
+        if lon_match is None:
+            continue
+        lat_int.append(lat_match.group(1))
+        lat_frac.append(lat_match.group(2))
+        lon_int.append(lon_match.group(1))
+        lon_frac.append(lon_match.group(2))
+    if not lat_int:
+        return GPSColumns.empty()
+
+    raw_lat = _float_column(lat_int) + _float_column(lat_frac) / 1e5
+    raw_lon = _float_column(lon_int) + _float_column(lon_frac) / 1e5
+    latitude = ddmm_to_degrees(raw_lat)
+    longitude = ddmm_to_degrees(raw_lon)
+    n = len(latitude)
+    columns = GPSColumns(
+        latitude=latitude,
+        longitude=longitude,
+        raw_lat=raw_lat,
+        raw_lon=raw_lon,
+        fix_type=np.ones(n),
+        kind=np.full(n, KIND_RAW),
+    )
+    return columns.take(_in_china(latitude, longitude))
+
+
+# 各转换模式对应的解析器
+MODE_PARSERS = {
+    'wgs84_to_gcj02': parse_nmea_buffer,
+    'no_conversion': parse_nmea_buffer,
+    'raw_to_gcj02': parse_raw_buffer,
+    'txt_to_gcj02': parse_txt_buffer,
+}
+
+
+class ParseState:
+    """
+    可续传的分块解析状态，用于对增长中的文件只解析新增部分
+
+        offset        已解析到的文件偏移（总在完整行之后）
+        carry_date    NMEA: 最后已知日期（YYYYMMDD）
+        carry_seconds NMEA: 最后一条语句的当日秒数
+        pending       NMEA: 最后一个历元尚未合并的语句
+    """
+
+    def __init__(self, offset=0, carry_date=0, carry_seconds=np.nan, pending=None):
+        self.offset = offset
+        self.carry_date = carry_date
+        self.carry_seconds = carry_seconds
+        self.pending = pending if pending is not None else GPSColumns.empty()
+
+    def pending_epochs(self):
+        """把尚未合并的最后一个历元合并为记录（用于显示，不改变状态）"""
+        return merge_epochs(self.pending)
+
+
+def iter_gps_columns(file_path, conversion_mode='wgs84_to_gcj02', chunk_size=DEFAULT_CHUNK_SIZE,
+                     use_mmap=True, anchored=True, stats=None, state=None):
+    """
+    按固定大小的窗口逐块解析文件
+
+    yield (columns, consumed, total)，内存占用与文件大小无关。
+    NMEA文件按历元合并：每个窗口最后一个历元留到下一窗口，
+    避免同一时刻的语句被窗口边界拆成两条记录。
+
+    传入 state 时从 state.offset 开始解析并原地更新状态：末尾未写完的半行不解析，
+    最后一个历元留在 state.pending 中，不在结束时输出。
+    """
+    resumable = state is not None
+    if state is None:
+        state = ParseState()
+    chunks = iter_line_chunks(file_path, chunk_size, use_mmap, start=state.offset, complete_lines=resumable)
+
+    parser = MODE_PARSERS.get(conversion_mode, parse_nmea_buffer)
+    if parser is not parse_nmea_buffer:
+        for chunk, consumed, total in chunks:
+            state.offset = consumed
+            yield parser(chunk), consumed, total
+        return
+
+    consumed = state.offset
+    for chunk, consumed, total in chunks:
+        sentences = parse_nmea_buffer(chunk, anchored=anchored, carry_date=state.carry_date,
+                                      carry_seconds=state.carry_seconds, stats=stats)
+        if len(sentences):
+            state.carry_date = int(sentences.date[-1]) or state.carry_date
+            state.carry_seconds = sentences.time[-1] % 86400
+        sentences = GPSColumns.concat([state.pending, sentences])
+        state.offset = consumed
+        if not len(sentences):
+            yield sentences, consumed, total
+            continue
+        tail = epoch_boundaries(sentences)[-1]
+        state.pending = sentences.take(slice(tail, None))
+        yield merge_epochs(sentences.take(slice(0, tail))), consumed, total
+    if not resumable and len(state.pending):
+        yield state.pending_epochs(), consumed, consumed
+
+
+def load_gps_columns(file_path, conversion_mode='wgs84_to_gcj02', progress_callback=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, use_mmap=True, stats=None):
+    """
+    按转换模式解析整个文件，返回GPSColumns
+
+    progress_callback(consumed, total) 在每个窗口解析完成后调用，
+    参数为实际已处理的字节数
+    """
+    def collect(anchored):
+        parts = []
+        for columns, consumed, total in iter_gps_columns(
+                file_path, conversion_mode, chunk_size, use_mmap, anchored, stats):
+            parts.append(columns)
+            if progress_callback:
+                progress_callback(consumed, total)
+        return GPSColumns.concat(parts)
+
+    columns = collect(True)
+    if not len(columns) and MODE_PARSERS.get(conversion_mode, parse_nmea_buffer) is parse_nmea_buffer:
+        # 语句不在行首时使用备用解析方法
+        columns = collect(False)
+        columns = columns.take((columns.kind & KIND_RMC) != 0)
+    return columns
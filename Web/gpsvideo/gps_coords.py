@@ -0,0 +1,236 @@
+# gps_coords.py - 坐标系转换（NumPy向量化）
+"""
+WGS-84 → GCJ-02、GCJ-02 → BD-09 以及北斗原始度分值 → WGS-84 的转换公式，
+与 map.py 中 GPSCoordinateConverter 的逐点实现相同，
+但参数可以是标量也可以是数组，整条轨迹一次完成转换。
+GCJ-02 → WGS-84 没有解析公式，用迭代求逆；固定巡逻区域内可预计算偏移量网格（OffsetGrid），
+实时转换只做双线性插值。
+
+本模块不依赖Qt，可以在批量处理的子进程中使用。
+"""
+import time
+
+import numpy as np
+
+PI = 3.1415926535897932384626
+A = 6378245.0
+EE = 0.00669342162296594323
+EARTH_RADIUS = 6371000  # 地球半径（米），用于误差换算
+
+
+def out_of_china(lat, lon):
+    """判断是否在中国境外（与逐点版本的边界相同）"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return (lon < 72.004) | (lon > 137.8347) | (lat < 0.8293) | (lat > 55.8271)
+
+
+def _x_term(x):
+    """transform_lat 与 transform_lon 共有的一项，同一批点只需计算一次"""
+    return (20.0 * np.sin(6.0 * x * PI) + 20.0 * np.sin(2.0 * x * PI)) * 2.0 / 3.0
+
+
+def transform_lat(x, y, x_term=None):
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * np.sqrt(np.abs(x))
+    ret += _x_term(x) if x_term is None else x_term
+    ret += (20.0 * np.sin(y * PI) + 40.0 * np.sin(y / 3.0 * PI)) * 2.0 / 3.0
+    ret += (160.0 * np.sin(y / 12.0 * PI) + 320 * np.sin(y * PI / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def transform_lon(x, y, x_term=None):
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * np.sqrt(np.abs(x))
+    ret += _x_term(x) if x_term is None else x_term
+    ret += (20.0 * np.sin(x * PI) + 40.0 * np.sin(x / 3.0 * PI)) * 2.0 / 3.0
+    ret += (150.0 * np.sin(x / 12.0 * PI) + 300.0 * np.sin(x / 30.0 * PI)) * 2.0 / 3.0
+    return ret
+
+
+def wgs84_to_gcj02(lat, lon):
+    """WGS-84 → GCJ-02，返回 (纬度, 经度) 数组；境外的点保持不变"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    x, y = lon - 105.0, lat - 35.0
+    x_term = _x_term(x)
+    d_lat = transform_lat(x, y, x_term)
+    d_lon = transform_lon(x, y, x_term)
+    rad_lat = lat / 180.0 * PI
+    magic = np.sin(rad_lat)
+    magic = 1 - EE * magic * magic
+    sqrt_magic = np.sqrt(magic)
+    d_lat = (d_lat * 180.0) / ((A * (1 - EE)) / (magic * sqrt_magic) * PI)
+    d_lon = (d_lon * 180.0) / (A / sqrt_magic * np.cos(rad_lat) * PI)
+    outside = out_of_china(lat, lon)
+    return np.where(outside, lat, lat + d_lat), np.where(outside, lon, lon + d_lon)
+
+
+def gcj02_to_bd09(lat, lon):
+    """GCJ-02 → BD-09（百度地图），返回 (纬度, 经度) 数组"""
+    x = np.asarray(lon, dtype=np.float64)
+    y = np.asarray(lat, dtype=np.float64)
+    z = np.sqrt(x * x + y * y) + 0.00002 * np.sin(y * PI)
+    theta = np.arctan2(y, x) + 0.000003 * np.cos(x * PI)
+    return z * np.sin(theta) + 0.006, z * np.cos(theta) + 0.0065
+
+
+# 10的整数次幂，用于求整数的位数
+_POWERS_OF_TEN = 10 ** np.arange(19, dtype=np.int64)
+
+
+def str_to_gps84(int_part, frac_part):
+    """
+    北斗原始度分值 → WGS-84十进制度（与 str_To_Gps84 相同）
+
+    int_part   度分的整数部分（ddmm / dddmm，至少包含两位分），字符串或整数，可以是数组
+    frac_part  分的小数部分（至少按5位补零），字符串或整数，可以是数组
+
+    分 = 整数部分后两位 + "." + 小数部分，度 = 整数部分 // 100（向零取整），
+    负值时结果为 度 - 分/60。
+    """
+    whole = np.asarray(int_part).astype(np.int64)
+    frac = np.asarray(frac_part).astype(np.int64)
+    # 小数部分按 "%05d" 格式化后的位数
+    digits = np.maximum(np.searchsorted(_POWERS_OF_TEN, frac, side='right'), 5)
+    scale = 10.0 ** digits
+    # 整数相加后只做一次除法，与 float("mm.fffff") 的舍入结果相同
+    minutes = ((np.abs(whole) % 100) * scale + frac) / scale
+    degree = np.trunc(whole / 100.0)
+    return np.where(whole < 0, degree - minutes / 60.0, degree + minutes / 60.0)
+
+
+def convert_positions(positions):
+    """[经度, 纬度] 的 (N, 2) 数组整体转换为GCJ-02，返回同样格式的数组"""
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    lat, lon = wgs84_to_gcj02(positions[:, 1], positions[:, 0])
+    return np.column_stack((lon, lat))
+
+
+def gcj02_to_wgs84(lat, lon, tolerance=1e-10, max_iterations=30):
+    """
+    GCJ-02 → WGS-84（迭代求逆），返回 (纬度, 经度) 数组；境外的点保持不变
+
+    从 w = g 开始反复执行 w ← w - (f(w) - g)，f 为正向转换；
+    偏移量随位置变化很慢，每次迭代误差缩小约千倍，通常3~4次即收敛到 tolerance（度）以内。
+    """
+    g_lat, g_lon = np.broadcast_arrays(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64))
+    shape = g_lat.shape
+    g_lat = g_lat.ravel()
+    g_lon = g_lon.ravel()
+    w_lat = g_lat.copy()
+    w_lon = g_lon.copy()
+    active = ~out_of_china(g_lat, g_lon)
+    for _ in range(max_iterations):
+        if not np.any(active):
+            break
+        f_lat, f_lon = wgs84_to_gcj02(w_lat[active], w_lon[active])
+        d_lat = f_lat - g_lat[active]
+        d_lon = f_lon - g_lon[active]
+        w_lat[active] -= d_lat
+        w_lon[active] -= d_lon
+        # 已收敛的点不再参与下一次迭代
+        done = (np.abs(d_lat) < tolerance) & (np.abs(d_lon) < tolerance)
+        active[np.flatnonzero(active)[done]] = False
+    return w_lat.reshape(shape), w_lon.reshape(shape)
+
+
+class OffsetGrid:
+    """
+    巡逻区域内的预计算偏移量网格
+
+    在 bbox = (最小纬度, 最小经度, 最大纬度, 最大经度) 内按 step（度）取网格点，
+    预先算好每个网格点的正向偏移（GCJ-02 - WGS-84）和反向偏移（WGS-84 - GCJ-02，迭代求得），
+    之后的转换只需双线性插值，不再计算三角函数。区域外的点仍用公式计算。
+
+    偏移量的最短变化周期约为1/3度，step=0.001（约100米）时插值误差在毫米级，
+    可以用 accuracy_report() 检查。
+    """
+
+    def __init__(self, bbox, step=0.001):
+        min_lat, min_lon, max_lat, max_lon = bbox
+        self.bbox = (float(min_lat), float(min_lon), float(max_lat), float(max_lon))
+        self.step = float(step)
+        self.rows = int(np.ceil((max_lat - min_lat) / step)) + 1
+        self.cols = int(np.ceil((max_lon - min_lon) / step)) + 1
+        lat = min_lat + np.arange(self.rows) * step
+        lon = min_lon + np.arange(self.cols) * step
+        grid_lat, grid_lon = np.meshgrid(lat, lon, indexing='ij')
+        # 网格以输入坐标为节点：正向表在WGS-84坐标上取点，反向表在GCJ-02坐标上取点
+        f_lat, f_lon = wgs84_to_gcj02(grid_lat, grid_lon)
+        self.forward = np.stack((f_lat - grid_lat, f_lon - grid_lon))
+        w_lat, w_lon = gcj02_to_wgs84(grid_lat, grid_lon)
+        self.inverse = np.stack((w_lat - grid_lat, w_lon - grid_lon))
+
+    def contains(self, lat, lon):
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        return (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+
+    def _interpolate(self, table, lat, lon):
+        """对 table 做双线性插值，返回 (纬度偏移, 经度偏移)"""
+        min_lat, min_lon = self.bbox[0], self.bbox[1]
+        u = (lat - min_lat) / self.step
+        v = (lon - min_lon) / self.step
+        i = np.clip(np.floor(u).astype(np.intp), 0, self.rows - 2)
+        j = np.clip(np.floor(v).astype(np.intp), 0, self.cols - 2)
+        fu = u - i
+        fv = v - j
+        w00 = (1 - fu) * (1 - fv)
+        w01 = (1 - fu) * fv
+        w10 = fu * (1 - fv)
+        w11 = fu * fv
+        return tuple(t[i, j] * w00 + t[i, j + 1] * w01 + t[i + 1, j] * w10 + t[i + 1, j + 1] * w11
+                     for t in table)
+
+    def _convert(self, table, exact, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        inside = self.contains(lat, lon)
+        if self.rows < 2 or self.cols < 2 or not np.all(inside):
+            # 区域外的点（或网格退化时）用公式计算
+            out_lat, out_lon = exact(lat, lon)
+            out_lat = np.array(out_lat, dtype=np.float64)
+            out_lon = np.array(out_lon, dtype=np.float64)
+            if self.rows >= 2 and self.cols >= 2 and np.any(inside):
+                d_lat, d_lon = self._interpolate(table, lat[inside], lon[inside])
+                out_lat[inside] = lat[inside] + d_lat
+                out_lon[inside] = lon[inside] + d_lon
+            return out_lat, out_lon
+        d_lat, d_lon = self._interpolate(table, lat, lon)
+        return lat + d_lat, lon + d_lon
+
+    def to_gcj02(self, lat, lon):
+        """WGS-84 → GCJ-02（查表）"""
+        return self._convert(self.forward, wgs84_to_gcj02, lat, lon)
+
+    def to_wgs84(self, lat, lon):
+        """GCJ-02 → WGS-84（查表）"""
+        return self._convert(self.inverse, gcj02_to_wgs84, lat, lon)
+
+    def accuracy_report(self, samples=100000, seed=0):
+        """
+        在区域内随机取点，与迭代求逆结果比较
+
+        返回 {'max_error_m', 'mean_error_m', 'grid_points_per_s', 'iterative_points_per_s', 'samples'}
+        """
+        rng = np.random.default_rng(seed)
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        lat = rng.uniform(min_lat, max_lat, samples)
+        lon = rng.uniform(min_lon, max_lon, samples)
+
+        started = time.perf_counter()
+        ref_lat, ref_lon = gcj02_to_wgs84(lat, lon)
+        iterative_time = time.perf_counter() - started
+        started = time.perf_counter()
+        grid_lat, grid_lon = self.to_wgs84(lat, lon)
+        grid_time = time.perf_counter() - started
+
+        # 误差换算为米（局部平面近似）
+        meters_per_degree = np.pi * EARTH_RADIUS / 180.0
+        error = np.hypot((grid_lat - ref_lat) * meters_per_degree,
+                         (grid_lon - ref_lon) * meters_per_degree * np.cos(np.radians(ref_lat)))
+        return {
+            'samples': samples,
+            'max_error_m': float(error.max()),
+            'mean_error_m': float(error.mean()),
+            'grid_points_per_s': samples / grid_time if grid_time else float('inf'),
+            'iterative_points_per_s': samples / iterative_time if iterative_time else float('inf'),
+        }
@@ -0,0 +1,178 @@
+# gps_dwell.py - 停留段压缩（静止时的连续定位合并为一个点）
+"""
+狗停在原地时GPS仍按固定间隔输出定位，速度为0、坐标在几米内抖动。
+这些点在轨迹上各占一个顶点和一段距离，抖动还会被累加到总里程里。
+
+停留段的判定（采集时和读取文件时相同）：
+    从一个低速点（锚点）开始，后续点只要仍是低速、且与锚点的距离不超过 radius_m，
+    就属于同一段；第一个不满足条件的点结束该段，并作为下一段的锚点候选。
+    段内首尾时间差不少于 min_seconds 的段合并为一个停留点，否则原样保留。
+停留点取锚点的坐标和时间，停留时长记在 GPSColumns.dwell 列（秒）。
+
+    compress_dwell(columns)      读取文件后压缩（NumPy，只在低速段内逐段查找）
+    DwellCompressor().push(fix)  采集时逐点压缩，返回需要写入的记录和标志
+
+二进制轨迹中停留段保存为两条记录：FLAG_DWELL_START（锚点）和 FLAG_DWELL_END（锚点坐标、结束时间），
+读取时由 load_track_columns 合并为一个停留点。
+本模块不依赖Qt。
+"""
+import math
+import numpy as np
+
+from gps_track import FLAG_DWELL_START, FLAG_DWELL_END
+
+DWELL_RADIUS_M = 5.0          # 与锚点的距离不超过该值（米）视为原地
+DWELL_MAX_SPEED_KNOTS = 1.0   # 速度不超过该值（节）视为低速，速度未知也视为低速
+DWELL_MIN_SECONDS = 5.0       # 停留不少于该秒数才合并
+
+METERS_PER_DEGREE = math.pi * 6371000 / 180.0
+
+
+def _run_end(latitude, longitude, anchor, stop, radius_m):
+    """从锚点开始第一个距离超过 radius_m 的下标（都不超过时为 stop），窗口逐次加倍"""
+    lat0, lon0 = latitude[anchor], longitude[anchor]
+    lon_scale = math.cos(math.radians(lat0))
+    limit = (radius_m / METERS_PER_DEGREE) ** 2
+    i, window = anchor + 1, 64
+    while i < stop:
+        j = min(stop, i + window)
+        d2 = (latitude[i:j] - lat0) ** 2 + ((longitude[i:j] - lon0) * lon_scale) ** 2
+        far = np.flatnonzero(d2 > limit)
+        if len(far):
+            return i + int(far[0])
+        i, window = j, window * 2
+    return stop
+
+
+def find_dwells(time, latitude, longitude, speed_knots, dwell=None, radius_m=DWELL_RADIUS_M,
+                max_speed_knots=DWELL_MAX_SPEED_KNOTS, min_seconds=DWELL_MIN_SECONDS):
+    """
+    查找停留段，返回 (起点下标数组, 终点下标数组)，终点不含
+
+    dwell 为已有的停留时长（已压缩过的数据再次压缩时，段的结束时间按停留结束算）
+    """
+    time = np.asarray(time, dtype=np.float64)
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    end_time = time if dwell is None else time + np.asarray(dwell, dtype=np.float64)
+    slow = ~(np.asarray(speed_knots, dtype=np.float64) > max_speed_knots)
+
+    # 连续低速段之外的点不可能属于停留段，整段时长不足 min_seconds 的低速段也整段跳过
+    edges = np.diff(np.concatenate(([0], slow.astype(np.int8), [0])))
+    firsts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    long_enough = end_time[ends - 1] - time[firsts] >= min_seconds
+    starts, stops = [], []
+    for first, stop in zip(firsts[long_enough], ends[long_enough]):
+        anchor = int(first)
+        while stop - anchor >= 2:
+            end = _run_end(latitude, longitude, anchor, stop, radius_m)
+            if end - anchor >= 2 and end_time[end - 1] - time[anchor] >= min_seconds:
+                starts.append(anchor)
+                stops.append(end)
+            anchor = end
+    return np.array(starts, dtype=np.int64), np.array(stops, dtype=np.int64)
+
+
+def compress_dwell(columns, radius_m=DWELL_RADIUS_M, max_speed_knots=DWELL_MAX_SPEED_KNOTS,
+                   min_seconds=DWELL_MIN_SECONDS):
+    """
+    把停留段合并为锚点，返回 (压缩后的GPSColumns, 保留的行号数组)
+
+    保留的行号用于同步筛选已转换的坐标；没有停留段时原样返回 columns
+    """
+    starts, stops = find_dwells(columns.time, columns.latitude, columns.longitude, columns.speed_knots,
+                                columns.dwell, radius_m, max_speed_knots, min_seconds)
+    if not len(starts):
+        return columns, np.arange(len(columns))
+    end_time = columns.time + columns.dwell
+    # 每段去掉锚点之后的点：差分标记 [起点+1, 终点) 区间再累加（各段互不重叠）
+    marks = np.zeros(len(columns) + 1, dtype=np.int64)
+    marks[starts + 1] += 1
+    marks[stops] -= 1
+    keep = np.cumsum(marks[:-1]) == 0
+    dwell = columns.dwell.copy()
+    dwell[starts] = end_time[stops - 1] - columns.time[starts]
+    index = np.flatnonzero(keep)
+    compressed = columns.take(index)
+    compressed.dwell = dwell[index]
+    return compressed, index
+
+
+def dwell_summary(dwell):
+    """(停留次数, 总停留秒数)"""
+    dwell = np.asarray(dwell, dtype=np.float64)
+    stays = dwell[dwell > 0]
+    return len(stays), float(stays.sum())
+
+
+class DwellCompressor:
+    """
+    采集时的逐点停留压缩
+
+    push(fix) 返回需要写入的 [(fix, flags)]：
+        普通点原样输出（flags=0）；低速点暂存，直到能判断是否属于停留段；
+        停留满 min_seconds 时立即输出锚点（FLAG_DWELL_START），之后段内的点都丢弃，
+        停留结束时输出一条锚点坐标、最后时间的记录（FLAG_DWELL_END）。
+    fix 为字典，至少包含 time、lat、lon、speed_knots；暂存的点最多为 min_seconds 内的定位。
+    停止采集时调用 flush() 输出剩余的点。
+    """
+
+    def __init__(self, radius_m=DWELL_RADIUS_M, max_speed_knots=DWELL_MAX_SPEED_KNOTS,
+                 min_seconds=DWELL_MIN_SECONDS):
+        self.radius_m = radius_m
+        self.max_speed_knots = max_speed_knots
+        self.min_seconds = min_seconds
+        self.fixes = 0      # 输入的定位数
+        self.records = 0    # 输出的记录数
+        self._anchor = None
+        self._pending = []
+        self._last = None
+        self._dwelling = False
+
+    def _is_slow(self, fix):
+        speed = fix.get('speed_knots')
+        return speed is None or not float(speed) > self.max_speed_knots
+
+    def _near(self, fix):
+        anchor = self._anchor
+        d_lat = float(fix['lat']) - float(anchor['lat'])
+        d_lon = (float(fix['lon']) - float(anchor['lon'])) * math.cos(math.radians(float(anchor['lat'])))
+        return d_lat * d_lat + d_lon * d_lon <= (self.radius_m / METERS_PER_DEGREE) ** 2
+
+    def _close(self):
+        """结束当前段，返回需要输出的记录"""
+        if self._anchor is None:
+            return []
+        if self._dwelling:
+            out = [(dict(self._anchor, time=self._last['time']), FLAG_DWELL_END)]
+        else:
+            out = [(fix, 0) for fix in self._pending]
+        self._anchor, self._pending, self._last, self._dwelling = None, [], None, False
+        return out
+
+    def push(self, fix):
+        self.fixes += 1
+        slow = self._is_slow(fix)
+        if self._anchor is not None and slow and self._near(fix):
+            self._last = fix
+            if self._dwelling:
+                return []
+            self._pending.append(fix)
+            if float(fix['time']) - float(self._anchor['time']) < self.min_seconds:
+                return []
+            self._dwelling = True
+            self._pending = []
+            out = [(self._anchor, FLAG_DWELL_START)]
+        else:
+            out = self._close()
+            if slow:
+                self._anchor, self._pending, self._last = fix, [fix], fix
+            else:
+                out.append((fix, 0))
+        self.records += len(out)
+        return out
+
+    def flush(self):
+        out = self._close()
+        self.records += len(out)
+        return out
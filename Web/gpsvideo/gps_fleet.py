@@ -0,0 +1,500 @@
+# gps_fleet.py - 多节点GPS轮询（asyncio，单线程）
+"""
+森林中部署多个ESP32节点时，每个节点一个 GPSDataSaver 线程（阻塞请求 + time.sleep）
+既浪费线程，采样时刻又会随请求延迟逐渐漂移。这里在一个线程的事件循环中并发轮询N个节点：
+
+    - 每个节点按单调时钟上的固定时刻表采样：第k次采样的时刻为 起点 + 相位 + k×间隔，
+      下一次的时刻不依赖本次请求用了多久，不会漂移；请求超过间隔时跳过错过的时刻，不补发
+    - 各节点的相位在一个间隔内均匀错开，请求不会在同一时刻集中发出
+    - 每个节点保持一条HTTP/1.1长连接；/gps/json 每次采样都请求，/status 每 status_every 次请求一次
+    - 节点不可达时指数退避（2、4、8…个间隔，最长 max_backoff 秒），恢复后回到自己的时刻表
+    - 所有节点的结果交给同一个输出 sink(sample)，例如 TrackSink 把各节点的定位写入各自的轨迹文件
+
+可以用本地的替代节点测试（不需要真实设备）：
+    python gps_fleet.py --standin 100 --duration 30
+    python gps_fleet.py --nodes nodes.txt --out gps_data
+
+HTTP客户端只用标准库 asyncio 实现（只支持GET，够用于ESP32的httpd）。本模块不依赖Qt。
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import threading
+from collections import namedtuple, deque
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from gps_track import GPSTrackWriter, TRACK_SUFFIX, local_timestamp
+from gps_dwell import DwellCompressor
+
+POLL_INTERVAL = 1.0
+STATUS_EVERY = 10
+CONNECT_TIMEOUT = 1.0
+# 各接口的请求超时（秒，含连接）
+REQUEST_TIMEOUTS = {'/gps/json': 1.5, '/status': 3.0}
+MAX_BACKOFF = 60.0
+LATENCY_WINDOW = 100
+
+# 一次采样结果：节点名, 类型（'gps' / 'status' / 'error'）, 本地时间戳, 延迟（秒）, 数据（字典或错误信息）
+Sample = namedtuple('Sample', 'node kind time latency data')
+
+
+class NodeError(Exception):
+    """节点返回了非200状态或无法解析的数据"""
+
+
+class KeepAliveConnection:
+    """一个节点的HTTP/1.1长连接（只支持GET，请求按顺序进行）"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.host_header = host if port == 80 else f"{host}:{port}"
+        self.connections = 0   # 实际新建的TCP连接数
+        self._reader = None
+        self._writer = None
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def get(self, path, timeout, connect_timeout=CONNECT_TIMEOUT):
+        """返回 (状态码, 响应体bytes)"""
+        reused = self._writer is not None
+        try:
+            return await asyncio.wait_for(self._request(path, connect_timeout), timeout)
+        except (asyncio.TimeoutError, NodeError, ValueError):
+            self.close()
+            raise
+        except (OSError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+        # 空闲连接可能已被节点关闭，用新连接重试一次
+        try:
+            return await asyncio.wait_for(self._request(path, connect_timeout), timeout)
+        except BaseException:
+            self.close()
+            raise
+
+    async def _request(self, path, connect_timeout):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), connect_timeout)
+            self.connections += 1
+        self._writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host_header}\r\n"
+                           f"Connection: keep-alive\r\n\r\n".encode('ascii'))
+        await self._writer.drain()
+
+        reader = self._reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("节点关闭了连接")
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+            raise NodeError(f"无效的响应: {status_line[:40]!r}")
+        status = int(parts[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+
+        keep_alive = parts[0] == b'HTTP/1.1' and headers.get('connection') != 'close'
+        if headers.get('transfer-encoding') == 'chunked':
+            body = await self._read_chunked()
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        if not keep_alive:
+            self.close()
+        return status, body
+
+    async def _read_chunked(self):
+        reader = self._reader
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+            if not size:
+                # 跳过结尾的空行（及可能的trailer）
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+
+class FleetNode:
+    """一个节点的连接和统计"""
+
+    def __init__(self, name, base_url):
+        parts = urlsplit(base_url if '//' in base_url else f"http://{base_url}")
+        self.name = name
+        self.base_url = f"http://{parts.hostname}:{parts.port or 80}"
+        self.connection = KeepAliveConnection(parts.hostname, parts.port or 80)
+        self.polls = 0
+        self.failures = 0          # 累计失败次数
+        self.consecutive = 0       # 连续失败次数（决定退避时长）
+        self.skipped = 0           # 因请求过慢跳过的采样时刻
+        self.last_error = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.lateness = deque(maxlen=LATENCY_WINDOW)   # 实际开始时刻 - 计划时刻
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        return {
+            'polls': self.polls,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'connections': self.connection.connections,
+            'avg_latency_ms': sum(latencies) / len(latencies) * 1000 if latencies else None,
+            'max_lateness_ms': max(self.lateness) * 1000 if self.lateness else None,
+            'last_error': self.last_error,
+        }
+
+
+class FleetPoller:
+    """
+    在一个事件循环中轮询多个节点
+
+    nodes 为 {名称: 地址} 或地址列表（名称取 主机:端口）；sink(sample) 在事件循环线程中调用，
+    不应阻塞太久（TrackSink 的写入由 GroupCommitWriter 批量完成）。
+    在已有事件循环中 await poller.run()；在Qt等同步代码中用 start() / stop() 在后台线程运行。
+    """
+
+    def __init__(self, nodes, sink, interval=POLL_INTERVAL, status_every=STATUS_EVERY,
+                 max_backoff=MAX_BACKOFF, timeouts=None):
+        if not isinstance(nodes, dict):
+            nodes = {urlsplit(url if '//' in url else f"http://{url}").netloc: url for url in nodes}
+        self.nodes = [FleetNode(name, url) for name, url in nodes.items()]
+        self.sink = sink
+        self.interval = interval
+        self.status_every = status_every
+        self.max_backoff = max_backoff
+        self.timeouts = dict(REQUEST_TIMEOUTS, **(timeouts or {}))
+        self._loop = None
+        self._thread = None
+        self._stop_event = None
+
+    async def run(self, duration=None):
+        """轮询直到 stop() 或经过 duration 秒"""
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        start = self._loop.time()
+        count = len(self.nodes)
+        tasks = [asyncio.create_task(self._run_node(node, start + self.interval * i / count))
+                 for i, node in enumerate(self.nodes)]
+        try:
+            if duration is None:
+                await self._stop_event.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), duration)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for node in self.nodes:
+                node.connection.close()
+
+    async def _run_node(self, node, base):
+        loop = self._loop
+        interval = self.interval
+        k = 0
+        while True:
+            deadline = base + k * interval
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            node.lateness.append(max(0.0, loop.time() - deadline))
+            if await self._poll(node, k):
+                node.consecutive = 0
+                k += 1
+            else:
+                # 指数退避：2、4、8…个间隔，恢复后仍落在自己的时刻表上（相位不变）
+                node.consecutive += 1
+                backoff = min(interval * 2 ** node.consecutive, self.max_backoff)
+                k = max(k + 1, math.ceil((loop.time() + backoff - base) / interval))
+            # 请求超过间隔时跳过已错过的时刻，不补发
+            due = math.ceil((loop.time() - base) / interval)
+            if due > k:
+                node.skipped += due - k
+                k = due
+
+    async def _poll(self, node, k):
+        node.polls += 1
+        started = self._loop.time()
+        try:
+            data = await self._get_json(node, '/gps/json')
+            latency = self._loop.time() - started
+            node.latencies.append(latency)
+            self.sink(Sample(node.name, 'gps', local_timestamp(), latency, data))
+            if self.status_every and k % self.status_every == 0:
+                started = self._loop.time()
+                data = await self._get_json(node, '/status')
+                self.sink(Sample(node.name, 'status', local_timestamp(), self._loop.time() - started, data))
+            return True
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, NodeError, ValueError) as e:
+            node.failures += 1
+            node.last_error = str(e) or type(e).__name__
+            self.sink(Sample(node.name, 'error', local_timestamp(), self._loop.time() - started, node.last_error))
+            return False
+
+    async def _get_json(self, node, path):
+        status, body = await node.connection.get(path, self.timeouts.get(path, 3.0))
+        if status != 200:
+            raise NodeError(f"HTTP {status}")
+        return json.loads(body)
+
+    def stats(self):
+        """各节点统计和汇总"""
+        nodes = {node.name: node.summary() for node in self.nodes}
+        lateness = sorted(v for node in self.nodes for v in node.lateness)
+        latencies = sorted(v for node in self.nodes for v in node.latencies)
+        return {
+            'nodes': nodes,
+            'polls': sum(s['polls'] for s in nodes.values()),
+            'failures': sum(s['failures'] for s in nodes.values()),
+            'skipped': sum(s['skipped'] for s in nodes.values()),
+            'connections': sum(s['connections'] for s in nodes.values()),
+            'p50_latency_ms': latencies[len(latencies) // 2] * 1000 if latencies else None,
+            'p99_lateness_ms': lateness[int(len(lateness) * 0.99)] * 1000 if lateness else None,
+        }
+
+    # ---- 后台线程运行 ----
+
+    def start(self, duration=None):
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=asyncio.run, args=(self.run(duration),), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+class TrackSink:
+    """
+    把各节点的有效定位写入各自的轨迹文件（directory/<节点>_<时间>.gpstrk）
+
+    与 GPSDataSaver 相同：二进制定长记录，停留段只保存首尾两条记录
+    """
+
+    def __init__(self, directory="gps_data", compress_dwell=True, flush_interval=5.0, fsync_interval=30.0):
+        self.directory = directory
+        self.compress_dwell = compress_dwell
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.counts = {'gps': 0, 'invalid': 0, 'status': 0, 'error': 0}
+        self._writers = {}
+        self._compressors = {}
+        self._stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(directory, exist_ok=True)
+
+    def file_path(self, node):
+        safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in node)
+        return os.path.join(self.directory, f"{safe}_{self._stamp}{TRACK_SUFFIX}")
+
+    def __call__(self, sample):
+        if sample.kind != 'gps':
+            self.counts[sample.kind] += 1
+            return
+        data = sample.data
+        if not data.get('valid', False):
+            self.counts['invalid'] += 1
+            return
+        self.counts['gps'] += 1
+        writer = self._writers.get(sample.node)
+        if writer is None:
+            writer = self._writers[sample.node] = GPSTrackWriter(
+                self.file_path(sample.node), flush_interval=self.flush_interval,
+                fsync_interval=self.fsync_interval)
+            self._compressors[sample.node] = DwellCompressor() if self.compress_dwell else None
+        fix = {
+            'time': sample.time,
+            'lat': data.get('lat', 0), 'lon': data.get('lon', 0),
+            'altitude': data.get('altitude', 0), 'speed_knots': data.get('speed_knots', 0),
+            'course': data.get('course', 0), 'satellites': data.get('satellites', 0),
+        }
+        compressor = self._compressors[sample.node]
+        self._write(writer, compressor.push(fix) if compressor else [(fix, 0)])
+
+    @staticmethod
+    def _write(writer, records):
+        for fix, flags in records:
+            writer.append(fix['time'], fix['lat'], fix['lon'], fix['altitude'],
+                          fix['speed_knots'], fix['course'], fix['satellites'], flags)
+
+    def close(self):
+        for node, writer in self._writers.items():
+            compressor = self._compressors.get(node)
+            if compressor:
+                self._write(writer, compressor.flush())
+            writer.close()
+        self._writers.clear()
+
+
+# ---- 本地替代节点（测试用） ----
+
+class StandInNode:
+    """
+    模拟ESP32的 /gps/json 和 /status（HTTP/1.1长连接）
+
+    delay 为每次响应前的延迟（秒）；down 为True时接受连接后立即关闭
+    """
+
+    def __init__(self, index, center=(39.9590, 116.3500), delay=0.0):
+        self.index = index
+        self.center = center
+        self.delay = delay
+        self.down = False
+        self.requests = 0
+        self.connections = 0
+        self.server = None
+        self.port = None
+        self._writers = set()
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self._handle, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return f"http://{host}:{self.port}"
+
+    def _gps(self):
+        # 以节点编号决定方位，绕中心点缓慢转圈
+        t = time.time() / 60.0 + self.index
+        return {
+            'valid': True,
+            'lat': self.center[0] + 0.001 * math.sin(t) + 0.0001 * self.index,
+            'lon': self.center[1] + 0.001 * math.cos(t),
+            'altitude': 50.0, 'speed_knots': 1.5, 'course': (t * 57.3) % 360, 'satellites': 9,
+        }
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while not self.down:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                self.requests += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                path = request_line.split()[1].decode('ascii', 'replace')
+                if path == '/gps/json':
+                    status, body = 200, json.dumps(self._gps()).encode()
+                elif path == '/status':
+                    status, body = 200, json.dumps({'node': self.index, 'uptime': time.monotonic()}).encode()
+                else:
+                    status, body = 404, b'{}'
+                writer.write(f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self.server.wait_closed()
+
+
+def read_node_list(text):
+    """'名称 地址' 或 '地址' 每行一个（# 开头为注释），也接受逗号分隔的地址"""
+    nodes = {}
+    if os.path.exists(text):
+        with open(text, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    else:
+        lines = text.split(',')
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        name, _, url = line.rpartition(' ')
+        nodes[name.strip() or urlsplit(url if '//' in url else f"http://{url}").netloc] = url
+    return nodes
+
+
+async def _main(args):
+    standins = []
+    if args.standin:
+        nodes = {}
+        for i in range(args.standin):
+            node = StandInNode(i, delay=args.standin_delay)
+            nodes[f"standin{i:03d}"] = await node.start()
+            standins.append(node)
+    else:
+        nodes = read_node_list(args.nodes)
+    if not nodes:
+        print("没有节点")
+        return 1
+
+    sink = TrackSink(args.out) if args.out else (lambda sample: None)
+    poller = FleetPoller(nodes, sink, interval=args.interval, status_every=args.status_every,
+                         max_backoff=args.max_backoff)
+    print(f"轮询 {len(nodes)} 个节点，间隔 {args.interval} 秒" +
+          (f"，运行 {args.duration} 秒" if args.duration else "，Ctrl+C 停止"))
+    started = time.perf_counter()
+    try:
+        await poller.run(args.duration)
+    finally:
+        if isinstance(sink, TrackSink):
+            sink.close()
+        for node in standins:
+            await node.close()
+    elapsed = time.perf_counter() - started
+    stats = poller.stats()
+    print(f"{elapsed:.1f} 秒内采样 {stats['polls']} 次，失败 {stats['failures']} 次，跳过 {stats['skipped']} 个时刻，"
+          f"新建连接 {stats['connections']} 个")
+    if stats['p50_latency_ms'] is not None:
+        print(f"延迟中位数 {stats['p50_latency_ms']:.1f} ms，采样时刻偏差 p99 {stats['p99_lateness_ms']:.1f} ms")
+    for name, s in stats['nodes'].items():
+        if s['failures']:
+            print(f"  {name}: 失败 {s['failures']} 次，最后错误: {s['last_error']}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='多节点GPS轮询（asyncio）')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--nodes', help='节点列表文件（每行 "名称 地址"），或逗号分隔的地址')
+    source.add_argument('--standin', type=int, help='启动N个本地替代节点并轮询它们（测试用）')
+    parser.add_argument('--standin-delay', type=float, default=0.0, help='替代节点的响应延迟（秒）')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help='采样间隔（秒）')
+    parser.add_argument('--status-every', type=int, default=STATUS_EVERY, help='每多少次采样请求一次 /status')
+    parser.add_argument('--max-backoff', type=float, default=MAX_BACKOFF)
+    parser.add_argument('--duration', type=float, help='运行秒数（默认一直运行）')
+    parser.add_argument('--out', help='把有效定位写入该目录下各节点的轨迹文件')
+    args = parser.parse_args(argv)
+    try:
+        return asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
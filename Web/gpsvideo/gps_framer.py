@@ -0,0 +1,225 @@
+# gps_framer.py - 增量字节分帧器
+"""
+接收程序共用的分帧组件：socket / HTTP 收到的字节块追加到 bytearray 缓冲区，
+按分隔符（\n、#）或起止标记（MJPEG的JPEG帧）切出完整记录交给回调。
+
+旧代码把每个数据块解码后拼接到 str 缓冲区，再用 split / 切片取出一行，
+缓冲区中每多一条记录就要整体复制一次，突发数据下是平方复杂度。这里：
+    - 只追加不复制，已处理的前缀累积到一定大小后一次性删除
+    - 查找分隔符从上次查找结束的位置继续，不重复扫描
+    - 记录以 memoryview 交给回调，不复制；记录类型直接在字节上判断
+
+回调收到的 memoryview 只在回调期间有效，需要保留时请转换为 bytes 或使用 record.text。
+本模块不依赖Qt。
+"""
+import re
+
+# 记录类型
+KIND_GPS = 'gps'        # $GPS,...   ESP32转发的GPS数据包
+KIND_FACE = 'face'      # $FACE,...  人脸检测结果
+KIND_NMEA = 'nmea'      # $GPRMC / $GNGGA 等NMEA语句
+KIND_PACKET = 'packet'  # 其他以$开头的数据包
+KIND_JSON = 'json'      # {...} 或 "{...}"
+KIND_TEXT = 'text'      # 调试信息、AT指令响应等
+KIND_BINARY = 'binary'  # 定长二进制遥测帧（见 gps_telemetry.TelemetryFramer）
+
+COMPACT_SIZE = 64 * 1024          # 已处理前缀超过该大小时删除
+MAX_RECORD = 1024 * 1024          # 找不到分隔符的数据超过该大小时丢弃
+_WHITESPACE = b' \t\r\n\x00'
+_NMEA_HEAD = re.compile(rb'\$[A-Z]{5},')
+
+
+def classify(buffer, start, end):
+    """判断 buffer[start:end] 的记录类型（不复制数据）"""
+    if buffer.startswith(b'$', start, end):
+        if buffer.startswith(b'$GPS,', start, end):
+            return KIND_GPS
+        if buffer.startswith(b'$FACE,', start, end):
+            return KIND_FACE
+        if _NMEA_HEAD.match(buffer, start, end):
+            return KIND_NMEA
+        return KIND_PACKET
+    if buffer.startswith((b'{', b'"{'), start, end):
+        return KIND_JSON
+    return KIND_TEXT
+
+
+class Record:
+    """一条完整记录：类型、数据（memoryview）、结束分隔符"""
+
+    __slots__ = ('kind', 'data', 'delimiter', '_text')
+
+    def __init__(self, kind, data, delimiter=None):
+        self.kind = kind
+        self.data = data
+        self.delimiter = delimiter
+        self._text = None
+
+    @property
+    def text(self):
+        """解码后的文本；以#结束的数据包保留末尾的#（与原始日志格式一致）"""
+        if self._text is None:
+            text = str(self.data, 'utf-8', errors='ignore')
+            self._text = text + '#' if self.delimiter == b'#' else text
+        return self._text
+
+    @property
+    def fields(self):
+        """去掉首尾的$和#后按逗号分割的字段"""
+        return self.text.strip('$#').split(',')
+
+    def __len__(self):
+        return len(self.data)
+
+
+class _ByteFramer:
+    """缓冲区管理：追加、压缩、超长数据丢弃"""
+
+    def __init__(self, max_record=MAX_RECORD):
+        self.max_record = max_record
+        self._buffer = bytearray()
+        self._start = 0   # 未处理数据的起点
+        self._scan = 0    # 下一次查找的起点
+        self.stats = {'bytes': 0, 'records': 0, 'dropped_bytes': 0, 'compactions': 0}
+
+    def _append(self, data):
+        try:
+            if self._start and (self._start >= COMPACT_SIZE or self._start * 2 >= len(self._buffer)):
+                del self._buffer[:self._start]
+                self._scan -= self._start
+                self._start = 0
+                self.stats['compactions'] += 1
+            self._buffer += data
+        except BufferError:
+            # 回调保留了记录的 memoryview，缓冲区不能改变大小：换一个新的缓冲区
+            self._buffer = bytearray(memoryview(self._buffer)[self._start:]) + data
+            self._scan -= self._start
+            self._start = 0
+        self.stats['bytes'] += len(data)
+
+    def _check_overflow(self):
+        """未找到记录结尾的数据过长时（数据错乱）丢弃，避免缓冲区无限增长"""
+        pending = len(self._buffer) - self._start
+        if pending > self.max_record:
+            self.stats['dropped_bytes'] += pending
+            self._start = self._scan = len(self._buffer)
+
+    @property
+    def pending(self):
+        """缓冲区中尚未组成完整记录的字节数"""
+        return len(self._buffer) - self._start
+
+    def reset(self):
+        self._buffer = bytearray()
+        self._start = self._scan = 0
+
+
+class PacketFramer(_ByteFramer):
+    """
+    文本数据包分帧器
+
+    delimiters  记录分隔符（每个字节都是一个分隔符），默认 \n 和 #，
+                以先出现的为准；记录首尾的空白字符被去掉，空记录忽略
+    callback    callback(record) 处理所有记录
+    handlers    {记录类型: callback}，优先于 callback
+
+    feed(data) 追加一个字节块并分发其中所有完整的记录，返回记录数。
+    """
+
+    def __init__(self, callback=None, handlers=None, delimiters=b'\n#', max_record=MAX_RECORD):
+        super().__init__(max_record)
+        self.callback = callback
+        self.handlers = dict(handlers or {})
+        self._pattern = re.compile(b'[' + re.escape(delimiters) + b']')
+
+    def feed(self, data):
+        count = 0
+        for record in self.records(data):
+            handler = self.handlers.get(record.kind, self.callback)
+            if handler is not None:
+                handler(record)
+            count += 1
+        return count
+
+    def records(self, data):
+        """追加字节块，逐条生成其中完整的记录"""
+        if data:
+            self._append(data)
+        buffer = self._buffer
+        view = memoryview(buffer)
+        stats = self.stats
+        try:
+            for match in self._pattern.finditer(buffer, self._scan):
+                end = match.start()
+                start = self._start
+                self._start = self._scan = end + 1
+                # 去掉首尾空白（只移动边界）
+                while start < end and buffer[start] in _WHITESPACE:
+                    start += 1
+                while end > start and buffer[end - 1] in _WHITESPACE:
+                    end -= 1
+                if start == end:
+                    continue
+                stats['records'] += 1
+                yield Record(classify(buffer, start, end), view[start:end], match.group())
+            self._scan = len(buffer)
+            self._check_overflow()
+        finally:
+            view.release()
+
+    def flush(self):
+        """连接关闭时取出缓冲区中没有分隔符结尾的最后一条记录"""
+        count = self.feed(b'\n' if self.pending else b'')
+        self.reset()
+        return count
+
+
+class MarkerFramer(_ByteFramer):
+    """
+    起止标记分帧器（例如MJPEG流中的JPEG帧：FF D8 ... FF D9）
+
+    生成的记录包含起止标记本身；起始标记之前的数据丢弃。
+    """
+
+    def __init__(self, start_marker=b'\xff\xd8', end_marker=b'\xff\xd9', max_record=8 * MAX_RECORD):
+        super().__init__(max_record)
+        self.start_marker = start_marker
+        self.end_marker = end_marker
+        self._in_frame = False
+
+    def frames(self, data):
+        """追加字节块，逐个生成其中完整的帧（memoryview）"""
+        if data:
+            self._append(data)
+        buffer = self._buffer
+        view = memoryview(buffer)
+        try:
+            while True:
+                if not self._in_frame:
+                    start = buffer.find(self.start_marker, self._scan)
+                    if start < 0:
+                        # 标记可能跨越两个数据块，保留末尾不足一个标记长度的字节
+                        self._start = self._scan = max(self._start, len(buffer) - len(self.start_marker) + 1)
+                        return
+                    self._start = start
+                    self._scan = start + len(self.start_marker)
+                    self._in_frame = True
+                end = buffer.find(self.end_marker, self._scan)
+                if end < 0:
+                    self._scan = max(self._scan, len(buffer) - len(self.end_marker) + 1)
+                    self._check_overflow()
+                    if self._start == len(buffer):
+                        self._in_frame = False
+                    return
+                end += len(self.end_marker)
+                start = self._start
+                self._start = self._scan = end
+                self._in_frame = False
+                self.stats['records'] += 1
+                yield view[start:end]
+        finally:
+            view.release()
+
+    def reset(self):
+        super().reset()
+        self._in_frame = False
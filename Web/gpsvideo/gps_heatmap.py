@@ -0,0 +1,219 @@
+# gps_heatmap.py - 网格热力图（NumPy按格累加）
+"""
+把定位点和检测事件按网格累加计数，渲染成一张半透明PNG，作为地图上的图片图层。
+
+地图上不再为每个点或每次检测单独放一个标记：无论累加了多少事件，
+页面中只有一张图片和它的经纬度范围，大小只与网格的行列数有关。
+    heatmap = GridHeatmap.covering(lat, lon)    按数据范围建立网格（或 GridHeatmap(bbox) 指定巡逻区域）
+    heatmap.add(lat, lon)                        增量累加（单点或数组），区域外的点只计数不累加
+    heatmap.overlay('轨迹热力图')                 轨迹文档中的图片图层（PNG内嵌为data URI）
+
+网格按经纬度等间隔划分，图片在地图上按矩形范围拉伸显示；
+巡逻区域只有几公里时，与Web墨卡托投影之间的形变可以忽略。
+本模块不依赖Qt，PNG编码只用 zlib。
+"""
+import os
+import copy
+import json
+import zlib
+import glob
+import base64
+import struct
+import numpy as np
+
+EARTH_RADIUS = 6371000   # 地球半径（米）
+CELL_METERS = 5.0        # 默认网格边长（米）
+MAX_CELLS_PER_SIDE = 512 # 每边最多的格数，区域较大时自动加大格子
+MARGIN_METERS = 50.0     # 按数据范围建立网格时四周留出的距离（米）
+
+# 颜色渐变（强度 0~1 → RGB），与常见的Leaflet热力图配色一致
+_GRADIENT_STOPS = np.array([0.0, 0.25, 0.5, 0.75, 1.0])
+_GRADIENT_RGB = np.array([
+    [0, 0, 255],
+    [0, 255, 255],
+    [0, 255, 0],
+    [255, 255, 0],
+    [255, 0, 0],
+], dtype=np.float64)
+
+
+def _meters_per_degree(latitude):
+    """(每度纬度的米数, 每度经度的米数)"""
+    meters = np.pi * EARTH_RADIUS / 180.0
+    return meters, meters * np.cos(np.radians(latitude))
+
+
+def encode_png(rgba):
+    """(H, W, 4) uint8 数组 → PNG字节"""
+    height, width = rgba.shape[:2]
+    # 每行前加一个过滤类型字节（0 = 不过滤）
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)) + chunk(b'IEND', b''))
+
+
+class GridHeatmap:
+    """
+    巡逻区域的网格热力图
+
+    bbox = (最小纬度, 最小经度, 最大纬度, 最大经度)，cell_m 为网格边长（米），
+    区域较大时格子自动放大，使每边不超过 max_cells 格。
+    counts 为 (行, 列) 的计数数组，第0行是最南一行。
+    """
+
+    def __init__(self, bbox, cell_m=CELL_METERS, max_cells=MAX_CELLS_PER_SIDE):
+        min_lat, min_lon, max_lat, max_lon = (float(v) for v in bbox)
+        lat_m, lon_m = _meters_per_degree((min_lat + max_lat) / 2)
+        cell_m = max(cell_m, (max_lat - min_lat) * lat_m / max_cells, (max_lon - min_lon) * lon_m / max_cells)
+        self.cell_m = cell_m
+        self.lat_step = cell_m / lat_m
+        self.lon_step = cell_m / lon_m
+        self.rows = max(1, int(np.ceil((max_lat - min_lat) / self.lat_step)))
+        self.cols = max(1, int(np.ceil((max_lon - min_lon) / self.lon_step)))
+        self.bbox = (min_lat, min_lon, min_lat + self.rows * self.lat_step, min_lon + self.cols * self.lon_step)
+        self.counts = np.zeros((self.rows, self.cols), dtype=np.float64)
+        self.total = 0      # 累加到网格中的事件数
+        self.outside = 0    # 落在区域外的事件数
+        self.version = 0    # 每次累加后加1，用于判断是否需要重新渲染
+
+    @classmethod
+    def covering(cls, latitude, longitude, cell_m=CELL_METERS, margin_m=MARGIN_METERS,
+                 max_cells=MAX_CELLS_PER_SIDE):
+        """按数据范围（四周留出 margin_m 米）建立网格"""
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        lat_m, lon_m = _meters_per_degree(float(np.mean(latitude)))
+        d_lat, d_lon = margin_m / lat_m, margin_m / lon_m
+        return cls((latitude.min() - d_lat, longitude.min() - d_lon,
+                    latitude.max() + d_lat, longitude.max() + d_lon), cell_m, max_cells)
+
+    @classmethod
+    def around(cls, latitude, longitude, radius_m, cell_m=CELL_METERS, max_cells=MAX_CELLS_PER_SIDE):
+        """以一点为中心、边长 2×radius_m 的正方形区域（实时轨迹事先不知道范围时使用）"""
+        return cls.covering([latitude], [longitude], cell_m, radius_m, max_cells)
+
+    def cell_index(self, latitude, longitude):
+        """(行, 列, 是否在区域内)"""
+        row = np.floor((np.asarray(latitude, dtype=np.float64) - self.bbox[0]) / self.lat_step).astype(np.int64)
+        col = np.floor((np.asarray(longitude, dtype=np.float64) - self.bbox[1]) / self.lon_step).astype(np.int64)
+        inside = (row >= 0) & (row < self.rows) & (col >= 0) & (col < self.cols)
+        return row, col, inside
+
+    def add(self, latitude, longitude, weights=None):
+        """累加一个或一批事件，返回落在区域内的个数"""
+        row, col, inside = self.cell_index(np.atleast_1d(latitude), np.atleast_1d(longitude))
+        count = int(inside.sum())
+        self.outside += int(inside.size) - count
+        if not count:
+            return 0
+        flat = row[inside] * self.cols + col[inside]
+        w = None if weights is None else np.broadcast_to(np.asarray(weights, dtype=np.float64), inside.shape)[inside]
+        if count * 16 >= self.counts.size:
+            self.counts += np.bincount(flat, weights=w, minlength=self.counts.size).reshape(self.counts.shape)
+        else:
+            np.add.at(self.counts.reshape(-1), flat, 1.0 if w is None else w)
+        self.total += count
+        self.version += 1
+        return count
+
+    def empty_copy(self):
+        """网格完全相同的空热力图（例如同一区域的检测事件）"""
+        heatmap = copy.copy(self)
+        heatmap.counts = np.zeros_like(self.counts)
+        heatmap.total = heatmap.outside = heatmap.version = 0
+        return heatmap
+
+    def merge(self, other):
+        """累加另一张网格相同的热力图"""
+        if other.bbox != self.bbox or other.counts.shape != self.counts.shape:
+            raise ValueError("热力图网格不一致，无法合并")
+        self.counts += other.counts
+        self.total += other.total
+        self.outside += other.outside
+        self.version += 1
+
+    def clear(self):
+        self.counts[:] = 0
+        self.total = self.outside = 0
+        self.version += 1
+
+    @property
+    def bounds(self):
+        """[[南, 西], [北, 东]]（Leaflet的范围格式）"""
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        return [[min_lat, min_lon], [max_lat, max_lon]]
+
+    def intensity(self, smooth=1):
+        """
+        每格的强度 0~1：(2×smooth+1)² 邻域求和平滑后取对数，按最大值归一化
+
+        对数刻度下停留很久的格子不会把只经过一次的格子压到看不见。
+        """
+        values = self.counts
+        if smooth > 0:
+            k = 2 * smooth + 1
+            padded = np.pad(values, smooth)
+            summed = np.cumsum(np.cumsum(padded, axis=0), axis=1)
+            summed = np.pad(summed, ((1, 0), (1, 0)))
+            values = summed[k:, k:] - summed[:-k, k:] - summed[k:, :-k] + summed[:-k, :-k]
+        values = np.log1p(np.maximum(values, 0))
+        peak = values.max()
+        return values / peak if peak > 0 else values
+
+    def render_png(self, smooth=1, max_alpha=0.85):
+        """渲染为RGBA PNG（没有事件的格子完全透明）"""
+        level = self.intensity(smooth)
+        rgb = np.empty(level.shape + (3,))
+        for channel in range(3):
+            rgb[..., channel] = np.interp(level, _GRADIENT_STOPS, _GRADIENT_RGB[:, channel])
+        alpha = np.where(level > 0, 0.25 + 0.75 * level, 0.0) * max_alpha
+        rgba = np.dstack((rgb, alpha * 255)).round().astype(np.uint8)
+        return encode_png(rgba[::-1])  # 图片第一行在北
+
+    def data_uri(self, smooth=1):
+        return 'data:image/png;base64,' + base64.b64encode(self.render_png(smooth)).decode('ascii')
+
+    def overlay(self, name, opacity=0.7, show=True, smooth=1, image=None):
+        """
+        轨迹文档中的图片图层（show 为False时只出现在图层控件中）
+
+        image 为图片URL（例如地图服务发布的PNG），默认把PNG内嵌为data URI
+        """
+        return {
+            'name': name,
+            'image': image or self.data_uri(smooth),
+            'bounds': self.bounds,
+            'opacity': opacity,
+            'show': show,
+        }
+
+
+def load_detections(log_dir):
+    """
+    读取检测日志（pick.py 写入的 detections_<日期>.json），
+    返回有有效定位的检测事件 (纬度数组, 经度数组, 人脸+猫脸数数组)，坐标为WGS-84
+    """
+    latitude, longitude, counts = [], [], []
+    for path in sorted(glob.glob(os.path.join(log_dir, 'detections_*.json'))):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取检测日志失败 {path}: {e}")
+            continue
+        for entry in entries:
+            lat, lon = entry.get('latitude'), entry.get('longitude')
+            if not entry.get('gps_valid') or lat is None or lon is None:
+                continue
+            latitude.append(float(lat))
+            longitude.append(float(lon))
+            counts.append(max(1, (entry.get('faces') or 0) + (entry.get('cats') or 0)))
+    return (np.array(latitude, dtype=np.float64), np.array(longitude, dtype=np.float64),
+            np.array(counts, dtype=np.float64))
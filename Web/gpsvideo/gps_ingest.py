@@ -0,0 +1,280 @@
+# gps_ingest.py - 单线程TCP数据接收服务器（selectors事件循环）
+"""
+设备通过TCP长连接发送按行分隔的数据（JSON、NMEA、$GPS数据包）。
+原来每个连接一个线程：线程栈内存和上下文切换随设备数增长，客户端字典被多个线程同时修改，
+accept 还要以1秒超时轮询。这里所有连接由一个线程的 selectors 事件循环处理（Linux上为epoll）：
+
+    server = IngestServer('0.0.0.0', 8080, handler=lambda record, client: ...)
+    server.serve_forever()        阻塞运行，另一个线程调用 server.stop() 结束
+
+    - 每个连接只有一个分帧器和一个待处理队列，没有线程
+    - 空闲连接回收：超过 idle_timeout 秒没有收到数据的连接被关闭（设备掉电时TCP连接不会自己断开）
+    - 背压：每个连接每轮最多处理 batch 条记录，待处理记录超过 high_water 条时暂停读取该连接，
+      降到 low_water 以下再恢复；数据发得过快的设备由TCP流控减速，不会占满内存或拖慢其他设备
+    - 统计：接受/关闭/回收的连接数、收到的字节数和记录数、暂停次数，以及按运行时间计算的吞吐量
+
+handler(record, client) 收到的 record 为 gps_framer.Record，client 为 IngestClient。
+本模块不依赖Qt。
+"""
+import time
+import socket
+import selectors
+from collections import deque
+
+from gps_framer import PacketFramer, Record
+
+RECV_SIZE = 4096
+IDLE_TIMEOUT = 60.0        # 秒，超过该时间没有数据的连接被关闭
+REAP_INTERVAL = 1.0        # 检查空闲连接的间隔（秒）
+HIGH_WATER = 256           # 单个连接待处理记录超过该数量时暂停读取
+LOW_WATER = 64             # 降到该数量以下时恢复读取
+PROCESS_BATCH = 32         # 每轮每个连接最多处理的记录数
+MAX_CLIENTS = 1024
+LISTEN_BACKLOG = 128
+
+
+class IngestClient:
+    """一个设备连接的状态"""
+
+    __slots__ = ('id', 'address', 'sock', 'framer', 'connected_time', 'last_active',
+                 'bytes', 'records', 'pending', 'paused')
+
+    def __init__(self, sock, address, framer):
+        self.id = f"{address[0]}:{address[1]}"
+        self.address = address
+        self.sock = sock
+        self.framer = framer
+        self.connected_time = time.time()
+        self.last_active = time.monotonic()
+        self.bytes = 0
+        self.records = 0
+        self.pending = deque()
+        self.paused = False
+
+
+class IngestServer:
+    """
+    单线程TCP接收服务器
+
+    handler        handler(record, client)，在事件循环线程中调用
+    on_connect     on_connect(client)
+    on_disconnect  on_disconnect(client, reason)，reason 为 'closed' / 'reset' / 'idle' / 'shutdown'
+    delimiters     记录分隔符，同 PacketFramer
+    framer_class   每个连接的分帧器类型，framer_class(delimiters=...)，
+                   例如 gps_telemetry.TelemetryFramer 同时接收文本行和二进制帧
+    """
+
+    def __init__(self, host, port, handler, on_connect=None, on_disconnect=None, delimiters=b'\n',
+                 framer_class=PacketFramer, idle_timeout=IDLE_TIMEOUT, high_water=HIGH_WATER,
+                 low_water=LOW_WATER, batch=PROCESS_BATCH, max_clients=MAX_CLIENTS, recv_size=RECV_SIZE):
+        self.host = host
+        self.port = port
+        self.handler = handler
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.delimiters = delimiters
+        self.framer_class = framer_class
+        self.idle_timeout = idle_timeout
+        self.high_water = high_water
+        self.low_water = low_water
+        self.batch = batch
+        self.max_clients = max_clients
+        self.recv_size = recv_size
+
+        self.clients = {}          # 只在事件循环线程中修改
+        self.running = False
+        self._selector = None
+        self._listener = None
+        self._wakeup = None        # (读端, 写端)，stop() 用来唤醒 select
+        self._busy = set()         # 有待处理记录的连接
+        self._started = None
+        self.stats = {'accepted': 0, 'rejected': 0, 'closed': 0, 'reaped': 0, 'bytes': 0,
+                      'records': 0, 'handler_errors': 0, 'pauses': 0}
+
+    # ---- 启动和停止 ----
+
+    def start(self):
+        """绑定端口并开始监听（错误照常抛出 OSError），之后调用 serve_forever()"""
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((self.host, self.port))
+            listener.listen(LISTEN_BACKLOG)
+        except OSError:
+            listener.close()
+            raise
+        listener.setblocking(False)
+        self.port = listener.getsockname()[1]
+        self._listener = listener
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(listener, selectors.EVENT_READ, None)
+        self._wakeup = socket.socketpair()
+        for sock in self._wakeup:
+            sock.setblocking(False)
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ, None)
+        self._started = time.monotonic()
+        self.running = True
+
+    def stop(self):
+        """结束 serve_forever()（可以从其他线程调用）"""
+        self.running = False
+        if self._wakeup is not None:
+            try:
+                self._wakeup[1].send(b'\0')
+            except OSError:
+                pass
+
+    def serve_forever(self):
+        if self._selector is None:
+            self.start()
+        next_reap = time.monotonic() + REAP_INTERVAL
+        try:
+            while self.running:
+                # 有待处理记录时不等待，否则最多等到下一次空闲检查
+                timeout = 0 if self._busy else max(0.0, next_reap - time.monotonic())
+                self.poll(timeout)
+                now = time.monotonic()
+                if now >= next_reap:
+                    self.reap_idle(now)
+                    next_reap = now + REAP_INTERVAL
+        finally:
+            self.close()
+
+    def close(self):
+        self.running = False
+        for client in list(self.clients.values()):
+            self._drop(client, 'shutdown')
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        for sock in (self._listener, *(self._wakeup or ())):
+            if sock is not None:
+                sock.close()
+        self._listener = self._wakeup = None
+
+    # ---- 事件循环 ----
+
+    def poll(self, timeout):
+        """处理一轮就绪事件和待处理记录"""
+        for key, _ in self._selector.select(timeout):
+            if key.fileobj is self._listener:
+                self._accept()
+            elif key.data is None:
+                try:
+                    self._wakeup[0].recv(64)
+                except OSError:
+                    pass
+            else:
+                self._read(key.data)
+        self._process()
+
+    def _accept(self):
+        # 一次接受积压的全部连接
+        while True:
+            try:
+                sock, address = self._listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"接受连接错误: {e}")
+                return
+            if len(self.clients) >= self.max_clients:
+                self.stats['rejected'] += 1
+                sock.close()
+                continue
+            sock.setblocking(False)
+            client = IngestClient(sock, address, self.framer_class(delimiters=self.delimiters))
+            self.clients[client.id] = client
+            self._selector.register(sock, selectors.EVENT_READ, client)
+            self.stats['accepted'] += 1
+            if self.on_connect:
+                self.on_connect(client)
+
+    def _read(self, client):
+        try:
+            data = client.sock.recv(self.recv_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._drop(client, 'reset')
+            return
+        if not data:
+            self._drop(client, 'closed')
+            return
+        client.last_active = time.monotonic()
+        client.bytes += len(data)
+        self.stats['bytes'] += len(data)
+        # 记录的 memoryview 在下一次 feed 前失效，入队前复制
+        for record in client.framer.records(data):
+            client.pending.append(Record(record.kind, bytes(record.data), record.delimiter))
+        if client.pending:
+            self._busy.add(client)
+            if len(client.pending) >= self.high_water and not client.paused:
+                client.paused = True
+                self.stats['pauses'] += 1
+                self._selector.unregister(client.sock)
+
+    def _process(self):
+        """每个有待处理记录的连接轮流处理最多 batch 条"""
+        for client in list(self._busy):
+            pending = client.pending
+            for _ in range(min(self.batch, len(pending))):
+                record = pending.popleft()
+                client.records += 1
+                self.stats['records'] += 1
+                try:
+                    self.handler(record, client)
+                except Exception as e:
+                    self.stats['handler_errors'] += 1
+                    print(f"处理数据错误 [{client.id}]: {e}")
+            if client.id not in self.clients:
+                self._busy.discard(client)   # 处理过程中连接被关闭
+                continue
+            if not pending:
+                self._busy.discard(client)
+            if client.paused and len(pending) <= self.low_water:
+                client.paused = False
+                client.last_active = time.monotonic()   # 暂停期间没有读取，不算空闲
+                self._selector.register(client.sock, selectors.EVENT_READ, client)
+
+    def reap_idle(self, now=None):
+        """关闭超过 idle_timeout 秒没有数据的连接，返回关闭的数量"""
+        if not self.idle_timeout:
+            return 0
+        deadline = (now or time.monotonic()) - self.idle_timeout
+        idle = [client for client in self.clients.values() if client.last_active < deadline and not client.paused]
+        for client in idle:
+            self.stats['reaped'] += 1
+            self._drop(client, 'idle')
+        return len(idle)
+
+    def _drop(self, client, reason):
+        if self.clients.pop(client.id, None) is None:
+            return
+        if not client.paused:
+            try:
+                self._selector.unregister(client.sock)
+            except (KeyError, ValueError):
+                pass
+        client.sock.close()
+        client.pending.clear()
+        self._busy.discard(client)
+        self.stats['closed'] += 1
+        if self.on_disconnect:
+            self.on_disconnect(client, reason)
+
+    # ---- 统计 ----
+
+    def throughput(self):
+        """统计加上当前连接数和平均吞吐量（字节/秒、记录/秒）"""
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        result = dict(self.stats, clients=len(self.clients), elapsed=elapsed)
+        result['bytes_per_s'] = self.stats['bytes'] / elapsed if elapsed else 0.0
+        result['records_per_s'] = self.stats['records'] / elapsed if elapsed else 0.0
+        return result
+
+    def format_stats(self):
+        s = self.throughput()
+        return (f"当前连接 {s['clients']} 个，累计接受 {s['accepted']} 个（拒绝 {s['rejected']}，空闲回收 {s['reaped']}）；"
+                f"收到 {s['bytes'] / 1024:.1f} KB / {s['records']} 条记录，"
+                f"{s['bytes_per_s'] / 1024:.1f} KB/s，{s['records_per_s']:.0f} 条/秒；背压暂停 {s['pauses']} 次")
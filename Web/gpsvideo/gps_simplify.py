@@ -0,0 +1,129 @@
+# gps_simplify.py - 轨迹折线化简（多分辨率顶点金字塔）
+"""
+按缩放级别化简轨迹折线，地图上只绘制当前缩放级别需要的顶点。
+
+对整条轨迹做一次 Douglas-Peucker 分割，记录每个顶点被保留所需的最大误差（重要度，米）。
+重要度按父区间截断，因此任意容差下的化简结果都是 "重要度 > 容差" 的顶点，
+各级结果逐级嵌套：只需保存一份顶点和每个顶点开始出现的缩放级别，就得到整个金字塔。
+
+分割按层并行：每一轮对所有待分割区间一起做向量化计算，轮数约等于分割深度，
+不会对每个区间调用一次Python函数。
+
+本模块不依赖Qt。
+"""
+import numpy as np
+
+EARTH_RADIUS = 6371000         # 地球半径（米）
+METERS_PER_PIXEL_Z0 = 156543.03392  # Web墨卡托0级在赤道处每像素的米数
+PIXEL_TOLERANCE = 1.0          # 允许的偏差（屏幕像素）
+MIN_ZOOM = 3
+MAX_ZOOM = 20
+
+
+def _planar(latitude, longitude):
+    """投影到以轨迹中心为原点的局部平面（米），容差和距离都以米计算"""
+    lat0 = np.radians(np.mean(latitude))
+    scale = np.pi * EARTH_RADIUS / 180.0
+    x = (np.asarray(longitude, dtype=np.float64) - np.mean(longitude)) * scale * np.cos(lat0)
+    y = (np.asarray(latitude, dtype=np.float64) - np.mean(latitude)) * scale
+    return x, y
+
+
+def douglas_peucker_significance(x, y, min_tolerance=0.0):
+    """
+    每个顶点的 Douglas-Peucker 重要度（米），首尾为 inf
+
+    tolerance 下的 Douglas-Peucker 结果 = np.flatnonzero(significance > tolerance)。
+    重要度不超过 min_tolerance 的区间不再细分（其中的顶点重要度记为0），
+    只关心 tolerance >= min_tolerance 的结果时可以省去大部分计算。
+    """
+    n = len(x)
+    significance = np.zeros(n)
+    if n == 0:
+        return significance
+    significance[0] = significance[-1] = np.inf
+    if n < 3:
+        return significance
+
+    starts = np.array([0])
+    ends = np.array([n - 1])
+    limits = np.array([np.inf])  # 父区间分割点的重要度
+    while len(starts):
+        counts = ends - starts - 1
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        total = int(counts.sum())
+        range_id = np.repeat(np.arange(len(starts)), counts)
+        index = np.arange(total) - offsets[range_id] + starts[range_id] + 1
+
+        # 点到区间首尾连线（线段）的距离
+        ax, ay = x[starts][range_id], y[starts][range_id]
+        dx, dy = x[ends][range_id] - ax, y[ends][range_id] - ay
+        px, py = x[index] - ax, y[index] - ay
+        length2 = dx * dx + dy * dy
+        t = np.clip(np.divide(px * dx + py * dy, length2, out=np.zeros(total), where=length2 > 0), 0.0, 1.0)
+        distance = np.hypot(px - t * dx, py - t * dy)
+
+        # 每个区间距离最大的点作为分割点
+        peak = np.maximum.reduceat(distance, offsets)
+        hits = np.flatnonzero(distance == peak[range_id])
+        hit_range = range_id[hits]
+        first = np.concatenate(([True], hit_range[1:] != hit_range[:-1]))
+        split = index[hits[first]]
+        value = np.minimum(peak, limits)
+        significance[split] = value
+
+        # 两个子区间，至少包含一个内部点且重要度仍可能超过 min_tolerance 才继续
+        starts, ends = np.concatenate((starts, split)), np.concatenate((split, ends))
+        limits = np.concatenate((value, value))
+        keep = (ends - starts >= 2) & (limits > min_tolerance)
+        starts, ends, limits = starts[keep], ends[keep], limits[keep]
+    return significance
+
+
+def zoom_tolerance(zoom, latitude=0.0, pixel_tolerance=PIXEL_TOLERANCE):
+    """缩放级别 zoom 下一个像素 × pixel_tolerance 对应的地面距离（米）"""
+    return METERS_PER_PIXEL_Z0 * np.cos(np.radians(latitude)) / 2.0 ** np.asarray(zoom) * pixel_tolerance
+
+
+class TrackPyramid:
+    """
+    轨迹的多分辨率顶点金字塔
+
+        indices    至少在最大缩放级别下需要绘制的顶点（原轨迹中的下标，升序）
+        min_zoom   indices 中每个顶点开始出现的缩放级别
+        level(z)   缩放级别 z 下绘制的顶点下标
+
+    首尾两点在所有级别都保留。
+    """
+
+    def __init__(self, latitude, longitude, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM,
+                 pixel_tolerance=PIXEL_TOLERANCE):
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        self.point_count = len(latitude)
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        if not self.point_count:
+            self.indices = np.empty(0, dtype=np.int64)
+            self.zooms = np.empty(0, dtype=np.int8)
+            return
+
+        x, y = _planar(latitude, longitude)
+        meters = zoom_tolerance(0, np.mean(latitude), pixel_tolerance)
+        significance = douglas_peucker_significance(x, y, meters / 2.0 ** max_zoom)
+        # 重要度大于某一级的容差时，顶点从该级开始出现
+        with np.errstate(divide='ignore'):
+            zoom = np.floor(np.log2(meters / significance)) + 1
+        zoom = np.clip(zoom, min_zoom, max_zoom + 1)
+        visible = zoom <= max_zoom
+        self.indices = np.flatnonzero(visible)
+        self.zooms = zoom[visible].astype(np.int8)
+
+    def level(self, zoom):
+        """缩放级别 zoom 下需要绘制的顶点下标"""
+        return self.indices[self.zooms <= zoom]
+
+    def level_counts(self):
+        """{缩放级别: 顶点数}"""
+        counts = np.bincount(self.zooms - self.min_zoom, minlength=self.max_zoom - self.min_zoom + 1)
+        return {self.min_zoom + i: int(c) for i, c in enumerate(np.cumsum(counts))}
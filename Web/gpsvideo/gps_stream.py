@@ -0,0 +1,88 @@
+# gps_stream.py - 固定内存的GPS日志分块读取
+"""
+按固定大小的窗口读取任意大的GPS日志文件。
+
+每个窗口都在换行符处截断，跨窗口的半行会拼接到下一个窗口，
+因此解析器每次只看到完整的记录行。无论文件多大，
+读取缓冲区的峰值内存都约等于 chunk_size。
+"""
+import os
+import mmap
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024  # 4MB窗口
+
+
+def iter_line_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE, use_mmap=False, start=0,
+                     complete_lines=False):
+    """
+    逐窗口读取文件
+
+    yield (chunk, consumed, total):
+        chunk    以换行符结尾的bytes（文件最后一块除外）
+        consumed 到该窗口末尾为止的文件偏移（字节）
+        total    文件总字节数
+
+    use_mmap=True 时通过内存映射读取，由操作系统负责页缓存，
+    进程内只保留当前窗口的拷贝。
+    start 为起始偏移（应位于行首），用于只读取文件新增的部分；
+    complete_lines=True 时不返回文件末尾尚未写完的半行。
+    """
+    total = os.path.getsize(file_path)
+    if total <= start:
+        return
+    if use_mmap:
+        chunks = _iter_mmap_chunks(file_path, chunk_size, total, start)
+    else:
+        chunks = _iter_read_chunks(file_path, chunk_size, total, start)
+    for chunk, consumed, total in chunks:
+        if complete_lines and consumed == total and not chunk.endswith(b'\n'):
+            cut = chunk.rfind(b'\n') + 1
+            if cut == 0:
+                return
+            chunk, consumed = chunk[:cut], consumed - (len(chunk) - cut)
+        yield chunk, consumed, total
+
+
+def _iter_read_chunks(file_path, chunk_size, total, start=0):
+    consumed = start
+    tail = b''
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = total - start  # 只读到打开时的文件大小，写入中的文件也保持一致
+        while remaining > 0:
+            block = f.read(min(chunk_size, remaining))
+            remaining -= len(block)
+            if not block:
+                break
+            data = tail + block if tail else block
+            cut = data.rfind(b'\n') + 1
+            if cut == 0 and len(data) < 2 * chunk_size:
+                # 超长行，继续读取直到遇到换行
+                tail = data
+                continue
+            if cut == 0:
+                # 没有换行的异常数据，整块交出以保证内存有界
+                cut = len(data)
+            tail = data[cut:]
+            consumed += cut
+            yield data[:cut], consumed, total
+    if tail:
+        consumed += len(tail)
+        yield tail, consumed, total
+
+
+def _iter_mmap_chunks(file_path, chunk_size, total, start=0):
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            while start < total:
+                end = min(start + chunk_size, total)
+                if end < total:
+                    cut = mm.rfind(b'\n', start, end) + 1
+                    if cut <= start:
+                        # 窗口内没有换行，向后找下一个换行（最多再读一个窗口）
+                        cut = mm.find(b'\n', end, min(end + chunk_size, total)) + 1
+                        if cut <= start:
+                            cut = min(end + chunk_size, total)
+                    end = cut
+                yield mm[start:end], end, total
+                start = end
@@ -0,0 +1,189 @@
+# gps_telemetry.py - 定长二进制遥测帧（编码、零拷贝解码、NumPy批量解码）
+"""
+设备每次定位发送一行JSON约100字节，接收端要逐行 json.loads、再把度分字符串转换为十进制度。
+二进制帧把同样的内容压缩为24字节，字段直接是整数，解码只需一次 struct.unpack_from：
+
+    偏移  类型  字段
+    0     2s    魔数 A5 5A（不是合法的UTF-8开头，不会与文本行混淆）
+    2     u1    版本（FRAME_VERSION）
+    3     u1    标志，FLAG_VALID：有效定位
+    4     u4    时间，UTC Unix秒；设备不知道日期时为当天秒数（< 86400）
+    8     u2    毫秒
+    10    i4    纬度 × 1e7（WGS-84十进制度）
+    14    i4    经度 × 1e7
+    18    u2    速度 × 100（节）
+    20    u1    卫星数
+    21    u1    保留
+    22    u2    CRC-16/CCITT-FALSE（多项式 0x1021，初值 0xFFFF），覆盖前22字节
+全部为小端序。帧之间不需要分隔符，可以与文本行混在同一个连接中发送，
+TelemetryFramer 按魔数自动区分（文本记录的类型判断见 gps_framer）。
+
+    decode_frame(view)       单帧解码，直接读 memoryview，不复制
+    decode_frames(buffer)    连续多帧批量解码为 GPSColumns（NumPy，CRC也按列计算）
+
+本模块不依赖Qt。
+"""
+import struct
+import binascii
+from collections import namedtuple
+
+import numpy as np
+
+from gps_columns import GPSColumns, KIND_BIN
+from gps_framer import PacketFramer, Record, KIND_BINARY, classify, _WHITESPACE
+
+FRAME_MAGIC = b'\xa5\x5a'
+FRAME_VERSION = 1
+FLAG_VALID = 1
+
+FRAME_STRUCT = struct.Struct('<2sBBIHiiHBxH')
+FRAME_SIZE = FRAME_STRUCT.size
+FRAME_DTYPE = np.dtype([
+    ('magic', 'S2'),
+    ('version', 'u1'),
+    ('flags', 'u1'),
+    ('time', '<u4'),
+    ('millis', '<u2'),
+    ('lat', '<i4'),
+    ('lon', '<i4'),
+    ('speed', '<u2'),
+    ('satellites', 'u1'),
+    ('reserved', 'u1'),
+    ('crc', '<u2'),
+])
+assert FRAME_DTYPE.itemsize == FRAME_SIZE
+
+COORD_SCALE = 1e7
+SPEED_SCALE = 100.0
+
+TelemetryFix = namedtuple('TelemetryFix', 'time lat lon speed_knots satellites valid')
+
+
+class FrameError(ValueError):
+    """帧校验失败或版本不支持"""
+
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE"""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(time, lat, lon, speed_knots=0.0, satellites=0, valid=True):
+    """编码一帧（设备端格式的参考实现）"""
+    seconds = int(time)
+    body = FRAME_STRUCT.pack(
+        FRAME_MAGIC, FRAME_VERSION, FLAG_VALID if valid else 0, seconds, int(round((time - seconds) * 1000)),
+        int(round(lat * COORD_SCALE)), int(round(lon * COORD_SCALE)),
+        min(int(round((speed_knots or 0.0) * SPEED_SCALE)), 0xFFFF), min(int(satellites or 0), 0xFF), 0)
+    return body[:-2] + struct.pack('<H', crc16(body[:-2]))
+
+
+def decode_frame(view, offset=0):
+    """
+    解码 view[offset:offset+FRAME_SIZE]，返回 TelemetryFix
+
+    view 可以是 bytes / bytearray / memoryview，不复制数据；校验失败抛出 FrameError
+    """
+    (magic, version, flags, seconds, millis, lat, lon, speed, satellites,
+     crc) = FRAME_STRUCT.unpack_from(view, offset)
+    if magic != FRAME_MAGIC:
+        raise FrameError("魔数错误")
+    if version != FRAME_VERSION:
+        raise FrameError(f"不支持的帧版本 {version}")
+    if crc16(view[offset:offset + FRAME_SIZE - 2]) != crc:
+        raise FrameError("CRC校验失败")
+    return TelemetryFix(seconds + millis / 1000.0, lat / COORD_SCALE, lon / COORD_SCALE,
+                        speed / SPEED_SCALE, satellites, bool(flags & FLAG_VALID))
+
+
+_CRC_TABLE = np.array([binascii.crc_hqx(bytes([b]), 0) for b in range(256)], dtype=np.uint16)
+
+
+def _crc16_rows(rows):
+    """按列计算每一行的CRC（rows 为 (帧数, 字节数) 的uint8数组）"""
+    crc = np.full(len(rows), 0xFFFF, dtype=np.uint16)
+    for column in rows.T:
+        crc = (crc << 8) ^ _CRC_TABLE[(crc >> 8) ^ column]
+    return crc
+
+
+def decode_frames(buffer, valid_only=True):
+    """
+    批量解码连续的帧，返回 (GPSColumns, 丢弃的帧数)
+
+    buffer 的长度必须是 FRAME_SIZE 的整数倍；魔数、版本、CRC不正确的帧丢弃，
+    valid_only 时无效定位也丢弃。time 为帧中的UTC秒（含毫秒）。
+    """
+    frames = np.frombuffer(buffer, dtype=FRAME_DTYPE)
+    rows = np.frombuffer(buffer, dtype=np.uint8).reshape(len(frames), FRAME_SIZE)
+    good = ((frames['magic'] == FRAME_MAGIC) & (frames['version'] == FRAME_VERSION)
+            & (_crc16_rows(rows[:, :FRAME_SIZE - 2]) == frames['crc']))
+    valid = (frames['flags'] & FLAG_VALID).astype(bool)
+    if valid_only:
+        good &= valid
+    frames = frames[good]
+    columns = GPSColumns(
+        time=frames['time'] + frames['millis'] / 1000.0,
+        latitude=frames['lat'] / COORD_SCALE,
+        longitude=frames['lon'] / COORD_SCALE,
+        speed_knots=frames['speed'] / SPEED_SCALE,
+        satellites=frames['satellites'],
+        fix_type=valid[good],
+        kind=np.full(len(frames), KIND_BIN),
+    )
+    return columns, int(len(good) - np.count_nonzero(good))
+
+
+class TelemetryFramer(PacketFramer):
+    """
+    文本行与二进制帧混合的分帧器
+
+    记录开头是 FRAME_MAGIC 时按定长切出一帧（类型 KIND_BINARY，不要求分隔符），
+    否则与 PacketFramer 相同，按分隔符切出文本记录。
+    """
+
+    def records(self, data):
+        # 没有帧的数据块（也没有等待补全的帧）按纯文本处理，走 PacketFramer 的快速路径
+        if FRAME_MAGIC[0] not in data and not self._frame_pending():
+            yield from super().records(data)
+            return
+        if data:
+            self._append(data)
+        buffer = self._buffer
+        view = memoryview(buffer)
+        stats = self.stats
+        size = len(buffer)
+        try:
+            while True:
+                start = self._start
+                while start < size and buffer[start] in _WHITESPACE:
+                    start += 1
+                if start == size:
+                    self._start = self._scan = size
+                    break
+                if buffer.startswith(FRAME_MAGIC, start) or (size - start == 1 and buffer[start] == FRAME_MAGIC[0]):
+                    if size - start < FRAME_SIZE:
+                        self._start = self._scan = start   # 等待帧的其余字节
+                        break
+                    self._start = self._scan = start + FRAME_SIZE
+                    stats['records'] += 1
+                    yield Record(KIND_BINARY, view[start:start + FRAME_SIZE])
+                    continue
+                match = self._pattern.search(buffer, max(self._scan, start))
+                if match is None:
+                    self._start, self._scan = start, size
+                    break
+                end = match.start()
+                self._start = self._scan = end + 1
+                while end > start and buffer[end - 1] in _WHITESPACE:
+                    end -= 1
+                if start == end:
+                    continue
+                stats['records'] += 1
+                yield Record(classify(buffer, start, end), view[start:end], match.group())
+            self._check_overflow()
+        finally:
+            view.release()
+
+    def _frame_pending(self):
+        return self._start < len(self._buffer) and self._buffer[self._start] == FRAME_MAGIC[0]
@@ -0,0 +1,277 @@
+# gps_track.py - GPS轨迹二进制列式存储
+"""
+GPSDataSaver 的二进制追加格式（.gpstrk）。
+
+文件由32字节文件头和等长记录组成，每条记录40字节：
+    time f8 | latitude f8 | longitude f8 | altitude f4 | speed_knots f4 | course f4 | satellites u2 | flags u2
+time 为本地时间的Unix秒（与.txt格式中的时间字符串含义相同）。
+
+同名的 .idx 文件每隔 index_interval 条记录保存一项 (time, 记录号)，
+按时间定位时先在索引中二分查找，再在一个区间内查找，不需要扫描整个文件。
+
+flags 的 FLAG_DWELL_START / FLAG_DWELL_END 标记停留段的首尾两条记录（见 gps_dwell），
+读取时合并为一个带停留时长的点。
+
+读取时直接把文件内存映射为NumPy结构化数组，不做任何文本解析；
+文件末尾因断电等原因不完整的记录会被忽略。需要文本时用 export_track_text 导出。
+"""
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+from gps_columns import GPSColumns, KIND_TXT, _date_column
+from log_writer import GroupCommitWriter
+
+TRACK_SUFFIX = '.gpstrk'
+INDEX_SUFFIX = '.idx'
+TRACK_MAGIC = b'GPSTRK\x00\x00'
+TRACK_VERSION = 1
+DEFAULT_INDEX_INTERVAL = 256
+
+# 记录标志位
+FLAG_DWELL_START = 1   # 停留开始（锚点坐标和时间）
+FLAG_DWELL_END = 2     # 停留结束（锚点坐标、最后一次定位的时间）
+
+# 魔数, 版本, 记录长度, 索引间隔, 创建时间(ms)，补齐到32字节
+HEADER_STRUCT = struct.Struct('<8sHHIq8x')
+HEADER_SIZE = HEADER_STRUCT.size
+
+TRACK_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+    ('altitude', '<f4'),
+    ('speed_knots', '<f4'),
+    ('course', '<f4'),
+    ('satellites', '<u2'),
+    ('flags', '<u2'),
+])
+INDEX_DTYPE = np.dtype([('time', '<f8'), ('record', '<u8')])
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def local_timestamp(dt=None):
+    """本地时间 → 秒（按本地钟面时间计，不做时区换算）"""
+    return ((dt or datetime.now()) - _EPOCH).total_seconds()
+
+
+def index_path(track_path):
+    return track_path + INDEX_SUFFIX
+
+
+def is_track_file(file_path):
+    """根据文件头判断是否为二进制轨迹文件"""
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(TRACK_MAGIC)) == TRACK_MAGIC
+    except OSError:
+        return False
+
+
+def read_header(f):
+    data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError("轨迹文件头不完整")
+    magic, version, record_size, index_interval, created_ms = HEADER_STRUCT.unpack(data)
+    if magic != TRACK_MAGIC:
+        raise ValueError("不是GPS轨迹文件")
+    if version != TRACK_VERSION or record_size != TRACK_DTYPE.itemsize:
+        raise ValueError(f"不支持的轨迹文件版本: v{version}, 记录长度 {record_size}")
+    return {
+        'version': version,
+        'record_size': record_size,
+        'index_interval': index_interval,
+        'created': created_ms / 1000.0,
+    }
+
+
+class GPSTrackWriter:
+    """
+    二进制轨迹追加写入器
+
+    打开已有文件时会截掉末尾不完整的记录并补齐索引，然后继续追加。
+    记录和索引都通过 GroupCommitWriter 按 flush_interval / fsync_interval 批量写入。
+    """
+
+    def __init__(self, file_path, index_interval=DEFAULT_INDEX_INTERVAL,
+                 flush_interval=1.0, fsync_interval=None):
+        self.file_path = file_path
+        self.index_interval = index_interval
+        self.count = 0
+
+        if os.path.exists(file_path) and os.path.getsize(file_path) >= HEADER_SIZE:
+            with open(file_path, 'rb') as f:
+                self.index_interval = read_header(f)['index_interval']
+            self._recover()
+        else:
+            # 新文件（或连文件头都不完整的文件）从头写，旧索引作废
+            for path in (file_path, index_path(file_path)):
+                open(path, 'wb').close()
+        header = HEADER_STRUCT.pack(TRACK_MAGIC, TRACK_VERSION, TRACK_DTYPE.itemsize,
+                                    self.index_interval, int(local_timestamp() * 1000))
+        # 定长记录由 _recover 处理，不按分隔符恢复
+        options = dict(flush_interval=flush_interval, fsync_interval=fsync_interval,
+                       record_separator=None, recover=False)
+        self._file = GroupCommitWriter(file_path, header=header, **options)
+        self._index_file = GroupCommitWriter(index_path(file_path), **options)
+        self._record = np.zeros(1, dtype=TRACK_DTYPE)
+
+    def _recover(self):
+        """截掉不完整的末尾记录，并按实际记录数重建缺失的索引项"""
+        size = os.path.getsize(self.file_path)
+        self.count = (size - HEADER_SIZE) // TRACK_DTYPE.itemsize
+        valid_size = HEADER_SIZE + self.count * TRACK_DTYPE.itemsize
+        if valid_size != size:
+            print(f"轨迹文件末尾有 {size - valid_size} 字节不完整记录，已截断")
+            with open(self.file_path, 'r+b') as f:
+                f.truncate(valid_size)
+
+        idx_path = index_path(self.file_path)
+        expected = (self.count + self.index_interval - 1) // self.index_interval
+        existing = 0
+        if os.path.exists(idx_path):
+            existing = min(os.path.getsize(idx_path) // INDEX_DTYPE.itemsize, expected)
+        with open(idx_path, 'ab') as f:
+            f.truncate(existing * INDEX_DTYPE.itemsize)
+        if existing < expected:
+            records = read_track(self.file_path)
+            rows = np.arange(existing, expected) * self.index_interval
+            entries = np.empty(len(rows), dtype=INDEX_DTYPE)
+            entries['time'] = records['time'][rows]
+            entries['record'] = rows
+            with open(idx_path, 'ab') as f:
+                f.write(entries.tobytes())
+
+    def append(self, stamp, latitude, longitude, altitude=0.0, speed_knots=0.0,
+               course=0.0, satellites=0, flags=0):
+        """追加一条记录，stamp 为 local_timestamp() 的秒数"""
+        record = self._record
+        record['time'] = stamp
+        record['latitude'] = latitude
+        record['longitude'] = longitude
+        record['altitude'] = altitude
+        record['speed_knots'] = speed_knots
+        record['course'] = course
+        record['satellites'] = satellites
+        record['flags'] = flags
+        if self.count % self.index_interval == 0:
+            self._index_file.write(struct.pack('<dQ', stamp, self.count))
+        self._file.write(record.tobytes())
+        self.count += 1
+
+    def flush(self, fsync=False):
+        self._file.flush(fsync)
+        self._index_file.flush(fsync)
+
+    def close(self):
+        self._file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_track(file_path):
+    """
+    把轨迹文件内存映射为只读结构化数组
+
+    记录数由文件大小计算，末尾不完整的记录被忽略
+    """
+    with open(file_path, 'rb') as f:
+        read_header(f)
+    count = (os.path.getsize(file_path) - HEADER_SIZE) // TRACK_DTYPE.itemsize
+    if count <= 0:
+        return np.zeros(0, dtype=TRACK_DTYPE)
+    return np.memmap(file_path, dtype=TRACK_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+
+def read_track_index(file_path):
+    idx_path = index_path(file_path)
+    if not os.path.exists(idx_path):
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    return np.fromfile(idx_path, dtype=INDEX_DTYPE)
+
+
+def find_record(file_path, stamp):
+    """返回第一条 time >= stamp 的记录号，借助索引只检查一个区间"""
+    records = read_track(file_path)
+    index = read_track_index(file_path)
+    index = index[index['record'] < len(records)]
+    if not len(index):
+        return int(np.searchsorted(records['time'], stamp))
+    block = np.searchsorted(index['time'], stamp, side='right') - 1
+    if block < 0:
+        return 0
+    start = int(index['record'][block])
+    stop = int(index['record'][block + 1]) + 1 if block + 1 < len(index) else len(records)
+    return start + int(np.searchsorted(records['time'][start:stop], stamp))
+
+
+def dwell_pairs(flags):
+    """相邻的停留开始/结束记录，返回开始记录的下标数组（结束记录为下一条）"""
+    flags = np.asarray(flags)
+    if len(flags) < 2:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(((flags[:-1] & FLAG_DWELL_START) != 0) & ((flags[1:] & FLAG_DWELL_END) != 0))
+
+
+def load_track_columns(file_path, start=0, stop=None):
+    """
+    轨迹文件 → GPSColumns（字段与.txt格式解析结果相同）
+
+    停留段的首尾两条记录合并为一个点，停留时长在 dwell 列；
+    缺少结束记录的停留开始（采集中断）按普通点处理
+    """
+    records = read_track(file_path)[start:stop]
+    dwell = np.zeros(len(records))
+    pairs = dwell_pairs(records['flags'])
+    if len(pairs):
+        dwell[pairs] = records['time'][pairs + 1] - records['time'][pairs]
+        keep = np.ones(len(records), dtype=bool)
+        keep[pairs + 1] = False
+        records, dwell = records[keep], dwell[keep]
+    n = len(records)
+    time = np.array(records['time'], dtype=np.float64)
+    days = np.floor(time / 86400.0).astype(np.int64).astype('datetime64[D]')
+    return GPSColumns(
+        time=time,
+        date=_date_column(days),
+        latitude=records['latitude'],
+        longitude=records['longitude'],
+        altitude=records['altitude'],
+        speed_knots=records['speed_knots'],
+        course=records['course'],
+        satellites=records['satellites'],
+        fix_type=np.ones(n),
+        kind=np.full(n, KIND_TXT),
+        dwell=dwell,
+    )
+
+
+def format_track_lines(records):
+    """记录 → 与旧版.txt相同格式的文本行"""
+    stamps = (records['time'] * 1000).round().astype('datetime64[ms]')
+    lines = []
+    for stamp, rec in zip(stamps, records):
+        time_str = str(stamp).replace('T', ' ')
+        lines.append(f"{time_str}, {rec['latitude']:.8f}, {rec['longitude']:.8f}, "
+                     f"{rec['altitude']:.1f}, {rec['speed_knots']:.1f}, "
+                     f"{rec['course']:.1f}, {rec['satellites']}\n")
+    return lines
+
+
+def export_track_text(file_path, out_path=None, batch=65536):
+    """把轨迹文件导出为.txt文本格式，返回导出文件路径"""
+    if out_path is None:
+        out_path = os.path.splitext(file_path)[0] + '.txt'
+    records = read_track(file_path)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        for start in range(0, len(records), batch):
+            f.writelines(format_track_lines(records[start:start + batch]))
+    return out_path
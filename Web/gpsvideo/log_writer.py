@@ -0,0 +1,231 @@
+# log_writer.py - 组提交日志写入器
+"""
+GPS采集共用的日志写入组件。
+
+旧代码每收到一个数据包就 open → write → close 一次，采集速率受限于系统调用。
+GroupCommitWriter 保持文件句柄常开，写入先进入内存缓冲区，
+按 flush_interval 批量写入文件、按 fsync_interval 批量落盘；
+可以按文件大小或时间轮转；打开已有文件时截掉断电留下的不完整末尾记录。
+
+同一路径在进程内共享一个写入器，通过 open_log 获取。
+"""
+import os
+import atexit
+import threading
+import time
+from datetime import datetime
+
+
+class GroupCommitWriter:
+    """
+    组提交写入器（线程安全）
+
+    file_path        日志文件路径
+    flush_interval   缓冲区最长停留时间（秒），0表示每次写入立即flush
+    fsync_interval   两次fsync之间的最长间隔（秒），None表示不主动fsync
+    max_buffer       缓冲区超过该字节数时立即写入
+    max_bytes        文件超过该大小时轮转，None表示不按大小轮转
+    rotate_interval  文件打开超过该秒数时轮转，None表示不按时间轮转
+    header           新文件（含轮转后的文件）开头写入的内容，例如CSV表头
+    record_separator 每条记录的结束标记，用于恢复不完整的末尾记录
+    recover          打开时是否截掉不完整的末尾记录
+
+    write 接受 str（按UTF-8编码）或 bytes。
+    """
+
+    def __init__(self, file_path, flush_interval=1.0, fsync_interval=None, max_buffer=64 * 1024,
+                 max_bytes=None, rotate_interval=None, header=None, record_separator='\n',
+                 recover=True):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_buffer = max_buffer
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.header = self._encode(header) if header else b''
+        self.record_separator = self._encode(record_separator) if record_separator else b''
+
+        self.stats = {'records': 0, 'bytes': 0, 'flushes': 0, 'fsyncs': 0, 'rotations': 0,
+                      'recovered_bytes': 0}
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffered = 0
+        self._unsynced = False
+        self._file = None
+        self._closed = False
+
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        if recover:
+            self.recover()
+        self._open()
+
+        # 后台线程保证空闲时缓冲区里的数据也能按时写入
+        self._stop_event = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+    def _encode(self, data):
+        return data if isinstance(data, bytes) else data.encode('utf-8')
+
+    def recover(self):
+        """截掉文件末尾不完整的记录（断电时最后一次写入可能只写了一部分）"""
+        if not self.record_separator or not os.path.exists(self.file_path):
+            return 0
+        size = os.path.getsize(self.file_path)
+        if size == 0:
+            return 0
+        sep = self.record_separator
+        with open(self.file_path, 'r+b') as f:
+            # 从文件末尾向前查找最后一个记录结束标记
+            window = 64 * 1024
+            end = size
+            keep = 0
+            while end > 0:
+                start = max(0, end - window)
+                f.seek(start)
+                block = f.read(min(end + len(sep) - 1, size) - start)
+                pos = block.rfind(sep)
+                if pos >= 0:
+                    keep = start + pos + len(sep)
+                    break
+                end = start
+            if keep < size:
+                f.truncate(keep)
+        dropped = size - keep
+        if dropped:
+            self.stats['recovered_bytes'] += dropped
+            print(f"日志 {os.path.basename(self.file_path)} 末尾有 {dropped} 字节不完整记录，已截断")
+        return dropped
+
+    def _open(self):
+        self._file = open(self.file_path, 'ab')
+        self._opened_at = time.monotonic()
+        self._last_flush = self._opened_at
+        self._last_fsync = self._opened_at
+        if self.header and self._file.tell() == 0:
+            self._file.write(self.header)
+
+    def write(self, record):
+        """追加一条记录（str 或 bytes），按策略批量写入"""
+        data = self._encode(record)
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"日志已关闭: {self.file_path}")
+            self._buffer.append(data)
+            self._buffered += len(data)
+            self.stats['records'] += 1
+            self.stats['bytes'] += len(data)
+            if (not self.flush_interval or self._buffered >= self.max_buffer or
+                    time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self, fsync=False):
+        with self._lock:
+            if not self._closed:
+                self._flush_locked(force_fsync=fsync)
+
+    def _flush_locked(self, force_fsync=False):
+        now = time.monotonic()
+        if self._buffer:
+            if self._should_rotate(now):
+                self._rotate_locked()
+            # 一次写入整批记录，每条记录都完整写出
+            self._file.write(b''.join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+            self._file.flush()
+            self._unsynced = True
+            self.stats['flushes'] += 1
+        self._last_flush = now
+        due = self.fsync_interval is not None and now - self._last_fsync >= self.fsync_interval
+        if self._unsynced and (force_fsync or due):
+            os.fsync(self._file.fileno())
+            self._unsynced = False
+            self._last_fsync = now
+            self.stats['fsyncs'] += 1
+
+    def _should_rotate(self, now):
+        size = self._file.tell()
+        if self.max_bytes and size > len(self.header) and size + self._buffered > self.max_bytes:
+            return True
+        return bool(self.rotate_interval and now - self._opened_at >= self.rotate_interval)
+
+    def _rotate_locked(self):
+        """当前文件改名为 名称_时间戳.扩展名，然后重新打开原路径"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        base, ext = os.path.splitext(self.file_path)
+        rotated = f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
+        suffix = 1
+        while os.path.exists(rotated):
+            rotated = f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}{ext}"
+            suffix += 1
+        os.replace(self.file_path, rotated)
+        self._unsynced = False
+        self.stats['rotations'] += 1
+        self._open()
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            with self._lock:
+                if self._closed:
+                    break
+                if self._buffer or self._unsynced:
+                    self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked(force_fsync=True)
+            self._closed = True
+            self._file.close()
+        self._stop_event.set()
+        with _registry_lock:
+            if _registry.get(os.path.abspath(self.file_path)) is self:
+                del _registry[os.path.abspath(self.file_path)]
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# 进程内按路径共享的写入器
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def open_log(file_path, **options):
+    """获取 file_path 对应的共享写入器，首次调用时按 options 创建"""
+    key = os.path.abspath(file_path)
+    with _registry_lock:
+        writer = _registry.get(key)
+        if writer is None or writer.closed:
+            writer = GroupCommitWriter(file_path, **options)
+            _registry[key] = writer
+        return writer
+
+
+def close_all_logs():
+    """关闭所有共享写入器（程序退出时自动调用）"""
+    with _registry_lock:
+        writers = list(_registry.values())
+    for writer in writers:
+        try:
+            writer.close()
+        except Exception as e:
+            print(f"关闭日志 {writer.file_path} 失败: {e}")
+
+
+atexit.register(close_all_logs)
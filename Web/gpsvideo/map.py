@@ -1,7 +1,6 @@
 # map.py - 集成视频流和实时GPS数据显示
 import sys
 import os
-import re
 import math
 import folium
 import numpy as np
@@ -17,7 +16,6 @@ from PyQt5.QtCore import Qt, QThread, pyqtSignal, QUrl, QTimer, QSize, QMutex, Q
 from PyQt5.QtGui import QPixmap, QFont, QIcon, QImage, QPainter, QColor
 from PyQt5.QtWebEngineWidgets import QWebEngineView
 from datetime import datetime
-import tempfile
 import json
 import requests
 import threading
@@ -29,14 +27,60 @@ import cv2
 
 # 导入folium插件
 from folium import plugins
+from folium.elements import JSCSSMixin
+from jinja2 import Template
+
+# 列式GPS解析引擎
+from gps_columns import GPSColumns, load_gps_columns, iter_gps_columns, KIND_RMC
+# 解析结果缓存
+from gps_cache import GPSParseCache
+# 轨迹文件目录（SQLite）
+from gps_catalog import GPSCatalog, text_preview
+# 目录批量处理（进程池）
+from gps_batch import process_directory
+# 坐标系转换（NumPy向量化）
+import gps_coords
+# 轨迹统计（距离、速度、运动/静止时间）
+from gps_analytics import analyze_track, format_duration, LiveTrackStats
+# 按缩放级别化简轨迹折线
+from gps_simplify import TrackPyramid
+# 停留段压缩（原地停留的连续定位合并为一个点）
+from gps_dwell import DwellCompressor, compress_dwell, dwell_summary
+# ESP32 HTTP客户端（长连接、分接口超时、熔断）
+from esp32_client import shared_client, CircuitOpenError
+# 进程内地图HTTP服务（地图页面和轨迹文档）
+from map_server import MapServer
+# 瓦片离线缓存（地图服务的 /tiles/ 路由）
+from map_tiles import TileCache, AMAP_TILES, TILE_ROUTE, TILE_URL
+# 地图页面静态资源（Leaflet、插件、字体）本地缓存
+from map_assets import AssetCache, ASSET_ROUTE
+# 网格热力图（定位点、检测事件）
+from gps_heatmap import GridHeatmap, load_detections
+# 二进制轨迹存储
+from gps_track import (GPSTrackWriter, TRACK_SUFFIX, is_track_file, read_track, index_path,
+                       load_track_columns, format_track_lines, export_track_text, local_timestamp)
+
+# 进程内共享的解析结果缓存（内存LRU + 磁盘 .gps_cache 目录）
+PARSE_CACHE = GPSParseCache()
+
+# 瓦片缓存目录
+TILE_CACHE_DIR = "tile_cache"
+# 页面静态资源缓存目录
+ASSET_CACHE_DIR = "map_assets"
+# 检测日志目录（pick.py 写入，检测热力图使用）
+DETECTION_LOG_DIR = os.path.join("detections", "logs")
+# 实时热力图：以第一个定位点为中心的区域半径（米）和重新渲染间隔（秒）
+LIVE_HEATMAP_RADIUS = 1000.0
+LIVE_HEATMAP_INTERVAL = 5.0
 
 # GPS坐标转换类（从GPS_MAP.py中整合）
 class GPSCoordinateConverter:
-    """GPS坐标转换类，处理WGS-84到GCJ-02的转换"""
+    """GPS坐标转换类，处理WGS-84到GCJ-02的转换（以及GCJ-02到WGS-84的反向转换）"""
     def __init__(self):
         self.PI = 3.1415926535897932384626
         self.A = 6378245.0
         self.EE = 0.00669342162296594323
+        self.offset_grid = None  # 巡逻区域的预计算偏移量网格，见 set_patrol_area
     
     def str_To_Gps84(self, in_data1, in_data2):
         """
@@ -94,6 +138,14 @@ class GPSCoordinateConverter:
         bd_lat = z * math.sin(theta) + 0.006
         return [bd_lat, bd_lon]
     
+    def gcj02_to_wgs84(self, gg_lat, gg_lon):
+        """
+        GCJ-02坐标系转换为WGS-84坐标系（迭代求逆，误差小于1e-9度）
+        用于把高德地图上标注的点发送给小车
+        """
+        lat, lon = self.gcj02_to_wgs84_batch(gg_lat, gg_lon)
+        return [float(lat), float(lon)]
+    
     def out_of_china(self, lat, lon):
         """判断是否在中国境内"""
         if lon < 72.004 or lon > 137.8347:
@@ -131,45 +183,80 @@ class GPSCoordinateConverter:
         gcj_coords = self.wgs84_to_gcj02(lat_84, lon_84)
         return gcj_coords
     
+    # ========== 批量接口（NumPy数组进、数组出，结果与上面的逐点方法相同） ==========
+    
+    def str_To_Gps84_batch(self, in_data1, in_data2):
+        """原始度分字符串（整数部分, 小数部分）数组 → WGS-84十进制度数组"""
+        return gps_coords.str_to_gps84(in_data1, in_data2)
+    
+    def wgs84_to_gcj02_batch(self, lat, lon):
+        """WGS-84 → GCJ-02，返回 (纬度数组, 经度数组)"""
+        return gps_coords.wgs84_to_gcj02(lat, lon)
+    
+    def gcj02_to_bd09_batch(self, gg_lat, gg_lon):
+        """GCJ-02 → BD-09，返回 (纬度数组, 经度数组)"""
+        return gps_coords.gcj02_to_bd09(gg_lat, gg_lon)
+    
+    def gcj02_to_wgs84_batch(self, gg_lat, gg_lon):
+        """GCJ-02 → WGS-84，返回 (纬度数组, 经度数组)；巡逻区域内的点查表插值"""
+        if self.offset_grid is not None:
+            return self.offset_grid.to_wgs84(gg_lat, gg_lon)
+        return gps_coords.gcj02_to_wgs84(gg_lat, gg_lon)
+    
+    def set_patrol_area(self, bbox, step=0.001):
+        """
+        为巡逻区域 bbox = (最小纬度, 最小经度, 最大纬度, 最大经度) 预计算偏移量网格，
+        之后区域内的 GCJ-02 → WGS-84 转换只做双线性插值；bbox 为None时取消
+        返回网格与迭代求逆的精度和速度对比
+        """
+        if bbox is None:
+            self.offset_grid = None
+            return None
+        self.offset_grid = gps_coords.OffsetGrid(bbox, step)
+        report = self.offset_grid.accuracy_report(samples=20000)
+        print(f"巡逻区域偏移网格: {self.offset_grid.rows}x{self.offset_grid.cols}，"
+              f"最大误差 {report['max_error_m'] * 1000:.2f} 毫米，平均误差 {report['mean_error_m'] * 1000:.2f} 毫米，"
+              f"查表 {report['grid_points_per_s'] / 1e6:.1f} 百万点/秒，"
+              f"迭代 {report['iterative_points_per_s'] / 1e6:.1f} 百万点/秒")
+        return report
+    
+    def raw_to_gcj02_batch(self, lat_str, lat_str2, lon_str, lon_str2):
+        """原始字符串数组直接转换为GCJ-02，返回 (纬度数组, 经度数组)"""
+        return gps_coords.wgs84_to_gcj02(gps_coords.str_to_gps84(lat_str, lat_str2),
+                                         gps_coords.str_to_gps84(lon_str, lon_str2))
+    
+    def convert_array(self, positions, conversion_mode="auto_detect"):
+        """
+        批量转换坐标，positions 为 [经度, 纬度] 的 (N, 2) 数组，返回同样格式的数组
+        raw_to_gcj02 模式下 positions 为包含原始字符串的字典列表
+        """
+        if conversion_mode == "raw_to_gcj02":
+            raw = [pos for pos in positions
+                   if isinstance(pos, dict) and 'lat_str' in pos and 'lon_str' in pos]
+            if not raw:
+                return np.empty((0, 2))
+            lat, lon = self.raw_to_gcj02_batch([pos['lat_str'] for pos in raw],
+                                               [pos.get('lat_str2', "0") for pos in raw],
+                                               [pos['lon_str'] for pos in raw],
+                                               [pos.get('lon_str2', "0") for pos in raw])
+            return np.column_stack((lon, lat))
+        # wgs84_to_gcj02 / txt_to_gcj02 / 自动检测：positions 均为WGS-84坐标
+        return gps_coords.convert_positions(positions)
+    
     def convert_coordinates(self, positions, conversion_mode="auto_detect"):
         """
         批量转换坐标
         conversion_mode: "auto_detect", "wgs84_to_gcj02", "raw_to_gcj02", "txt_to_gcj02"
+        返回folium使用的 [经度, 纬度] 列表
         """
-        converted_positions = []
-        
-        if conversion_mode == "wgs84_to_gcj02":
-            # 直接WGS-84转GCJ-02
-            for lon, lat in positions:
-                gcj_coords = self.wgs84_to_gcj02(lat, lon)
-                # folium需要[lon, lat]格式
-                converted_positions.append([gcj_coords[1], gcj_coords[0]])
-                
-        elif conversion_mode == "raw_to_gcj02":
-            # 原始数据转GCJ-02
-            # positions应该是包含原始字符串的字典列表
-            for pos in positions:
-                if isinstance(pos, dict) and 'lat_str' in pos and 'lon_str' in pos:
-                    lat_str = pos['lat_str']
-                    lat_str2 = pos.get('lat_str2', "0")
-                    lon_str = pos['lon_str']
-                    lon_str2 = pos.get('lon_str2', "0")
-                    
-                    gcj_coords = self.raw_to_gcj02(lat_str, lat_str2, lon_str, lon_str2)
-                    converted_positions.append([gcj_coords[1], gcj_coords[0]])
-                    
-        elif conversion_mode == "txt_to_gcj02":
-            # 已解析的经纬度数据转GCJ-02
-            for lon, lat in positions:
-                gcj_coords = self.wgs84_to_gcj02(lat, lon)
-                converted_positions.append([gcj_coords[1], gcj_coords[0]])
-        else:
-            # 自动检测：假设positions已经是WGS-84格式
-            for lon, lat in positions:
-                gcj_coords = self.wgs84_to_gcj02(lat, lon)
-                converted_positions.append([gcj_coords[1], gcj_coords[0]])
-                
-        return converted_positions
+        return self.convert_array(positions, conversion_mode).tolist()
+
+def load_detection_events(converter, convert=True):
+    """检测日志中有定位的检测事件 (纬度, 经度, 权重)，convert 为真时从WGS-84转换到GCJ-02"""
+    latitude, longitude, weights = load_detections(DETECTION_LOG_DIR)
+    if len(latitude) and convert:
+        latitude, longitude = converter.wgs84_to_gcj02_batch(latitude, longitude)
+    return latitude, longitude, weights
 
 class GPSProcessingThread(QThread):
     """GPS处理线程"""
@@ -178,179 +265,107 @@ class GPSProcessingThread(QThread):
     error_occurred = pyqtSignal(str)
     progress_updated = pyqtSignal(int)
     
+    # 转换模式 → (坐标转换方式, 坐标系说明, 无数据提示)
+    MODE_SETTINGS = {
+        "wgs84_to_gcj02": ("wgs84_to_gcj02", "GCJ-02 (从WGS-84转换)", "未找到有效的GPS数据"),
+        "raw_to_gcj02": ("wgs84_to_gcj02", "GCJ-02 (从原始数据直接转换)", "未找到有效的原始GPS数据"),
+        "txt_to_gcj02": ("txt_to_gcj02", "GCJ-02 (从已解析的.txt文件转换)", "未找到有效的.txt格式GPS数据"),
+        "no_conversion": (None, "WGS-84 (原始坐标系)", "未找到有效的GPS数据"),
+    }
+    
+    CACHE_SOURCES = {
+        "memory": "命中内存缓存",
+        "disk": "命中磁盘缓存",
+        "tail": "文件有新增数据，只解析了新增部分",
+        "parse": "未命中，完整解析",
+    }
+    
     def __init__(self, file_path, conversion_mode="wgs84_to_gcj02"):
         super().__init__()
         self.file_path = file_path
         self.conversion_mode = conversion_mode
         self.converter = GPSCoordinateConverter()
+        self._last_percent = -1
     
     def run(self):
         try:
             self.processing_started.emit()
             
-            # 根据转换模式选择不同的解析方法
-            if self.conversion_mode == "raw_to_gcj02":
-                # 处理原始字符串数据
-                raw_positions, gps_data = self.parse_raw_gps_data(self.file_path)
-                self.progress_updated.emit(30)
-                
-                if raw_positions:
-                    self.progress_updated.emit(50)
-                    # 批量转换原始数据到GCJ-02
-                    gcj02_positions = self.converter.convert_coordinates(raw_positions, "raw_to_gcj02")
-                    positions = gcj02_positions
-                    coordinate_system = "GCJ-02 (从原始数据直接转换)"
-                    wgs84_positions = []  # 原始数据模式没有WGS-84中间数据
-                    
-                    self.progress_updated.emit(70)
-                    
-                    # 创建Folium地图
-                    map_html, info = create_folium_map_with_track(positions, gps_data, coordinate_system)
-                    self.progress_updated.emit(100)
-                    self.processing_finished.emit(map_html, positions, info, wgs84_positions)
-                else:
-                    self.error_occurred.emit("未找到有效的原始GPS数据")
-                    
-            elif self.conversion_mode == "txt_to_gcj02":
-                # 处理已解析的.txt文件数据（时间,纬度,经度格式）
-                wgs84_positions, gps_data = self.parse_txt_gps_data(self.file_path)
-                self.progress_updated.emit(30)
-                
-                if wgs84_positions:
-                    self.progress_updated.emit(50)
-                    # 转换为GCJ-02坐标系
-                    gcj02_positions = self.converter.convert_coordinates(wgs84_positions, "txt_to_gcj02")
-                    positions = gcj02_positions
-                    coordinate_system = "GCJ-02 (从已解析的.txt文件转换)"
-                    
-                    self.progress_updated.emit(70)
-                    
-                    # 创建Folium地图
-                    map_html, info = create_folium_map_with_track(positions, gps_data, coordinate_system)
-                    self.progress_updated.emit(100)
-                    self.processing_finished.emit(map_html, positions, info, wgs84_positions)
-                else:
-                    self.error_occurred.emit("未找到有效的.txt格式GPS数据")
-                    
-            elif self.conversion_mode == "no_conversion":
-                # 处理标准GPS数据，不进行转换
-                wgs84_positions, gps_data = parse_gps_data_from_file(self.file_path)
-                self.progress_updated.emit(30)
-                
-                if wgs84_positions:
-                    positions = wgs84_positions
-                    coordinate_system = "WGS-84 (原始坐标系)"
-                    
-                    self.progress_updated.emit(70)
-                    
-                    # 创建Folium地图
-                    map_html, info = create_folium_map_with_track(positions, gps_data, coordinate_system)
-                    self.progress_updated.emit(100)
-                    self.processing_finished.emit(map_html, positions, info, wgs84_positions)
-                else:
-                    self.error_occurred.emit("未找到有效的GPS数据")
-                    
+            mode = self.conversion_mode if self.conversion_mode in self.MODE_SETTINGS else "wgs84_to_gcj02"
+            convert_mode, coordinate_system, empty_message = self.MODE_SETTINGS[mode]
+            
+            stats = {}
+            positions = None
+            if is_track_file(self.file_path):
+                # 二进制轨迹直接内存映射，无需解析；其中没有原始度分值，原始数据模式按WGS-84处理
+                if mode == "raw_to_gcj02":
+                    mode = "txt_to_gcj02"
+                    convert_mode, coordinate_system, empty_message = self.MODE_SETTINGS[mode]
+                columns = load_track_columns(self.file_path)
             else:
-                # 默认处理标准GPS数据（WGS-84转GCJ-02）
-                wgs84_positions, gps_data = parse_gps_data_from_file(self.file_path)
-                self.progress_updated.emit(30)
-                
-                if wgs84_positions:
-                    self.progress_updated.emit(50)
-                    # 转换为GCJ-02坐标系
-                    gcj02_positions = self.converter.convert_coordinates(wgs84_positions, "wgs84_to_gcj02")
-                    positions = gcj02_positions
-                    coordinate_system = "GCJ-02 (从WGS-84转换)"
-                    
-                    self.progress_updated.emit(70)
-                    
-                    # 创建Folium地图
-                    map_html, info = create_folium_map_with_track(positions, gps_data, coordinate_system)
-                    self.progress_updated.emit(100)
-                    self.processing_finished.emit(map_html, positions, info, wgs84_positions)
+                # 列式分块解析，gps_data只在需要时才生成单点字典
+                # 解析阶段占进度的0~60%，按实际读取的字节数计算
+                # 解析结果和转换后的坐标按文件身份和转换模式缓存，文件只在末尾增长时只解析新增部分
+                convert = None
+                if convert_mode:
+                    convert = lambda points: self.converter.convert_array(points, convert_mode)
+                columns, positions, source = PARSE_CACHE.get(
+                    self.file_path, mode, convert, progress_callback=self.report_parse_progress, stats=stats)
+                print(f"解析缓存: {self.CACHE_SOURCES[source]}")
+            self.progress_updated.emit(60)
+            if stats:
+                print(f"NMEA语句: {stats.get('sentences', 0)} 条，合并为 {len(columns)} 个历元，"
+                      f"校验和错误 {stats.get('checksum_errors', 0)} 条")
+            
+            if not len(columns):
+                self.error_occurred.emit(empty_message)
+                return
+            
+            # 原地停留的连续定位合并为一个停留点，已转换的坐标按保留的行同步筛选
+            raw_count = len(columns)
+            columns, kept = compress_dwell(columns)
+            if len(columns) < raw_count:
+                print(f"停留段压缩: {raw_count} 个点 → {len(columns)} 个点")
+                if positions is not None:
+                    positions = np.asarray(positions, dtype=np.float64)[kept].tolist()
+            
+            wgs84_positions = columns.positions.tolist()
+            if positions is None:
+                if convert_mode:
+                    positions = self.converter.convert_coordinates(columns.positions, convert_mode)
                 else:
-                    self.error_occurred.emit("未找到有效的GPS数据")
+                    positions = wgs84_positions
+            
+            self.progress_updated.emit(80)
+            
+            # 生成轨迹文档（由已加载的地图外壳绘制）
+            detections = load_detection_events(self.converter, convert_mode)
+            document, info = create_track_document(positions, columns, coordinate_system, detections)
+            self.progress_updated.emit(100)
+            
+            if mode == "raw_to_gcj02":
+                wgs84_positions = []  # 原始数据模式没有WGS-84中间数据
+            self.processing_finished.emit(document, positions, info, wgs84_positions)
                     
         except Exception as e:
             self.error_occurred.emit(str(e))
     
+    def report_parse_progress(self, consumed, total):
+        """按已读取字节数更新进度（0~60%）"""
+        percent = int(consumed * 60 / total) if total else 60
+        if percent != self._last_percent:
+            self._last_percent = percent
+            self.progress_updated.emit(percent)
+    
     def parse_raw_gps_data(self, file_path):
         """
         解析原始GPS数据文件，提取原始字符串
         格式示例: 纬度: 2429.53531, 经度: 11810.78036
+        返回WGS-84坐标列表和按需生成字典的GPSColumns
         """
-        raw_positions = []
-        gps_data = []
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-            
-            print(f"原始数据文件行数: {len(lines)}")
-            
-            for line_num, line in enumerate(lines, 1):
-                line = line.strip()
-                
-                # 尝试匹配原始数据格式
-                # 格式1: 纬度: 2429.53531, 经度: 11810.78036
-                # 格式2: 2429.53531,11810.78036
-                # 格式3: LAT:2429.53531 LON:11810.78036
-                
-                # 提取纬度字符串
-                lat_match = re.search(r'(\d{4,5})\.(\d{5})', line)
-                lon_match = re.search(r'(\d{5,6})\.(\d{5})', line)
-                
-                if lat_match and lon_match:
-                    lat_str = lat_match.group(1)  # 2429
-                    lat_str2 = lat_match.group(2)  # 53531
-                    lon_str = lon_match.group(1)  # 11810
-                    lon_str2 = lon_match.group(2)  # 78036
-                    
-                    try:
-                        # 记录原始数据
-                        raw_data = {
-                            'lat_str': lat_str,
-                            'lat_str2': lat_str2,
-                            'lon_str': lon_str,
-                            'lon_str2': lon_str2,
-                            'raw_line': line[:100]
-                        }
-                        
-                        # 转换为WGS-84用于验证
-                        lat_84 = self.converter.str_To_Gps84(lat_str, lat_str2)
-                        lon_84 = self.converter.str_To_Gps84(lon_str, lon_str2)
-                        
-                        # 基本验证（中国范围）
-                        if 18 <= lat_84 <= 54 and 73 <= lon_84 <= 136:
-                            raw_positions.append(raw_data)
-                            
-                            # 同时记录转换后的数据用于显示
-                            gcj_coords = self.converter.raw_to_gcj02(lat_str, lat_str2, lon_str, lon_str2)
-                            pos_data = {
-                                'time': datetime.now().strftime("%H:%M:%S"),
-                                'latitude': gcj_coords[0],
-                                'longitude': gcj_coords[1],
-                                'raw_lat_str': f"{lat_str}.{lat_str2}",
-                                'raw_lon_str': f"{lon_str}.{lon_str2}",
-                                'wgs84_lat': lat_84,
-                                'wgs84_lon': lon_84,
-                                'type': 'RAW',
-                                'raw': line[:100]
-                            }
-                            gps_data.append(pos_data)
-                            
-                    except (ValueError, IndexError) as e:
-                        print(f"解析原始数据错误 (第{line_num}行): {e}")
-                        continue
-            
-            print(f"原始数据解析完成: 找到 {len(raw_positions)} 个有效点")
-            
-        except Exception as e:
-            print(f"解析原始文件错误: {e}")
-            import traceback
-            traceback.print_exc()
-        
-        return raw_positions, gps_data
+        columns = load_gps_columns(file_path, "raw_to_gcj02")
+        print(f"原始数据解析完成: 找到 {len(columns)} 个有效点")
+        return columns.positions.tolist(), columns
     
     def parse_txt_gps_data(self, file_path):
         """
@@ -358,122 +373,60 @@ class GPSProcessingThread(QThread):
         格式: 时间, 纬度, 经度, ...
         示例: 2026-01-20 12:02:02, 39.95903950, 116.35138717, 73.3, 1.9, 290.6, 13
         """
-        positions = []
-        gps_data = []
-        
+        columns = load_gps_columns(file_path, "txt_to_gcj02")
+        print(f".txt数据解析完成: 找到 {len(columns)} 个有效点")
+        return columns.positions.tolist(), columns
+
+class GPSBatchThread(QThread):
+    """批量处理整个目录：子进程并行解析和转换，完成后生成多轨迹地图"""
+    batch_finished = pyqtSignal(object, object, object)  # 轨迹文档, 信息, BatchResult
+    error_occurred = pyqtSignal(str)
+    progress_updated = pyqtSignal(int)
+    
+    def __init__(self, directory, conversion_mode="wgs84_to_gcj02"):
+        super().__init__()
+        self.directory = directory
+        # 批量模式按文件内容自动选择解析方式，只区分是否转换坐标
+        self.batch_mode = "no_conversion" if conversion_mode == "no_conversion" else "auto"
+    
+    def run(self):
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-            
-            print(f".txt文件行数: {len(lines)}")
-            
-            for line_num, line in enumerate(lines, 1):
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # 分割数据行
-                parts = line.split(',')
-                if len(parts) < 3:
-                    print(f"行 {line_num} 数据不足: {line}")
-                    continue
-                
-                try:
-                    # 解析时间
-                    time_str = parts[0].strip()
-                    
-                    # 解析纬度
-                    lat_str = parts[1].strip()
-                    latitude = float(lat_str)
-                    
-                    # 解析经度
-                    lon_str = parts[2].strip()
-                    longitude = float(lon_str)
-                    
-                    # 基本验证
-                    if latitude == 0 or longitude == 0:
-                        print(f"行 {line_num} 无效坐标: {latitude}, {longitude}")
-                        continue
-                    
-                    # 中国范围验证
-                    if not (18 <= latitude <= 54 and 73 <= longitude <= 136):
-                        print(f"行 {line_num} 坐标超出中国范围: {latitude}, {longitude}")
-                        continue
-                    
-                    # 如果有其他数据，解析它们
-                    altitude = 0.0
-                    speed = 0.0
-                    course = 0.0
-                    satellites = 0
-                    
-                    if len(parts) > 3:
-                        try:
-                            altitude = float(parts[3].strip())
-                        except:
-                            pass
-                    
-                    if len(parts) > 4:
-                        try:
-                            speed = float(parts[4].strip())
-                        except:
-                            pass
-                    
-                    if len(parts) > 5:
-                        try:
-                            course = float(parts[5].strip())
-                        except:
-                            pass
-                    
-                    if len(parts) > 6:
-                        try:
-                            satellites = int(float(parts[6].strip()))
-                        except:
-                            pass
-                    
-                    # 创建位置数据
-                    pos_data = {
-                        'time': time_str,
-                        'latitude': latitude,
-                        'longitude': longitude,
-                        'altitude': altitude,
-                        'speed': speed,
-                        'course': course,
-                        'satellites': satellites,
-                        'type': 'TXT',
-                        'raw': line[:100]
-                    }
-                    
-                    # folium需要[lon, lat]格式
-                    positions.append([longitude, latitude])
-                    gps_data.append(pos_data)
-                    
-                    print(f"行 {line_num} 解析成功: {latitude:.6f}, {longitude:.6f}")
-                    
-                except (ValueError, IndexError) as e:
-                    print(f"解析.txt数据错误 (第{line_num}行): {e}")
-                    continue
-            
-            print(f".txt数据解析完成: 找到 {len(positions)} 个有效点")
+            result = process_directory(self.directory, self.batch_mode,
+                                       progress_callback=self.report_progress)
+            if not result.summary['points']:
+                self.error_occurred.emit("目录中没有找到有效的GPS数据")
+                return
             
+            coordinate_system = ("WGS-84 (原始坐标系)" if self.batch_mode == "no_conversion"
+                                 else "GCJ-02 (批量转换)")
+            detections = load_detection_events(GPSCoordinateConverter(), self.batch_mode != "no_conversion")
+            document, info = create_batch_document(result, coordinate_system, detections)
+            self.progress_updated.emit(100)
+            self.batch_finished.emit(document, info, result)
         except Exception as e:
-            print(f"解析.txt文件错误: {e}")
-            import traceback
-            traceback.print_exc()
-        
-        return positions, gps_data
+            self.error_occurred.emit(str(e))
+    
+    def report_progress(self, done, total, name):
+        """文件处理阶段占进度的0~90%"""
+        self.progress_updated.emit(int(done * 90 / total))
 
 class GPSDataSaver(QThread):
     """GPS数据保存线程"""
     data_saved = pyqtSignal(str, bool)  # 文件名, 是否成功
     status_updated = pyqtSignal(str)
+    fix_received = pyqtSignal(object)   # 有效定位 {time, lat, lon, altitude, speed_knots, course, satellites}
     
-    def __init__(self, gps_json_url, save_interval=1.0):  # 修改：从5.0改为1.0秒
+    def __init__(self, client, save_interval=1.0):  # 修改：从5.0改为1.0秒
         super().__init__()
-        self.gps_json_url = gps_json_url
+        self.client = client  # ESP32Client，与界面的连接测试共用连接池
         self.save_interval = save_interval
         self.is_running = False
         self.save_directory = "gps_data"
         self.current_file = None
+        self.writer = None
+        self.flush_interval = 5.0   # 批量写入间隔（秒）
+        self.fsync_interval = 30.0  # 落盘间隔（秒）
+        self.compress_dwell = True  # 原地停留的连续定位只保存首尾两条记录
         self._mutex = QMutex()
         
         # 创建保存目录
@@ -486,32 +439,45 @@ class GPSDataSaver(QThread):
         
         # 记录保存点数的计数器
         save_count = 0
+        dwell = DwellCompressor() if self.compress_dwell else None
+        paused = False  # 熔断中（只提示一次）
         
         while self.is_running:
             try:
-                # 获取GPS JSON数据
-                response = requests.get(self.gps_json_url, timeout=1.5)  # 减少超时时间
+                # 获取GPS JSON数据（长连接复用，超时见 ENDPOINT_TIMEOUTS）
+                response = self.client.get('/gps/json')
+                paused = False
                 if response.status_code == 200:
                     gps_data = response.json()
                     
                     if gps_data.get('valid', False):
                         # 打开或创建文件
-                        if self.current_file is None:
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            self.current_file = os.path.join(self.save_directory, f"gps_data_{timestamp}.txt")
-                            self.status_updated.emit(f"创建新数据文件: {os.path.basename(self.current_file)}")
+                        if self.writer is None:
+                            if self.current_file is None:
+                                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                                self.current_file = os.path.join(self.save_directory,
+                                                                 f"gps_data_{timestamp}{TRACK_SUFFIX}")
+                                self.status_updated.emit(f"创建新数据文件: {os.path.basename(self.current_file)}")
+                            self.writer = GPSTrackWriter(self.current_file,
+                                                         flush_interval=self.flush_interval,
+                                                         fsync_interval=self.fsync_interval)
                         
-                        # 保存数据（保存为.txt格式，便于后续解析）
-                        with open(self.current_file, 'a', encoding='utf-8') as f:
-                            time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]  # 增加毫秒级精度
-                            data_line = f"{time_str}, {gps_data.get('lat', 0):.8f}, {gps_data.get('lon', 0):.8f}, "
-                            data_line += f"{gps_data.get('altitude', 0):.1f}, {gps_data.get('speed_knots', 0):.1f}, "
-                            data_line += f"{gps_data.get('course', 0):.1f}, {gps_data.get('satellites', 0)}\n"
-                            f.write(data_line)
+                        # 保存数据（二进制定长记录，打开时无需解析；需要文本时可导出为.txt）
+                        # 写入器保持文件常开，按flush_interval批量写入、按fsync_interval落盘
+                        fix = {
+                            'time': local_timestamp(),  # 毫秒级精度
+                            'lat': gps_data.get('lat', 0), 'lon': gps_data.get('lon', 0),
+                            'altitude': gps_data.get('altitude', 0), 'speed_knots': gps_data.get('speed_knots', 0),
+                            'course': gps_data.get('course', 0), 'satellites': gps_data.get('satellites', 0),
+                        }
+                        # 停留段压缩：低速点可能暂存，停留满时长后只写首尾两条记录
+                        self.write_records(dwell.push(fix) if dwell else [(fix, 0)])
+                        self.fix_received.emit(fix)
                         
                         save_count += 1
                         if save_count % 10 == 0:  # 每10个点输出一次状态
-                            self.status_updated.emit(f"已保存 {save_count} 个GPS数据点")
+                            self.status_updated.emit(f"已保存 {save_count} 个GPS数据点，"
+                                                     f"写入 {self.writer.count} 条记录")
                         
                         self.data_saved.emit(self.current_file, True)
                     else:
@@ -519,6 +485,12 @@ class GPSDataSaver(QThread):
                 
                 time.sleep(self.save_interval)
                 
+            except CircuitOpenError as e:
+                # ESP32连续无响应，熔断期间不发请求
+                if not paused:
+                    paused = True
+                    self.status_updated.emit(str(e))
+                time.sleep(self.save_interval)
             except requests.exceptions.Timeout:
                 # 超时时不记录为错误，继续尝试
                 pass
@@ -526,6 +498,19 @@ class GPSDataSaver(QThread):
                 if self.is_running:  # 只在运行状态下记录错误
                     self.status_updated.emit(f"保存GPS数据错误: {str(e)}")
                 time.sleep(self.save_interval)
+        
+        if self.writer is not None:
+            if dwell:
+                self.write_records(dwell.flush())
+            self.writer.close()
+            self.writer = None
+        self.status_updated.emit(f"ESP32请求统计: {self.client.format_stats()}")
+    
+    def write_records(self, records):
+        """写入 [(定位, 标志)]"""
+        for fix, flags in records:
+            self.writer.append(fix['time'], fix['lat'], fix['lon'], fix['altitude'],
+                               fix['speed_knots'], fix['course'], fix['satellites'], flags)
     
     def stop(self):
         with QMutexLocker(self._mutex):
@@ -535,400 +520,451 @@ class GPSDataSaver(QThread):
     def get_saved_files(self):
         """获取所有保存的GPS数据文件"""
         if os.path.exists(self.save_directory):
-            files = [f for f in os.listdir(self.save_directory) if f.endswith('.txt')]
+            files = [f for f in os.listdir(self.save_directory) if f.endswith(('.txt', TRACK_SUFFIX))]
             files.sort(reverse=True)  # 按时间倒序排列
             return [os.path.join(self.save_directory, f) for f in files]
         return []
     
     def read_file_content(self, file_path):
-        """读取文件内容"""
+        """读取文件内容（二进制轨迹转换为文本格式）"""
         try:
+            if is_track_file(file_path):
+                return "".join(format_track_lines(read_track(file_path)))
             with open(file_path, 'r', encoding='utf-8') as f:
                 return f.read()
         except Exception as e:
             return f"读取文件错误: {str(e)}"
 
+class GPSCatalogScanThread(QThread):
+    """后台同步GPS文件目录数据库（只统计新增或变化的文件）"""
+    scan_finished = pyqtSignal(int, int)  # 更新数, 删除数
+    
+    def __init__(self, catalog):
+        super().__init__()
+        self.catalog = catalog
+    
+    def run(self):
+        try:
+            updated, removed = self.catalog.scan()
+            self.scan_finished.emit(updated, removed)
+        except Exception as e:
+            print(f"同步GPS文件目录错误: {e}")
+
 def parse_gps_data_from_file(file_path):
     """
     解析GPS数据文件，支持多种NMEA格式
-    参考文档中的解析方法
+    返回 [经度, 纬度] 列表和GPSColumns（按需生成每个点的字典）
     """
-    positions = []
-    gps_data = []
-    converter = GPSCoordinateConverter()
-    
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-        
-        print(f"文件行数: {len(lines)}")
-        
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line.startswith('$'):
-                continue
-            
-            # 解析GNRMC/GPRMC数据
-            if ('GNRMC' in line or 'GPRMC' in line):
-                try:
-                    parts = line.split(',')
-                    if len(parts) < 7:
-                        continue
-                    
-                    if parts[2] != 'A':  # 状态无效则跳过
-                        continue
-                    
-                    # 解析时间
-                    time_str = parts[1]
-                    if len(time_str) >= 6:
-                        hour = time_str[:2]
-                        minute = time_str[2:4]
-                        second = time_str[4:6]
-                        time_display = f"{hour}:{minute}:{second}"
-                    else:
-                        time_display = time_str
-                    
-                    # 解析日期
-                    date_str = parts[9] if len(parts) > 9 else ""
-                    if len(date_str) == 6:
-                        day = date_str[:2]
-                        month = date_str[2:4]
-                        year = date_str[4:6]
-                        date_display = f"20{year}-{month}-{day}"
-                    else:
-                        date_display = ""
-                    
-                    # 解析纬度 (DDMM.MMMM格式)
-                    lat_str = parts[3]
-                    lat_dir = parts[4]
-                    if lat_str and len(lat_str) >= 4:
-                        try:
-                            # 使用转换器将度分格式转换为十进制度
-                            latitude = converter.str_To_Gps84(lat_str, "0")
-                            if lat_dir == 'S':
-                                latitude = -latitude
-                        except ValueError:
-                            # 备用解析方法
-                            try:
-                                lat_deg = float(lat_str[:2])
-                                lat_min = float(lat_str[2:])
-                                latitude = lat_deg + lat_min / 60.0
-                                if lat_dir == 'S':
-                                    latitude = -latitude
-                            except:
-                                continue
-                    else:
-                        continue
-                    
-                    # 解析经度 (DDDMM.MMMM格式)
-                    lon_str = parts[5]
-                    lon_dir = parts[6]
-                    if lon_str and len(lon_str) >= 5:
-                        try:
-                            # 使用转换器将度分格式转换为十进制度
-                            longitude = converter.str_To_Gps84(lon_str, "0")
-                            if lon_dir == 'W':
-                                longitude = -longitude
-                        except ValueError:
-                            # 备用解析方法
-                            try:
-                                lon_deg = float(lon_str[:3])
-                                lon_min = float(lon_str[3:])
-                                longitude = lon_deg + lon_min / 60.0
-                                if lon_dir == 'W':
-                                    longitude = -longitude
-                            except:
-                                continue
-                    else:
-                        continue
-                    
-                    # 速度（节转换为米/秒）
-                    try:
-                        speed_knots = float(parts[7]) if parts[7] else 0.0
-                        speed_mps = speed_knots * 0.51444
-                    except:
-                        speed_knots = 0.0
-                        speed_mps = 0.0
-                    
-                    # 方位角
-                    try:
-                        course = float(parts[8]) if parts[8] else 0.0
-                    except:
-                        course = 0.0
-                    
-                    # 基本验证（中国范围）
-                    if not (18 <= latitude <= 54 and 73 <= longitude <= 136):
-                        print(f"坐标超出中国范围: {latitude}, {longitude}")
-                        continue
-                    
-                    pos_data = {
-                        'time': time_display,
-                        'date': date_display,
-                        'latitude': latitude,
-                        'longitude': longitude,
-                        'speed_knots': speed_knots,
-                        'speed_mps': speed_mps,
-                        'course': course,
-                        'type': 'RMC',
-                        'raw': line[:100]  # 只保存前100个字符
-                    }
-                    
-                    positions.append([longitude, latitude])  # folium需要[lon, lat]格式
-                    gps_data.append(pos_data)
-                    
-                except (ValueError, IndexError) as e:
-                    print(f"解析RMC数据错误 (第{line_num}行): {e}")
-                    continue
-            
-            # 解析GNGGA/GPGGA数据
-            elif ('GNGGA' in line or 'GPGGA' in line):
-                try:
-                    parts = line.split(',')
-                    if len(parts) < 10:
-                        continue
-                    
-                    if parts[6] == '0':  # 定位质量无效
-                        continue
-                    
-                    # 解析时间
-                    time_str = parts[1]
-                    if len(time_str) >= 6:
-                        hour = time_str[:2]
-                        minute = time_str[2:4]
-                        second = time_str[4:6]
-                        time_display = f"{hour}:{minute}:{second}"
-                    else:
-                        time_display = time_str
-                    
-                    # 解析纬度
-                    lat_str = parts[2]
-                    lat_dir = parts[3]
-                    if lat_str and len(lat_str) >= 4:
-                        try:
-                            # 使用转换器将度分格式转换为十进制度
-                            latitude = converter.str_To_Gps84(lat_str, "0")
-                            if lat_dir == 'S':
-                                latitude = -latitude
-                        except ValueError:
-                            # 备用解析方法
-                            try:
-                                lat_deg = float(lat_str[:2])
-                                lat_min = float(lat_str[2:])
-                                latitude = lat_deg + lat_min / 60.0
-                                if lat_dir == 'S':
-                                    latitude = -latitude
-                            except:
-                                continue
-                    else:
-                        continue
-                    
-                    # 解析经度
-                    lon_str = parts[4]
-                    lon_dir = parts[5]
-                    if lon_str and len(lon_str) >= 5:
-                        try:
-                            # 使用转换器将度分格式转换为十进制度
-                            longitude = converter.str_To_Gps84(lon_str, "0")
-                            if lon_dir == 'W':
-                                longitude = -longitude
-                        except ValueError:
-                            # 备用解析方法
-                            try:
-                                lon_deg = float(lon_str[:3])
-                                lon_min = float(lon_str[3:])
-                                longitude = lon_deg + lon_min / 60.0
-                                if lon_dir == 'W':
-                                    longitude = -longitude
-                            except:
-                                continue
-                    else:
-                        continue
-                    
-                    # 基本验证
-                    if not (18 <= latitude <= 54 and 73 <= longitude <= 136):
-                        print(f"坐标超出中国范围: {latitude}, {longitude}")
-                        continue
-                    
-                    # 卫星数量和HDOP
-                    try:
-                        satellites = int(parts[7]) if parts[7] else 0
-                    except:
-                        satellites = 0
-                    
-                    try:
-                        hdop = float(parts[8]) if parts[8] else 0.0
-                    except:
-                        hdop = 0.0
-                    
-                    # 海拔高度
-                    try:
-                        altitude = float(parts[9]) if parts[9] else 0.0
-                    except:
-                        altitude = 0.0
-                    
-                    pos_data = {
-                        'time': time_display,
-                        'latitude': latitude,
-                        'longitude': longitude,
-                        'satellites': satellites,
-                        'hdop': hdop,
-                        'altitude': altitude,
-                        'type': 'GGA',
-                        'raw': line[:100]
-                    }
-                    
-                    positions.append([longitude, latitude])
-                    gps_data.append(pos_data)
-                    
-                except (ValueError, IndexError) as e:
-                    print(f"解析GGA数据错误 (第{line_num}行): {e}")
-                    continue
-        
-        print(f"解析完成: 找到 {len(positions)} 个有效GPS点")
-        
-        # 如果没有解析到有效数据，尝试使用其他方法
-        if not positions:
-            print("尝试备用解析方法...")
-            positions, gps_data = alternative_parse_method(file_path)
-            
+        # 行首未找到语句时，load_gps_columns会自动使用备用解析方法
+        stats = {}
+        columns = load_gps_columns(file_path, "wgs84_to_gcj02", stats=stats)
+        print(f"解析完成: {stats.get('sentences', 0)} 条语句合并为 {len(columns)} 个历元，"
+              f"丢弃 {stats.get('checksum_errors', 0)} 条校验和错误的语句")
+        return columns.positions.tolist(), columns
     except Exception as e:
         print(f"解析文件错误: {e}")
         import traceback
         traceback.print_exc()
-    
-    return positions, gps_data
+        return [], []
 
 def alternative_parse_method(file_path):
     """
-    备用解析方法，参考文档中的方法
+    备用解析方法：查找行内任意位置的RMC语句
     """
-    positions = []
-    gps_data = []
-    converter = GPSCoordinateConverter()
-    
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-        
-        # 查找所有GPS数据行
-        gps_lines = re.findall(r'\$G[N|P][A-Z]{3},[^\r\n]*', content)
-        
-        print(f"备用方法找到 {len(gps_lines)} 行GPS数据")
-        
-        for line in gps_lines:
-            line = line.strip()
-            if 'GNRMC' in line or 'GPRMC' in line:
-                # 使用参考资料中的简单解析方法
-                parts = line.split(',')
-                if len(parts) >= 7 and parts[2] == 'A':
-                    try:
-                        # 解析纬度 (DDMM.MMMM格式)
-                        lat_str = parts[3]
-                        lat_dir = parts[4]
-                        if lat_str and len(lat_str) >= 4:
-                            latitude = converter.str_To_Gps84(lat_str, "0")
-                            if lat_dir == 'S':
-                                latitude = -latitude
-                        else:
-                            continue
-                        
-                        # 解析经度 (DDDMM.MMMM格式)
-                        lon_str = parts[5]
-                        lon_dir = parts[6]
-                        if lon_str and len(lon_str) >= 5:
-                            longitude = converter.str_To_Gps84(lon_str, "0")
-                            if lon_dir == 'W':
-                                longitude = -longitude
-                        else:
-                            continue
-                        
-                        # 基本验证
-                        if latitude == 0 or longitude == 0:
-                            continue
-                            
-                        if 18 <= latitude <= 54 and 73 <= longitude <= 136:  # 中国大致范围
-                            positions.append([longitude, latitude])
-                            gps_data.append({
-                                'latitude': latitude,
-                                'longitude': longitude,
-                                'time': parts[1][:6] if len(parts[1]) >= 6 else parts[1],
-                                'type': 'RMC',
-                                'raw': line[:100]
-                            })
-                            
-                    except (ValueError, IndexError) as e:
-                        continue
-                        
+        parts = [columns for columns, _, _ in iter_gps_columns(file_path, anchored=False)]
+        columns = GPSColumns.concat(parts)
+        columns = columns.take((columns.kind & KIND_RMC) != 0)
+        print(f"备用方法找到 {len(columns)} 个GPS点")
+        return columns.positions.tolist(), columns
     except Exception as e:
         print(f"备用解析方法错误: {e}")
+        return [], []
+
+# ========== 地图外壳与轨迹文档 ==========
+# 地图页面（瓦片、控件、绘制脚本）只生成一次，由进程内地图服务发布；
+# 每个轨迹文件只生成一份JSON轨迹文档，页面通过 loadTrack(url) 加载后在原地图上重绘。
+
+AMAP_ATTRIBUTION = '© <a href="http://ditu.amap.com/">高德地图</a>'
+MAP_SHELL_PATH = '/map/shell.html'
+WAYPOINT_STEP = 10   # 每隔多少个点放一个途经点
+
+class TrackViewer(JSCSSMixin):
+    """
+    地图外壳中的轨迹绘制脚本
+
+        showTrack(文档)   清除当前轨迹，绘制文档中的轨迹、标记和信息面板
+        loadTrack(url)    从地图服务获取轨迹文档后调用 showTrack
+        liveStart(选项) / liveAppend(纬度, 经度, 统计HTML) / liveFollow(是否跟随)
+                          实时轨迹：逐点追加到折线末尾并移动当前位置标记
+        liveOverlay(图层) 实时热力图：替换图片图层的URL
+
+    文档中的 overlays（热力图等）以图片图层显示，可在图层控件中开关。
+    途经点（waypoints）只传差分编码的坐标数组，由聚合图层显示；弹窗内容在点击时才生成。
+
+    轨迹折线使用顶点金字塔（坐标按1e-6度取整后差分编码，以及每个顶点开始出现的缩放级别），
+    地图缩放结束时每条折线只绘制当前级别的顶点。
+    实时折线按固定点数分段，追加一个点只重新投影最后一段，耗时与轨迹长度无关。
+    """
+    default_js = plugins.MarkerCluster.default_js
+    default_css = plugins.MarkerCluster.default_css
     
-    return positions, gps_data
+    _template = Template("""
+        {% macro header(this, kwargs) %}
+        <style>
+            .track-waypoint {
+                background: #3388ff; border: 1px solid #ffffff; border-radius: 50%; opacity: 0.8;
+            }
+        </style>
+        {% endmacro %}
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var layerControl = L.control.layers(null, null, {position: 'topright'}).addTo(map);
+            var panel = document.createElement('div');
+            document.body.appendChild(panel);
+            var layers = [], pyramids = [], serial = 0;
+
+            function decode(encoded) {
+                var dLat = encoded.d_lat, dLon = encoded.d_lon;
+                var points = new Array(dLat.length), lat = 0, lon = 0;
+                for (var i = 0; i < dLat.length; i++) {
+                    lat += dLat[i];
+                    lon += dLon[i];
+                    points[i] = [lat / 1e6, lon / 1e6];
+                }
+                return points;
+            }
+
+            function updateLevels() {
+                var zoom = map.getZoom();
+                pyramids.forEach(function(p) {
+                    var z = Math.min(zoom, p.maxZoom);
+                    if (z === p.shown) return;
+                    p.shown = z;
+                    var latlngs = [];
+                    for (var i = 0; i < p.zooms.length; i++) {
+                        if (p.zooms[i] <= z) latlngs.push(p.points[i]);
+                    }
+                    p.lines.forEach(function(line) { line.setLatLngs(latlngs); });
+                });
+            }
+            map.on('zoomend', updateLevels);
+
+            function bind(layer, spec) {
+                if (spec.popup) layer.bindPopup(spec.popup, {maxWidth: spec.max_width || 250});
+                if (spec.tooltip) layer.bindTooltip(spec.tooltip);
+                return layer;
+            }
+
+            function addMarker(group, spec) {
+                var latlng = [spec.lat, spec.lon];
+                var marker = spec.icon ? L.marker(latlng, {icon: L.AwesomeMarkers.icon(spec.icon)})
+                                       : L.circleMarker(latlng, spec.style);
+                bind(marker, spec).addTo(group);
+            }
+
+            // 途经点：聚合图层分批加入，标记共用一个图标；
+            // 标记上不绑定弹窗，点击时按数组下标生成一个弹窗
+            var waypointIcon = L.divIcon({className: 'track-waypoint', iconSize: [8, 8]});
+
+            function addWaypoints(group, waypoints, coordinateSystem) {
+                var points = decode(waypoints);
+                var markers = new Array(points.length);
+                for (var i = 0; i < points.length; i++) {
+                    markers[i] = L.marker(points[i], {icon: waypointIcon, index: i});
+                }
+                var cluster = L.markerClusterGroup({chunkedLoading: true, showCoverageOnHover: false,
+                                                    disableClusteringAtZoom: 19, maxClusterRadius: 60});
+                cluster.addLayers(markers);
+                cluster.on('click', function(e) {
+                    var i = e.layer.options.index, latlng = points[i];
+                    L.popup({maxWidth: 250}).setLatLng(latlng).setContent(
+                        '<div style="font-family: Arial, sans-serif; max-width: 200px;">' +
+                        '<b>点 ' + (waypoints.start + i * waypoints.step + 1) + '</b><br>' +
+                        '<b>纬度:</b> ' + latlng[0].toFixed(6) + '<br>' +
+                        '<b>经度:</b> ' + latlng[1].toFixed(6) + '<br>' +
+                        '<b>坐标系:</b> ' + coordinateSystem + '</div>').openOn(map);
+                });
+                cluster.addTo(group);
+            }
+
+            function imageOverlay(spec) {
+                var overlay = L.imageOverlay(spec.image, spec.bounds, {opacity: spec.opacity, interactive: false});
+                layerControl.addOverlay(overlay, spec.name);
+                if (spec.show) overlay.addTo(map);
+                return overlay;
+            }
+
+            function clearTrack() {
+                clearLive();
+                layers.forEach(function(layer) {
+                    layerControl.removeLayer(layer);
+                    map.removeLayer(layer);
+                });
+                layers = [];
+                pyramids = [];
+                panel.innerHTML = '';
+            }
+
+            window.showTrack = function(doc) {
+                clearTrack();
+                (doc.tracks || []).forEach(function(track) {
+                    var group = L.featureGroup().addTo(map);
+                    layers.push(group);
+                    if (track.name) layerControl.addOverlay(group, track.name);
+                    if (track.pyramid) {
+                        var lines = track.lines.map(function(style) {
+                            return bind(L.polyline([], style.options), style).addTo(group);
+                        });
+                        pyramids.push({points: decode(track.pyramid), zooms: track.pyramid.zooms,
+                                       maxZoom: track.pyramid.max_zoom, lines: lines, shown: -1});
+                    }
+                    (track.markers || []).forEach(function(spec) { addMarker(group, spec); });
+                    if (track.waypoints) addWaypoints(group, track.waypoints, doc.coordinate_system);
+                });
+                (doc.overlays || []).forEach(function(spec) { layers.push(imageOverlay(spec)); });
+                panel.innerHTML = doc.panel || '';
+                if (doc.bounds) {
+                    map.fitBounds(doc.bounds);
+                } else {
+                    map.setView(doc.center, doc.zoom);
+                }
+                updateLevels();
+            };
+
+            var LIVE_CHUNK = 500;  // 实时折线每段的点数
+            var live = null;
+
+            function clearLive() {
+                if (live) {
+                    map.removeLayer(live.group);
+                    if (live.overlay) {
+                        layerControl.removeLayer(live.overlay);
+                        map.removeLayer(live.overlay);
+                    }
+                }
+                live = null;
+            }
 
-def create_folium_map_with_track(positions, gps_data, coordinate_system="GCJ-02 (高德地图坐标系)"):
+            window.liveStart = function(options) {
+                options = options || {};
+                clearTrack();
+                live = {group: L.featureGroup().addTo(map), line: null, count: 0, last: null, marker: null,
+                        follow: !!options.follow, style: options.style || {color: '#D32F2F', weight: 3}};
+                panel.innerHTML = options.panel || '';
+            };
+
+            window.liveAppend = function(lat, lon, statsHtml) {
+                if (!live) window.liveStart({});
+                var latlng = [lat, lon];
+                if (!live.line || live.count >= LIVE_CHUNK) {
+                    // 新的一段从上一段的最后一个点开始，保持折线连续
+                    live.line = L.polyline(live.last ? [live.last] : [], live.style).addTo(live.group);
+                    live.count = live.last ? 1 : 0;
+                }
+                live.line.addLatLng(latlng);
+                live.count++;
+                if (live.marker) {
+                    live.marker.setLatLng(latlng);
+                } else {
+                    live.marker = L.circleMarker(latlng, {radius: 7, color: '#FFFFFF', weight: 2, fill: true,
+                                                          fillColor: live.style.color, fillOpacity: 1})
+                        .bindTooltip('当前位置').addTo(live.group);
+                }
+                if (!live.last) {
+                    map.setView(latlng, Math.max(map.getZoom(), 17));
+                } else if (live.follow) {
+                    map.panTo(latlng);
+                }
+                live.last = latlng;
+                if (statsHtml) {
+                    var stats = document.getElementById('live-stats');
+                    if (stats) stats.innerHTML = statsHtml;
+                }
+            };
+
+            window.liveOverlay = function(spec) {
+                if (!live) return;
+                if (live.overlay) {
+                    live.overlay.setUrl(spec.image);
+                } else {
+                    live.overlay = imageOverlay(spec);
+                }
+            };
+
+            window.liveFollow = function(follow) {
+                if (!live) return;
+                live.follow = follow;
+                if (follow && live.last) map.panTo(live.last);
+            };
+
+            // 只显示最后一次请求的轨迹（连续切换文件时较早的请求可能较晚返回）
+            window.loadTrack = function(url) {
+                var request = ++serial;
+                return fetch(url)
+                    .then(function(response) { return response.json(); })
+                    .then(function(doc) { if (request === serial) window.showTrack(doc); })
+                    .catch(function(e) { console.error('加载轨迹失败: ' + url, e); });
+            };
+        })();
+        {% endmacro %}
+    """)
+    
+    def __init__(self):
+        super().__init__()
+        self._name = 'TrackViewer'
+
+def build_map_shell(tiles=AMAP_TILES):
     """
-    使用Folium创建带有轨迹的地图（仅使用高德地图）
-    参考文档中的Folium使用方法
+    地图外壳：高德瓦片、控件和轨迹绘制脚本，不含任何轨迹数据
+    tiles 为瓦片地址模板；由地图服务提供页面时使用本地瓦片缓存 TILE_URL
+    """
+    m = folium.Map(
+        location=[39.9042, 116.4074],
+        zoom_start=17,
+        tiles=tiles,
+        attr=AMAP_ATTRIBUTION,
+        control_scale=True,
+        zoom_control=True,
+        prefer_canvas=True,  # 使用canvas提高性能
+        max_zoom=20,
+        min_zoom=3,
+    )
+    plugins.ScrollZoomToggler().add_to(m)
+    plugins.MousePosition().add_to(m)
+    plugins.Fullscreen(
+        position='topright',
+        title='全屏',
+        title_cancel='退出全屏',
+        force_separate_button=True
+    ).add_to(m)
+    plugins.MeasureControl(
+        position='topright',
+        primary_length_unit='meters',
+        secondary_length_unit='kilometers'
+    ).add_to(m)
+    TrackViewer().add_to(m)
+    return m
+
+_map_shell_html = {}
+
+def map_shell_html(tiles=AMAP_TILES):
+    """地图外壳HTML（每种瓦片地址只渲染一次）"""
+    if tiles not in _map_shell_html:
+        _map_shell_html[tiles] = build_map_shell(tiles).get_root().render()
+    return _map_shell_html[tiles]
+
+def dump_map_document(document):
+    """轨迹文档 → 紧凑JSON"""
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+
+def render_standalone_map(document, tiles=AMAP_TILES):
+    """
+    外壳页面 + 内嵌的轨迹文档 → 可单独打开的完整HTML（导出、在浏览器中查看）
+    导出的文件脱离地图服务打开，默认直接使用高德瓦片地址
+    """
+    html, end, tail = map_shell_html(tiles).rpartition('</html>')
+    data = dump_map_document(document).replace('</', '<\\/')  # 不能提前结束<script>
+    script = f"<script>showTrack({data});</script>\n"
+    return html + script + end + tail
+
+def delta_e6(latitude, longitude):
+    """坐标按1e-6度取整后差分编码（页面中由 decode 还原）"""
+    lat_e6 = np.round(np.asarray(latitude, dtype=np.float64) * 1e6).astype(np.int64)
+    lon_e6 = np.round(np.asarray(longitude, dtype=np.float64) * 1e6).astype(np.int64)
+    return {'d_lat': np.diff(lat_e6, prepend=0).tolist(), 'd_lon': np.diff(lon_e6, prepend=0).tolist()}
+
+def simplified_track(latitude, longitude, line_styles, zoom_start=17):
+    """
+    轨迹按缩放级别化简 → 轨迹文档中的一条轨迹
+
+    line_styles 为每条折线的Leaflet样式（可带 popup / tooltip），同一轨迹的多条折线共用一份顶点数据。
+    返回 (轨迹, 化简统计)；统计含顶点数、初始级别顶点数、顶点数据字节数与全分辨率折线字节数的对比
+    """
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    pyramid = TrackPyramid(latitude, longitude)
+    idx = pyramid.indices
+    data = dict(delta_e6(latitude[idx], longitude[idx]),
+                zooms=pyramid.zooms.tolist(), max_zoom=pyramid.max_zoom)
+    lines = []
+    for style in line_styles:
+        style = dict(style)
+        lines.append({'popup': style.pop('popup', None), 'tooltip': style.pop('tooltip', None), 'options': style})
+    
+    # 旧方式：每条折线各嵌入一份全分辨率坐标
+    full_bytes = len(json.dumps(np.column_stack((latitude, longitude)).tolist())) * len(line_styles)
+    counts = pyramid.level_counts()
+    stats = {
+        'points': len(latitude),
+        'vertices': len(idx),
+        'initial_vertices': counts.get(zoom_start, len(idx)),
+        'level_counts': counts,
+        'data_bytes': len(json.dumps(data, separators=(',', ':'))),
+        'full_bytes': full_bytes,
+    }
+    return {'pyramid': data, 'lines': lines, 'markers': []}, stats
+
+def icon_marker(lat, lon, popup, tooltip, color, icon, prefix='glyphicon'):
+    """图标标记（与 folium.Icon 相同的 AwesomeMarkers 图标）"""
+    return {'lat': float(lat), 'lon': float(lon), 'popup': popup, 'tooltip': tooltip,
+            'icon': {'markerColor': color, 'iconColor': 'white', 'icon': icon, 'prefix': prefix}}
+
+def heatmap_overlays(latitude, longitude, detections=None):
+    """
+    轨迹停留热力图和检测事件热力图（同一网格）
+
+    detections 为 (纬度, 经度, 权重) 数组，坐标系与轨迹相同；
+    无论点数和事件数多少，每张热力图在文档中都只是一张PNG
+    """
+    track_heat = GridHeatmap.covering(latitude, longitude)
+    track_heat.add(latitude, longitude)
+    overlays = [track_heat.overlay('轨迹热力图', show=False)]
+    if detections is not None and len(detections[0]):
+        detection_heat = track_heat.empty_copy()
+        if detection_heat.add(*detections):
+            overlays.append(detection_heat.overlay('检测热力图', opacity=0.8))
+            print(f"检测热力图: {detection_heat.total} 次检测（区域外 {detection_heat.outside} 次）")
+    print(f"热力图网格: {track_heat.rows}x{track_heat.cols}，每格 {track_heat.cell_m:.1f} 米")
+    return overlays
+
+def format_simplification(stats):
+    """化简统计 → 一行说明"""
+    return (f"轨迹化简: {stats['points']} 点 → 初始级别 {stats['initial_vertices']} 个顶点"
+            f"（最高级别 {stats['vertices']} 个），"
+            f"折线数据 {stats['full_bytes'] / 1024:.0f} KB → {stats['data_bytes'] / 1024:.0f} KB")
+
+def create_track_document(positions, gps_data, coordinate_system="GCJ-02 (高德地图坐标系)", detections=None):
+    """
+    单个文件的轨迹 → 轨迹文档（仅使用高德地图）
+    返回 (文档, 信息)；文档由地图外壳的 showTrack 绘制
+    detections 为检测事件 (纬度, 经度, 权重)，用于检测热力图
     """
     if not positions:
         return None, {"error": "没有有效的GPS数据"}
     
     try:
         # 计算中心点
-        lats = [pos[1] for pos in positions]  # 纬度
-        lons = [pos[0] for pos in positions]  # 经度
-        
-        center_lat = sum(lats) / len(lats)
-        center_lon = sum(lons) / len(lons)
+        lonlat = np.asarray(positions, dtype=np.float64)
+        center_lon, center_lat = (float(v) for v in lonlat.mean(axis=0))
         
         print(f"中心点: {center_lat:.6f}, {center_lon:.6f}")
         print(f"使用的坐标系: {coordinate_system}")
         
-        # 创建Folium地图（仅使用高德地图）
-        # 高德地图瓦片URL - 使用GCJ-02坐标系
-        tiles_url = 'http://webst02.is.autonavi.com/appmaptile?style=7&x={x}&y={y}&z={z}'
-        attribution = '© <a href="http://ditu.amap.com/">高德地图</a>'
-        
-        # 创建地图，设置最大缩放级别为20（提供更详细的视图）
-        m = folium.Map(
-            location=[center_lat, center_lon],
-            zoom_start=17,  # 提高初始缩放级别
-            tiles=tiles_url,
-            attr=attribution,
-            control_scale=True,
-            zoom_control=True,  # 启用缩放控件
-            prefer_canvas=True,  # 使用canvas提高性能
-            max_zoom=20,  # 设置最大缩放级别为20
-            min_zoom=3,   # 最小缩放级别
-        )
-        
-        # 添加缩放控件
-        folium.plugins.ScrollZoomToggler().add_to(m)
-        
-        # 添加鼠标位置显示
-        folium.plugins.MousePosition().add_to(m)
-        
-        # 添加轨迹线
-        if len(positions) > 1:
-            # 使用文档中的PolyLine方法
-            folium.PolyLine(
-                positions,
-                weight=3,
-                color='#FF6600',  # 橙色
-                opacity=0.8,
-                popup='GPS轨迹',
-                tooltip='点击查看详细信息'
-            ).add_to(m)
-            
-            # 添加轨迹填充效果
-            folium.PolyLine(
-                positions,
-                weight=6,
-                color='#FF6600',
-                opacity=0.2,
-            ).add_to(m)
-        
-        # 添加起点和终点标记
+        track = {'lines': [], 'markers': []}
+        simplification = None
         if len(positions) >= 2:
+            # 添加轨迹线（按缩放级别化简，两条折线共用一份顶点数据）
+            track, simplification = simplified_track(lonlat[:, 1], lonlat[:, 0], [
+                dict(weight=3, color='#FF6600', opacity=0.8,  # 橙色
+                     popup='GPS轨迹', tooltip='点击查看详细信息'),
+                # 轨迹填充效果
+                dict(weight=6, color='#FF6600', opacity=0.2),
+            ])
+            print(format_simplification(simplification))
+            
             # 起点标记
             start_time = gps_data[0].get('time', 'N/A')
             start_popup = f'''
@@ -941,13 +977,8 @@ def create_folium_map_with_track(positions, gps_data, coordinate_system="GCJ-02
                 <b>坐标系:</b> {coordinate_system}
             </div>
             '''
-            
-            folium.Marker(
-                [positions[0][1], positions[0][0]],  # [lat, lon]
-                popup=folium.Popup(start_popup, max_width=250),
-                tooltip='起点',
-                icon=folium.Icon(color='green', icon='play', prefix='fa')
-            ).add_to(m)
+            track['markers'].append(icon_marker(positions[0][1], positions[0][0], start_popup, '起点',
+                                                'green', 'play', prefix='fa'))
             
             # 终点标记
             end_time = gps_data[-1].get('time', 'N/A')
@@ -961,39 +992,19 @@ def create_folium_map_with_track(positions, gps_data, coordinate_system="GCJ-02
                 <b>坐标系:</b> {coordinate_system}
             </div>
             '''
+            track['markers'].append(icon_marker(positions[-1][1], positions[-1][0], end_popup, '终点',
+                                                'red', 'stop', prefix='fa'))
             
-            folium.Marker(
-                [positions[-1][1], positions[-1][0]],
-                popup=folium.Popup(end_popup, max_width=250),
-                tooltip='终点',
-                icon=folium.Icon(color='red', icon='stop', prefix='fa')
-            ).add_to(m)
-            
-            # 计算轨迹长度
-            total_distance = calculate_total_distance(positions)
-            distance_info = f"轨迹长度: {total_distance:.2f}米"
+            # 轨迹统计：距离、速度、运动/静止时间（向量化计算）
+            track_stats = analyze_track(lonlat[:, 1], lonlat[:, 0], getattr(gps_data, 'time', None),
+                                        dwell=getattr(gps_data, 'dwell', None))
+            total_distance = track_stats.total_distance_m
+            distance_info = f"{total_distance:.2f}米"
             
-            # 添加中间点标记（每隔10个点标记一个）
-            for i in range(10, len(positions)-1, 10):
-                if i < len(positions):
-                    popup_text = f'''
-                    <div style="font-family: Arial, sans-serif; max-width: 200px;">
-                        <b>点 {i+1}</b><br>
-                        <b>纬度:</b> {positions[i][1]:.6f}<br>
-                        <b>经度:</b> {positions[i][0]:.6f}<br>
-                        <b>坐标系:</b> {coordinate_system}
-                    </div>
-                    '''
-                    
-                    folium.CircleMarker(
-                        [positions[i][1], positions[i][0]],
-                        radius=3,
-                        color='#3388ff',
-                        fill=True,
-                        fill_color='#3388ff',
-                        fill_opacity=0.7,
-                        popup=folium.Popup(popup_text, max_width=250)
-                    ).add_to(m)
+            # 途经点（每隔10个点一个）：差分编码的坐标数组，页面中聚合显示，弹窗点击时生成
+            middle = np.arange(WAYPOINT_STEP, len(positions) - 1, WAYPOINT_STEP)
+            track['waypoints'] = dict(delta_e6(lonlat[middle, 1], lonlat[middle, 0]),
+                                      start=WAYPOINT_STEP, step=WAYPOINT_STEP)
         else:
             # 只有一个点的情况
             point_popup = f'''
@@ -1006,32 +1017,27 @@ def create_folium_map_with_track(positions, gps_data, coordinate_system="GCJ-02
                 <b>坐标系:</b> {coordinate_system}
             </div>
             '''
-            
-            folium.Marker(
-                [positions[0][1], positions[0][0]],
-                popup=folium.Popup(point_popup, max_width=250),
-                tooltip='GPS点',
-                icon=folium.Icon(color='blue', icon='info-sign')
-            ).add_to(m)
+            track['markers'].append(icon_marker(positions[0][1], positions[0][0], point_popup, 'GPS点',
+                                                'blue', 'info-sign'))
             distance_info = "单点位置"
             total_distance = 0
-        
-        # 添加全屏控件
-        plugins.Fullscreen(
-            position='topright',
-            title='全屏',
-            title_cancel='退出全屏',
-            force_separate_button=True
-        ).add_to(m)
-        
-        # 添加测量工具
-        plugins.MeasureControl(
-            position='topright',
-            primary_length_unit='meters',
-            secondary_length_unit='kilometers'
-        ).add_to(m)
-        
-        # 添加轨迹信息控件
+            track_stats = None
+        
+        # 有时间信息时显示时长和速度
+        stats_html = ""
+        if track_stats is not None and track_stats.elapsed_s > 0:
+            stats_html = (
+                f"<b>⏱️ 总时长:</b> {format_duration(track_stats.elapsed_s)}<br>"
+                f"<b>🚗 运动/静止:</b> {format_duration(track_stats.moving_time_s)} / "
+                f"{format_duration(track_stats.stopped_time_s)}<br>"
+                f"<b>⚡ 平均/最高速度:</b> {track_stats.avg_speed_mps * 3.6:.1f} / "
+                f"{track_stats.max_speed_mps * 3.6:.1f} km/h<br>"
+            )
+            if track_stats.dwell_s > 0:
+                stays, _ = dwell_summary(gps_data.dwell)
+                stats_html += f"<b>💤 停留:</b> {stays} 处，共 {format_duration(track_stats.dwell_s)}<br>"
+        
+        # 轨迹信息面板
         info_html = f"""
         <div id="info-panel" style="
             position: fixed; 
@@ -1052,6 +1058,7 @@ def create_folium_map_with_track(positions, gps_data, coordinate_system="GCJ-02
             <div style="line-height: 1.6;">
                 <b>📍 数据点数量:</b> {len(positions)}<br>
                 <b>📏 轨迹长度:</b> {distance_info}<br>
+                {stats_html}
                 <b>🎯 中心点:</b> {center_lat:.6f}, {center_lon:.6f}<br>
                 <b>🗺️ 地图类型:</b> 高德地图<br>
                 <b>🔢 坐标系:</b> {coordinate_system}<br>
@@ -1065,36 +1072,27 @@ def create_folium_map_with_track(positions, gps_data, coordinate_system="GCJ-02
         </div>
         """
         
-        # 将信息控件添加到地图
-        m.get_root().html.add_child(folium.Element(info_html))
-        
-        # 添加图层控制
-        folium.LayerControl().add_to(m)
-        
-        # 保存HTML文件到临时目录
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        temp_dir = tempfile.gettempdir()
-        html_file = os.path.join(temp_dir, f"gps_track_{timestamp}.html")
-        
-        m.save(html_file)
-        print(f"地图已保存到: {html_file}")
+        document = {
+            'center': [center_lat, center_lon],
+            'zoom': 17,
+            'coordinate_system': coordinate_system,
+            'tracks': [track],
+            'overlays': heatmap_overlays(lonlat[:, 1], lonlat[:, 0], detections),
+            'panel': info_html,
+        }
         
         info = {
             'points_count': len(positions),
             'total_distance': total_distance if len(positions) > 1 else 0,
+            'track_stats': track_stats.summary() if track_stats is not None else None,
+            'simplification': simplification,
             'center_lat': center_lat,
             'center_lon': center_lon,
-            'html_file': html_file,
             'map_type': '高德地图',
             'coordinate_system': coordinate_system,
             'max_zoom': 20
         }
-        
-        # 返回HTML内容
-        with open(html_file, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-        
-        return html_content, info
+        return document, info
         
     except Exception as e:
         print(f"创建地图失败: {e}")
@@ -1102,35 +1100,146 @@ def create_folium_map_with_track(positions, gps_data, coordinate_system="GCJ-02
         traceback.print_exc()
         return None, {"error": f"创建地图失败: {str(e)}"}
 
-def calculate_total_distance(positions):
+def live_panel_html(coordinate_system):
+    """实时轨迹信息面板（统计部分由 liveAppend 逐点更新）"""
+    return f"""
+    <div id="info-panel" style="
+        position: fixed; bottom: 50px; left: 50px; width: 300px;
+        background-color: rgba(255, 255, 255, 0.95); border: 2px solid #D32F2F; z-index: 9999;
+        padding: 15px; font-family: Arial, sans-serif; font-size: 14px; border-radius: 8px;
+        box-shadow: 0 4px 12px rgba(0,0,0,0.1);">
+        <h3 style="color: #2c3e50; margin-top: 0; margin-bottom: 10px;">🛰️ 实时轨迹</h3>
+        <hr style="margin: 5px 0; border-color: #eee;">
+        <div id="live-stats" style="line-height: 1.6;">等待GPS数据...</div>
+        <div style="line-height: 1.6;"><b>🔢 坐标系:</b> {coordinate_system}</div>
+        <button onclick="document.getElementById('info-panel').style.display='none'"
+                style="margin-top: 10px; padding: 5px 10px; background-color: #f44336; color: white; border: none; border-radius: 4px; cursor: pointer;">
+            关闭面板
+        </button>
+    </div>
     """
-    使用Haversine公式计算轨迹总长度
-    参考文档中的距离计算方法
+
+def format_live_stats(summary, fix):
+    """实时统计 → 面板中的统计HTML"""
+    return (
+        f"<b>📍 数据点数量:</b> {summary['points']}<br>"
+        f"<b>📏 轨迹长度:</b> {summary['distance_m']:.1f} 米<br>"
+        f"<b>⏱️ 运动/静止:</b> {format_duration(summary['moving_time_s'])} / "
+        f"{format_duration(summary['stopped_time_s'])}<br>"
+        f"<b>⚡ 当前/最高速度:</b> {fix.get('speed_knots', 0) * 1.852:.1f} / "
+        f"{summary['max_speed_mps'] * 3.6:.1f} km/h<br>"
+        f"<b>🧭 航向:</b> {fix.get('course', 0):.0f}°，卫星 {fix.get('satellites', 0)} 颗<br>"
+        f"<b>🎯 当前位置:</b> {fix['lat']:.6f}, {fix['lon']:.6f}"
+    )
+
+# 多轨迹地图的轨迹颜色
+TRACK_COLORS = ['#FF6600', '#3388FF', '#2E7D32', '#C2185B', '#7B1FA2',
+                '#00838F', '#F9A825', '#5D4037', '#D32F2F', '#455A64']
+
+def create_batch_document(result, coordinate_system="GCJ-02 (批量转换)", detections=None):
     """
-    if len(positions) < 2:
-        return 0
+    批量处理结果 → 多轨迹的轨迹文档
+    每个文件一条不同颜色的轨迹（可在图层控件中开关），起点标记显示该文件的统计信息
+    """
+    positions = result.positions
+    if not len(positions):
+        return None, {"error": "没有有效的GPS数据"}
     
-    total_distance = 0
-    R = 6371000  # 地球半径（米）
+    center_lon, center_lat = (float(v) for v in positions.mean(axis=0))
     
-    for i in range(1, len(positions)):
-        lon1, lat1 = positions[i-1]
-        lon2, lat2 = positions[i]
-        
-        # 转换为弧度
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lon = math.radians(lon2 - lon1)
-        
-        # Haversine公式
-        a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        distance = R * c
-        
-        total_distance += distance
+    tracks = []
+    rows = []
+    vertices = data_bytes = full_bytes = 0
+    for i, item in enumerate(result.tracks):
+        stats = item.stats
+        if item.error:
+            rows.append(f"<tr><td>{item.name}</td><td colspan='2' style='color:red;'>失败: {item.error}</td></tr>")
+            continue
+        if not len(item.positions):
+            rows.append(f"<tr><td>{item.name}</td><td>0</td><td>-</td></tr>")
+            continue
+        
+        color = TRACK_COLORS[i % len(TRACK_COLORS)]
+        track = {'lines': [], 'markers': []}
+        if len(item.positions) > 1:
+            track, simplified = simplified_track(item.positions[:, 1], item.positions[:, 0], [
+                dict(weight=3, color=color, opacity=0.8, tooltip=item.name)], zoom_start=15)
+            vertices += simplified['initial_vertices']
+            data_bytes += simplified['data_bytes']
+            full_bytes += simplified['full_bytes']
+        track['name'] = item.name
+        popup = f'''
+        <div style="font-family: Arial, sans-serif; max-width: 240px;">
+            <h4 style="color: {color}; margin: 0;">{item.name}</h4>
+            <hr style="margin: 5px 0;">
+            <b>点数:</b> {stats['points']}<br>
+            <b>轨迹长度:</b> {stats['distance_m']:.1f} 米<br>
+            <b>运动时间:</b> {format_duration(stats['moving_time_s'])}<br>
+            <b>最高速度:</b> {stats['max_speed_mps'] * 3.6:.1f} km/h<br>
+            <b>开始:</b> {stats.get('start_text') or 'N/A'}<br>
+            <b>结束:</b> {stats.get('end_text') or 'N/A'}
+        </div>
+        '''
+        track['markers'].append({
+            'lat': float(item.positions[0, 1]), 'lon': float(item.positions[0, 0]),
+            'popup': popup, 'max_width': 260, 'tooltip': item.name,
+            'style': {'radius': 6, 'color': color, 'fill': True, 'fillOpacity': 0.9},
+        })
+        tracks.append(track)
+        rows.append(f"<tr><td style='color:{color};'>{item.name}</td><td>{stats['points']}</td>"
+                    f"<td>{stats['distance_m'] / 1000:.3f}</td></tr>")
     
-    return total_distance
+    summary = result.summary
+    info_html = f"""
+    <div id="info-panel" style="
+        position: fixed; bottom: 50px; left: 50px; width: 420px; max-height: 60%; overflow-y: auto;
+        background-color: rgba(255, 255, 255, 0.95); border: 2px solid #4CAF50; z-index: 9999;
+        padding: 15px; font-family: Arial, sans-serif; font-size: 13px; border-radius: 8px;
+        box-shadow: 0 4px 12px rgba(0,0,0,0.1);">
+        <h3 style="color: #2c3e50; margin-top: 0; margin-bottom: 10px;">📚 批量处理结果</h3>
+        <div style="line-height: 1.6;">
+            <b>📂 文件数:</b> {summary['files']}（失败 {summary['failed']}）<br>
+            <b>📍 数据点总数:</b> {summary['points']}<br>
+            <b>📏 轨迹总长度:</b> {summary['distance_m'] / 1000:.3f} 公里<br>
+            <b>⚙️ 进程数:</b> {summary['workers']}，耗时 {summary['elapsed']:.2f} 秒<br>
+            <b>🔢 坐标系:</b> {coordinate_system}
+        </div>
+        <table style="width: 100%; margin-top: 8px; border-collapse: collapse;">
+            <tr><th align="left">文件</th><th align="left">点数</th><th align="left">公里</th></tr>
+            {''.join(rows)}
+        </table>
+        <button onclick="document.getElementById('info-panel').style.display='none'"
+                style="margin-top: 10px; padding: 5px 10px; background-color: #f44336; color: white; border: none; border-radius: 4px; cursor: pointer;">
+            关闭面板
+        </button>
+    </div>
+    """
+    
+    print(f"轨迹化简: {summary['points']} 点 → 初始级别 {vertices} 个顶点，"
+          f"折线数据 {full_bytes / 1024:.0f} KB → {data_bytes / 1024:.0f} KB")
+    
+    min_lon, min_lat = (float(v) for v in positions.min(axis=0))
+    max_lon, max_lat = (float(v) for v in positions.max(axis=0))
+    document = {
+        'center': [center_lat, center_lon],
+        'zoom': 15,
+        'bounds': [[min_lat, min_lon], [max_lat, max_lon]],
+        'coordinate_system': coordinate_system,
+        'tracks': tracks,
+        'overlays': heatmap_overlays(positions[:, 1], positions[:, 0], detections),
+        'panel': info_html,
+    }
+    
+    info = {
+        'points_count': summary['points'],
+        'total_distance': summary['distance_m'],
+        'center_lat': center_lat,
+        'center_lon': center_lon,
+        'map_type': '高德地图',
+        'coordinate_system': coordinate_system,
+        'max_zoom': 20
+    }
+    return document, info
 
 class SnapshotDisplayWidget(QLabel):
     """截图显示控件"""
@@ -1166,9 +1275,34 @@ class GPSFoliumTracker(QMainWindow):
         super().__init__()
         self.processing_thread = None
         self.gps_saver_thread = None
-        self.current_html_file = None
+        self.gps_catalog = GPSCatalog("gps_data")  # 文件列表和预览只查询目录数据库
+        self.catalog_scan_thread = None
         self.last_file_path = None
         self.wgs84_positions = None  # 保存原始WGS-84坐标
+        
+        # 地图页面和轨迹文档都由进程内地图服务提供，不写临时文件
+        # 瓦片经本地缓存提供：已缓存的区域没有网络也能显示
+        # 页面引用的Leaflet、插件和字体也由本地缓存提供，外壳页面只渲染一次
+        self.tile_cache = TileCache(TILE_CACHE_DIR)
+        self.asset_cache = AssetCache(ASSET_CACHE_DIR)
+        self.map_server = MapServer().start()
+        self.map_server.add_route(TILE_ROUTE, self.tile_cache.route)
+        self.map_server.add_route(ASSET_ROUTE, self.asset_cache.route)
+        shell_html = map_shell_html(TILE_URL)
+        self.map_shell_url = self.map_server.publish(MAP_SHELL_PATH, self.asset_cache.localize(shell_html))
+        print(f"瓦片缓存: {len(self.tile_cache)} 个瓦片，{self.tile_cache.total_bytes / 1024 / 1024:.1f} MB")
+        threading.Thread(target=self.prefetch_map_assets, args=(shell_html,), daemon=True).start()
+        self.map_shell_loaded = False   # 地图外壳是否已在 web_view 中加载
+        self.pending_map_scripts = []   # 外壳加载完成后依次执行的脚本
+        self.current_map_document = None
+        self.current_track_path = None
+        self.track_serial = 0
+        
+        # 实时轨迹（GPS数据保存时逐点追加到地图）
+        self.live_stats = None
+        self.live_heatmap = None
+        self.live_heatmap_time = 0.0
+        self.live_converter = GPSCoordinateConverter()
         self.conversion_mode = "wgs84_to_gcj02"  # 默认使用WGS-84转GCJ-02
         self.snapshot_files = []  # 存储截图文件列表
         
@@ -1391,6 +1525,11 @@ class GPSFoliumTracker(QMainWindow):
         self.clear_btn.clicked.connect(self.clear_data)
         control_layout.addWidget(self.clear_btn, 1, 2, 1, 2)
         
+        self.batch_btn = QPushButton('📚 批量处理目录')
+        self.batch_btn.setFixedHeight(36)
+        self.batch_btn.clicked.connect(self.process_gps_directory)
+        control_layout.addWidget(self.batch_btn, 2, 0, 1, 4)
+        
         control_group.setLayout(control_layout)
         map_layout.addWidget(control_group)
         
@@ -1428,6 +1567,7 @@ class GPSFoliumTracker(QMainWindow):
         # 使用QWebEngineView显示Folium地图
         self.web_view = QWebEngineView()
         self.web_view.setMinimumHeight(500)
+        self.web_view.loadFinished.connect(self.on_map_load_finished)
         self.web_view.setHtml(self.get_welcome_html())
         
         map_display_layout.addWidget(self.web_view)
@@ -1504,6 +1644,19 @@ class GPSFoliumTracker(QMainWindow):
         
         gps_save_layout.addLayout(save_control_layout)
         
+        # 实时轨迹显示
+        live_layout = QHBoxLayout()
+        self.live_track_check = QCheckBox('实时显示轨迹')
+        self.live_track_check.setChecked(True)
+        self.live_track_check.toggled.connect(self.on_live_track_toggled)
+        self.live_follow_check = QCheckBox('自动跟随')
+        self.live_follow_check.setChecked(True)
+        self.live_follow_check.toggled.connect(self.on_live_follow_toggled)
+        live_layout.addWidget(self.live_track_check)
+        live_layout.addWidget(self.live_follow_check)
+        live_layout.addStretch()
+        gps_save_layout.addLayout(live_layout)
+        
         # 保存状态
         self.save_status_label = QLabel('GPS数据保存: 未启动')
         self.save_status_label.setStyleSheet("""
@@ -1562,9 +1715,15 @@ class GPSFoliumTracker(QMainWindow):
         self.delete_gps_file_btn.setEnabled(False)
         self.delete_gps_file_btn.setMaximumWidth(80)
         
+        self.export_gps_file_btn = QPushButton('📤 导出TXT')
+        self.export_gps_file_btn.clicked.connect(self.export_selected_gps_file)
+        self.export_gps_file_btn.setEnabled(False)
+        self.export_gps_file_btn.setMaximumWidth(100)
+        
         file_buttons.addWidget(self.refresh_gps_files_btn)
         file_buttons.addWidget(self.view_gps_file_btn)
         file_buttons.addWidget(self.delete_gps_file_btn)
+        file_buttons.addWidget(self.export_gps_file_btn)
         file_buttons.addStretch()
         
         file_list_layout.addLayout(file_buttons)
@@ -1691,9 +1850,8 @@ class GPSFoliumTracker(QMainWindow):
         """更新ESP32 URLs"""
         base_http_url = f"http://{self.esp32_ip}:{self.esp32_http_port}"
         
-        # HTTP服务URLs
-        self.gps_json_url = f"{base_http_url}/gps/json"  # GPS JSON数据
-        self.status_url = f"{base_http_url}/status"      # 状态检查
+        # 同一地址共用一个客户端：/gps/json（GPS数据）、/status（状态检查）
+        self.esp32 = shared_client(base_http_url)
         
     def get_welcome_html(self):
         """获取欢迎页面HTML"""
@@ -1804,9 +1962,10 @@ class GPSFoliumTracker(QMainWindow):
         
         self.update_esp32_urls()
         
-        # 测试连接
+        # 测试连接（用户主动连接时清除熔断状态）
+        self.esp32.reset()
         try:
-            response = requests.get(self.status_url, timeout=5)
+            response = self.esp32.get('/status')
             if response.status_code == 200:
                 self.connection_status.setText('已连接')
                 self.connection_status.setStyleSheet("color: green; font-weight: bold;")
@@ -1814,7 +1973,8 @@ class GPSFoliumTracker(QMainWindow):
                 # 启用相关按钮
                 self.start_save_btn.setEnabled(True)
                 
-                self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] ✅ ESP32连接成功')
+                latency = response.elapsed.total_seconds() * 1000
+                self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] ✅ ESP32连接成功（{latency:.0f} ms）')
                 self.statusBar().showMessage('ESP32连接成功')
             else:
                 self.connection_status.setText(f'连接失败: {response.status_code}')
@@ -1905,9 +2065,11 @@ class GPSFoliumTracker(QMainWindow):
             self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] ⚠️ GPS数据保存已在运行')
             return
         
-        self.gps_saver_thread = GPSDataSaver(self.gps_json_url, save_interval=1.0)  # 修改为1.0秒
+        self.gps_saver_thread = GPSDataSaver(self.esp32, save_interval=1.0)  # 修改为1.0秒
         self.gps_saver_thread.data_saved.connect(self.on_gps_data_saved)
         self.gps_saver_thread.status_updated.connect(self.on_gps_save_status_updated)
+        self.gps_saver_thread.fix_received.connect(self.on_live_fix)
+        self.live_stats = None  # 每次开始保存都是新的实时轨迹
         self.gps_saver_thread.start()
         
         self.start_save_btn.setEnabled(False)
@@ -1942,61 +2104,77 @@ class GPSFoliumTracker(QMainWindow):
             self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 💾 {message}')
     
     def refresh_gps_files_list(self):
-        """刷新GPS数据文件列表"""
+        """刷新GPS数据文件列表：先显示目录数据库中的内容，再由后台线程同步文件变化"""
         try:
-            self.gps_file_list.clear()
-            
-            # 获取保存的GPS数据文件
-            if self.gps_saver_thread:
-                files = self.gps_saver_thread.get_saved_files()
-            else:
-                # 如果没有保存线程，直接扫描目录
-                save_directory = "gps_data"
-                if os.path.exists(save_directory):
-                    files = [f for f in os.listdir(save_directory) if f.endswith('.txt')]
-                    files.sort(reverse=True)
-                    files = [os.path.join(save_directory, f) for f in files]
-                else:
-                    files = []
+            self.populate_gps_files_list()
             
-            for file_path in files:
-                if os.path.exists(file_path):
-                    file_name = os.path.basename(file_path)
-                    file_size = os.path.getsize(file_path)
-                    display_text = f"{file_name} ({file_size/1024:.1f} KB)"
-                    
-                    item = QListWidgetItem(display_text)
-                    item.setData(Qt.UserRole, file_path)
-                    self.gps_file_list.addItem(item)
-            
-            if files:
-                self.gps_file_list.setCurrentRow(0)
-                self.on_gps_file_selected(self.gps_file_list.currentItem())
+            if self.catalog_scan_thread and self.catalog_scan_thread.isRunning():
+                return
+            self.catalog_scan_thread = GPSCatalogScanThread(self.gps_catalog)
+            self.catalog_scan_thread.scan_finished.connect(self.on_catalog_scan_finished)
+            self.catalog_scan_thread.start()
             
         except Exception as e:
             print(f"刷新GPS文件列表错误: {e}")
     
+    def populate_gps_files_list(self):
+        """用目录数据库中的记录填充文件列表（不访问文件）"""
+        current_item = self.gps_file_list.currentItem()
+        current_path = current_item.data(Qt.UserRole) if current_item else None
+        
+        self.gps_file_list.clear()
+        tracks = self.gps_catalog.list_tracks()
+        selected_row = 0
+        for row, track in enumerate(tracks):
+            display_text = f"{track['name']} ({track['size']/1024:.1f} KB, {track['point_count']}点)"
+            item = QListWidgetItem(display_text)
+            item.setData(Qt.UserRole, track['path'])
+            self.gps_file_list.addItem(item)
+            if track['path'] == current_path:
+                selected_row = row
+        
+        if tracks:
+            self.gps_file_list.setCurrentRow(selected_row)
+            self.on_gps_file_selected(self.gps_file_list.currentItem())
+    
+    def on_catalog_scan_finished(self, updated, removed):
+        """后台同步完成，有变化时刷新列表"""
+        if updated or removed:
+            self.populate_gps_files_list()
+    
     def on_gps_file_selected(self, item):
         """当GPS文件被选中时"""
         if item:
             file_path = item.data(Qt.UserRole)
             self.view_gps_file_btn.setEnabled(True)
             self.delete_gps_file_btn.setEnabled(True)
+            self.export_gps_file_btn.setEnabled(is_track_file(file_path))
             
-            # 预览文件内容
+            # 预览文件内容（优先使用目录数据库中的预览和统计）
+            track = self.gps_catalog.get(file_path)
+            if track:
+                unit = "条记录" if track['format'] == 'track' else "行"
+                preview = track['preview']
+                if track['line_count'] > 20:
+                    preview += f"...\n(共{track['line_count']}{unit}，显示前20{unit})"
+                preview += f"\n有效GPS点: {track['point_count']}，轨迹长度: {track['distance_m']:.1f} 米"
+                self.gps_file_content.setText(preview)
+                return
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                    preview = "".join(lines[:20])  # 预览前20行
-                    if len(lines) > 20:
-                        preview += f"...\n(共{len(lines)}行，显示前20行)"
-                    
+                if is_track_file(file_path):
+                    records = read_track(file_path)
+                    preview = "".join(format_track_lines(records[:20]))
+                    preview += f"...\n(二进制轨迹，共{len(records)}条记录，显示前20条)"
                     self.gps_file_content.setText(preview)
+                    return
+                # 尚未进入目录的文件只读取前20行
+                self.gps_file_content.setText(text_preview(file_path))
             except Exception as e:
                 self.gps_file_content.setText(f"读取文件错误: {str(e)}")
         else:
             self.view_gps_file_btn.setEnabled(False)
             self.delete_gps_file_btn.setEnabled(False)
+            self.export_gps_file_btn.setEnabled(False)
             self.gps_file_content.clear()
     
     def view_selected_gps_file(self):
@@ -2009,8 +2187,11 @@ class GPSFoliumTracker(QMainWindow):
         file_path = current_item.data(Qt.UserRole)
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            if is_track_file(file_path):
+                content = "".join(format_track_lines(read_track(file_path)))
+            else:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
             
             # 创建查看对话框
             dialog = QDialog(self)
@@ -2037,6 +2218,28 @@ class GPSFoliumTracker(QMainWindow):
         except Exception as e:
             QMessageBox.warning(self, '错误', f'读取文件失败:\n{str(e)}')
     
+    def export_selected_gps_file(self):
+        """把选中的二进制轨迹导出为.txt文本"""
+        current_item = self.gps_file_list.currentItem()
+        if not current_item:
+            QMessageBox.warning(self, '警告', '请先选择一个GPS数据文件')
+            return
+        
+        file_path = current_item.data(Qt.UserRole)
+        default_path = os.path.splitext(file_path)[0] + '.txt'
+        out_path, _ = QFileDialog.getSaveFileName(
+            self, '导出为文本', default_path, '文本文件 (*.txt);;所有文件 (*.*)'
+        )
+        if not out_path:
+            return
+        
+        try:
+            export_track_text(file_path, out_path)
+            self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 📤 导出文本: {os.path.basename(out_path)}')
+            self.refresh_gps_files_list()
+        except Exception as e:
+            QMessageBox.warning(self, '导出失败', f'导出文件失败:\n{str(e)}')
+    
     def delete_selected_gps_file(self):
         """删除选中的GPS文件"""
         current_item = self.gps_file_list.currentItem()
@@ -2056,6 +2259,9 @@ class GPSFoliumTracker(QMainWindow):
         if reply == QMessageBox.Yes:
             try:
                 os.remove(file_path)
+                if os.path.exists(index_path(file_path)):
+                    os.remove(index_path(file_path))  # 轨迹文件的时间索引
+                self.gps_catalog.remove(file_path)
                 self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 🗑️ 删除GPS数据文件: {os.path.basename(file_path)}')
                 
                 # 刷新列表
@@ -2142,13 +2348,52 @@ class GPSFoliumTracker(QMainWindow):
         self.processing_thread.progress_updated.connect(self.on_progress_updated)
         self.processing_thread.start()
     
+    def process_gps_directory(self):
+        """批量处理目录下的所有GPS文件（多进程并行）"""
+        directory = QFileDialog.getExistingDirectory(self, '选择GPS数据目录', 'gps_data')
+        if not directory:
+            return
+        
+        if self.processing_thread and self.processing_thread.isRunning():
+            self.processing_thread.terminate()
+            self.processing_thread.wait()
+        
+        self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 📚 批量处理目录: {directory}')
+        self.set_buttons_enabled(False)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.statusBar().showMessage('正在批量处理GPS数据...')
+        
+        self.processing_thread = GPSBatchThread(directory, self.conversion_mode)
+        self.processing_thread.batch_finished.connect(self.on_batch_finished)
+        self.processing_thread.error_occurred.connect(self.on_processing_error)
+        self.processing_thread.progress_updated.connect(self.on_progress_updated)
+        self.processing_thread.start()
+    
+    def on_batch_finished(self, document, info, result):
+        """批量处理完成：输出每个文件的统计，然后按普通轨迹显示地图"""
+        summary = result.summary
+        self.log_text.append(
+            f'[{datetime.now().strftime("%H:%M:%S")}] 📚 {summary["files"]} 个文件，'
+            f'{summary["workers"]} 个进程，耗时 {summary["elapsed"]:.2f} 秒')
+        for track in result.tracks:
+            if track.error:
+                self.log_text.append(f'    ❌ {track.name}: {track.error}')
+            else:
+                stats = track.stats
+                self.log_text.append(
+                    f'    {track.name}: {stats["points"]} 点, {stats["distance_m"]:.1f} 米, '
+                    f'运动 {format_duration(stats["moving_time_s"])}, 最高 {stats["max_speed_mps"] * 3.6:.1f} km/h, '
+                    f'{stats.get("start_text") or "N/A"} ~ {stats.get("end_text") or "N/A"}')
+        self.on_processing_finished(document, result.positions.tolist(), info, [])
+    
     def load_gps_file(self):
         """加载GPS数据文件"""
         file_path, _ = QFileDialog.getOpenFileName(
             self, 
             '选择GPS数据文件', 
             '', 
-            'GPS数据文件 (*.txt *.nmea *.log);;所有文件 (*.*)'
+            'GPS数据文件 (*.txt *.nmea *.log *.gpstrk);;所有文件 (*.*)'
         )
         
         if file_path:
@@ -2209,18 +2454,112 @@ class GPSFoliumTracker(QMainWindow):
         self.progress_bar.setValue(value)
         QApplication.processEvents()
     
-    def on_processing_finished(self, html_content, positions, info, wgs84_positions):
+    def prefetch_map_assets(self, shell_html):
+        """后台下载地图页面引用的全部静态资源（已缓存的跳过），之后没有网络也能打开地图"""
+        total, failed = self.asset_cache.prefetch(shell_html)
+        if failed:
+            print(f"地图页面资源: {total} 个，{failed} 个暂时无法下载（联网后打开地图时自动补齐）")
+        else:
+            print(f"地图页面资源: {total} 个，已全部缓存到本地")
+    
+    def show_map_document(self, document):
+        """
+        发布轨迹文档并在地图中显示
+
+        地图外壳只在首次（或显示欢迎页之后）加载一次，之后切换文件只通过 loadTrack 重绘轨迹
+        """
+        self.track_serial += 1
+        path = f"/track/{self.track_serial}.json"
+        url = self.map_server.publish(path, dump_map_document(document))
+        if self.current_track_path:
+            self.map_server.unpublish(self.current_track_path)
+        self.current_track_path = path
+        self.current_map_document = document
+        if self.live_stats is not None:
+            # 显示文件轨迹会清除地图上的实时轨迹：暂停实时显示，重新勾选后开始新的实时轨迹
+            self.live_track_check.setChecked(False)
+            self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] ⏸️ 查看文件轨迹，实时显示已暂停')
+        self.run_map_script(f"loadTrack({json.dumps(url)})")
+    
+    def run_map_script(self, script):
+        """在地图外壳中执行脚本；外壳尚未加载时先加载，加载完成后按顺序执行"""
+        if self.map_shell_loaded:
+            self.web_view.page().runJavaScript(script)
+            return
+        self.pending_map_scripts.append(script)
+        if self.web_view.url().toString() != self.map_shell_url:
+            self.web_view.load(QUrl(self.map_shell_url))
+    
+    def on_map_load_finished(self, ok):
+        """页面加载完成：如果是地图外壳，执行等待中的脚本"""
+        self.map_shell_loaded = ok and self.web_view.url().toString() == self.map_shell_url
+        if self.map_shell_loaded:
+            scripts, self.pending_map_scripts = self.pending_map_scripts, []
+            for script in scripts:
+                self.web_view.page().runJavaScript(script)
+        elif not ok and self.pending_map_scripts:
+            self.pending_map_scripts = []
+            self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] ❌ 地图页面加载失败: {self.map_shell_url}')
+    
+    def start_live_track(self):
+        """开始新的实时轨迹：清除地图上的轨迹，统计从零开始"""
+        self.live_stats = LiveTrackStats()
+        self.live_heatmap = None
+        coordinate_system = ("WGS-84 (原始坐标系)" if self.conversion_mode == "no_conversion"
+                             else "GCJ-02 (从WGS-84转换)")
+        options = {'follow': self.live_follow_check.isChecked(), 'panel': live_panel_html(coordinate_system)}
+        self.run_map_script(f"liveStart({json.dumps(options, ensure_ascii=False)})")
+    
+    def on_live_fix(self, fix):
+        """GPS数据保存线程收到一个有效定位：追加到实时轨迹（每个点的开销与轨迹长度无关）"""
+        if not self.live_track_check.isChecked():
+            return
+        if self.live_stats is None:
+            self.start_live_track()
+        
+        lat, lon = fix['lat'], fix['lon']
+        if self.conversion_mode != "no_conversion":
+            lat, lon = self.live_converter.wgs84_to_gcj02(lat, lon)
+        self.live_stats.update(lat, lon, fix['time'])
+        stats_html = format_live_stats(self.live_stats.summary(), dict(fix, lat=lat, lon=lon))
+        self.run_map_script(f"liveAppend({lat:.7f}, {lon:.7f}, {json.dumps(stats_html, ensure_ascii=False)})")
+        
+        if self.live_heatmap is None:
+            self.live_heatmap = GridHeatmap.around(lat, lon, LIVE_HEATMAP_RADIUS)
+            self.live_heatmap_time = 0.0
+        self.live_heatmap.add(lat, lon)
+        self.update_live_heatmap()
+    
+    def update_live_heatmap(self):
+        """每隔 LIVE_HEATMAP_INTERVAL 秒重新渲染实时热力图，图片大小只与网格有关"""
+        now = time.time()
+        if now - self.live_heatmap_time < LIVE_HEATMAP_INTERVAL:
+            return
+        self.live_heatmap_time = now
+        url = self.map_server.publish('/heatmap/live.png', self.live_heatmap.render_png(), 'image/png')
+        overlay = self.live_heatmap.overlay('实时热力图', show=False, image=f"{url}?v={self.live_heatmap.version}")
+        self.run_map_script(f"liveOverlay({json.dumps(overlay, ensure_ascii=False)})")
+    
+    def on_live_track_toggled(self, checked):
+        """关闭实时显示后再打开时开始新的实时轨迹"""
+        if not checked:
+            self.live_stats = None
+    
+    def on_live_follow_toggled(self, checked):
+        if self.live_stats is not None:
+            self.run_map_script(f"liveFollow({'true' if checked else 'false'})")
+    
+    def on_processing_finished(self, document, positions, info, wgs84_positions):
         """处理完成"""
         try:
             self.progress_bar.setVisible(False)
             
-            if html_content and positions:
+            if document and positions:
                 # 保存原始坐标
                 self.wgs84_positions = wgs84_positions
                 
-                # 显示HTML内容
-                self.web_view.setHtml(html_content)
-                self.current_html_file = info.get('html_file', None)
+                # 显示轨迹
+                self.show_map_document(document)
                 
                 # 更新日志
                 self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] ✅ 地图生成成功！')
@@ -2231,6 +2570,15 @@ class GPSFoliumTracker(QMainWindow):
                     distance_km = info["total_distance"] / 1000
                     self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 📏 轨迹长度: {info["total_distance"]:.2f} 米 ({distance_km:.3f} 公里)')
                     self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 🎯 中心点: {info["center_lat"]:.6f}, {info["center_lon"]:.6f}')
+                    if info.get("simplification"):
+                        self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 🪶 {format_simplification(info["simplification"])}')
+                    track_stats = info.get("track_stats")
+                    if track_stats and track_stats["elapsed_s"] > 0:
+                        self.log_text.append(
+                            f'[{datetime.now().strftime("%H:%M:%S")}] ⏱️ 总时长 {format_duration(track_stats["elapsed_s"])}，'
+                            f'运动 {format_duration(track_stats["moving_time_s"])}，'
+                            f'静止 {format_duration(track_stats["stopped_time_s"])}，'
+                            f'最高速度 {track_stats["max_speed_mps"] * 3.6:.1f} km/h')
                 
                 self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 🗺️ 使用地图: {info.get("map_type", "高德地图")}')
                 self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 🔍 最大缩放级别: {info.get("max_zoom", 20)} 级')
@@ -2240,9 +2588,7 @@ class GPSFoliumTracker(QMainWindow):
                 
                 self.statusBar().showMessage('处理完成，地图已生成')
                 
-                # 提示保存成功
-                if self.current_html_file:
-                    self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 💾 临时地图文件: {self.current_html_file}')
+                self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 🌐 轨迹数据: {self.map_server.url(self.current_track_path)}')
                 
                 # 启用相关按钮
                 self.export_btn.setEnabled(True)
@@ -2273,7 +2619,7 @@ class GPSFoliumTracker(QMainWindow):
     
     def export_html(self):
         """导出HTML文件"""
-        if not self.current_html_file or not os.path.exists(self.current_html_file):
+        if self.current_map_document is None:
             QMessageBox.warning(self, '警告', '没有可导出的HTML文件')
             return
         
@@ -2287,9 +2633,8 @@ class GPSFoliumTracker(QMainWindow):
         
         if save_path:
             try:
-                # 读取当前HTML内容
-                with open(self.current_html_file, 'r', encoding='utf-8') as f:
-                    html_content = f.read()
+                # 地图外壳 + 内嵌的轨迹数据，可脱离本程序打开
+                html_content = render_standalone_map(self.current_map_document)
                 
                 # 保存到指定位置
                 with open(save_path, 'w', encoding='utf-8') as f:
@@ -2304,14 +2649,15 @@ class GPSFoliumTracker(QMainWindow):
     
     def view_in_browser(self):
         """在浏览器中打开"""
-        if not self.current_html_file or not os.path.exists(self.current_html_file):
+        if self.current_map_document is None:
             QMessageBox.warning(self, '警告', '没有可查看的HTML文件')
             return
         
         try:
-            # 转换为文件URL
-            file_url = QUrl.fromLocalFile(self.current_html_file).toString()
-            webbrowser.open(file_url)
+            # 由地图服务提供内嵌轨迹数据的完整页面
+            html = render_standalone_map(self.current_map_document, TILE_URL)
+            page_url = self.map_server.publish('/map/current.html', self.asset_cache.localize(html))
+            webbrowser.open(page_url)
             
             self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 🌐 在默认浏览器中打开地图')
             
@@ -2352,16 +2698,15 @@ class GPSFoliumTracker(QMainWindow):
             self.export_btn.setEnabled(False)
             self.view_browser_btn.setEnabled(False)
             
-            # 清理临时文件
-            if hasattr(self, 'current_html_file') and self.current_html_file:
-                try:
-                    if os.path.exists(self.current_html_file):
-                        os.remove(self.current_html_file)
-                        self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 🧹 清理临时文件: {self.current_html_file}')
-                except:
-                    pass
-            
-            self.current_html_file = None
+            # 撤下已发布的轨迹数据
+            if self.current_track_path:
+                self.map_server.unpublish(self.current_track_path)
+            self.map_server.unpublish('/map/current.html')
+            self.current_track_path = None
+            self.current_map_document = None
+            self.pending_map_scripts = []
+            self.map_shell_loaded = False
+            self.live_stats = None
             self.last_file_path = None
             self.wgs84_positions = None
             
@@ -2372,16 +2717,17 @@ class GPSFoliumTracker(QMainWindow):
         """设置按钮状态"""
         # 基本按钮
         self.load_btn.setEnabled(True)
+        self.batch_btn.setEnabled(True)
         self.clear_btn.setEnabled(True)
         
         # 连接相关按钮
         self.connect_btn.setEnabled(True)
         
         # 根据条件启用/禁用其他按钮
-        export_enabled = enabled and (self.current_html_file is not None)
+        export_enabled = enabled and (self.current_map_document is not None)
         self.export_btn.setEnabled(export_enabled)
         
-        view_enabled = enabled and (self.current_html_file is not None)
+        view_enabled = enabled and (self.current_map_document is not None)
         self.view_browser_btn.setEnabled(view_enabled)
         
         # 截图管理按钮
@@ -2395,23 +2741,22 @@ class GPSFoliumTracker(QMainWindow):
     
     def closeEvent(self, event):
         """关闭事件"""
-        # 清理临时文件
-        if hasattr(self, 'current_html_file') and self.current_html_file:
-            try:
-                if os.path.exists(self.current_html_file):
-                    os.remove(self.current_html_file)
-                    self.log_text.append(f'[{datetime.now().strftime("%H:%M:%S")}] 🧹 清理临时文件: {self.current_html_file}')
-            except:
-                pass
+        # 停止地图服务
+        self.map_server.stop()
         
         # 终止处理线程
         if self.processing_thread and self.processing_thread.isRunning():
             self.processing_thread.terminate()
             self.processing_thread.wait()
         
-        # 终止GPS保存线程
+        # 等待目录同步线程结束
+        if self.catalog_scan_thread and self.catalog_scan_thread.isRunning():
+            self.catalog_scan_thread.wait()
+        
+        # 停止GPS保存线程并等待其写出缓冲的记录、关闭轨迹文件
         if self.gps_saver_thread:
             self.gps_saver_thread.stop()
+            self.gps_saver_thread.wait()
         
         event.accept()
 
@@ -0,0 +1,176 @@
+# map_assets.py - 地图页面静态资源本地化（Leaflet / Folium插件 / 字体）
+"""
+Folium生成的页面从CDN加载 Leaflet、Bootstrap、Font Awesome 以及各插件的JS/CSS，
+每次打开页面都要联网，没有网络时页面无法显示。这里把这些资源缓存到本地目录，由地图服务提供：
+    html = assets.localize(html)       页面中的 https://主机/路径 改为 /assets/主机/路径
+    server.add_route(ASSET_ROUTE, assets.route)
+    assets.prefetch(html)              有网络时一次下载页面引用的全部资源（含CSS中引用的字体和图片）
+
+本地路径与CDN路径一一对应，CSS中的相对地址（../fonts/...）自然解析到同一个代理下。
+已缓存的资源不会过期（CDN地址都带版本号）。
+本模块不依赖Qt。
+"""
+import os
+import re
+import time
+import threading
+import mimetypes
+import posixpath
+import urllib.error
+import urllib.request
+from urllib.parse import urljoin, urlsplit
+
+ASSET_ROUTE = '/assets/'
+ASSET_DIR = 'map_assets'
+FETCH_TIMEOUT = 10.0
+OFFLINE_BACKOFF = 30.0
+USER_AGENT = 'Mozilla/5.0 (GPSMapAssetCache)'
+
+mimetypes.add_type('font/woff2', '.woff2')
+mimetypes.add_type('font/woff', '.woff')
+mimetypes.add_type('font/ttf', '.ttf')
+mimetypes.add_type('application/vnd.ms-fontobject', '.eot')
+
+# 页面中的 src="https://..." / href="https://..."（script、link、img 标签）
+_HTML_URL = re.compile(r'\b(src|href)="(?:https?:)?//([^/"]+)(/[^"]*)"')
+# CSS中的 url(...)
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def local_path(host, path):
+    """CDN地址 → 本地代理路径"""
+    return f"{ASSET_ROUTE}{host}{path}"
+
+
+class AssetCache:
+    """
+    CDN静态资源的本地缓存（线程安全）
+
+    资源保存为 cache_dir/主机/路径；没有缓存时从 https://主机/路径 下载。
+    """
+
+    def __init__(self, cache_dir=ASSET_DIR, timeout=FETCH_TIMEOUT, offline_backoff=OFFLINE_BACKOFF,
+                 scheme='https'):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.offline_backoff = offline_backoff
+        self.scheme = scheme
+        self._offline_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'downloads': 0, 'failures': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def localize(self, html):
+        """把页面中CDN资源的地址改为本地代理地址"""
+        return _HTML_URL.sub(lambda m: f'{m.group(1)}="{local_path(m.group(2), m.group(3))}"', html)
+
+    def referenced(self, html):
+        """页面引用的全部CDN资源 [(主机, 路径)]"""
+        return [(m.group(2), m.group(3)) for m in _HTML_URL.finditer(html)]
+
+    def _split(self, path):
+        """代理路径 → (主机, 路径)；路径不合法返回None"""
+        if not path.startswith(ASSET_ROUTE):
+            return None
+        host, _, rest = path[len(ASSET_ROUTE):].partition('/')
+        rest = posixpath.normpath('/' + rest)
+        if not host or host.startswith('.') or rest == '/' or '\\' in host + rest:
+            return None
+        return host, rest
+
+    def _file(self, host, path):
+        return os.path.join(self.cache_dir, host, *path.lstrip('/').split('/'))
+
+    def get(self, host, path):
+        """缓存优先，未命中时下载并缓存；失败返回None"""
+        file_path = self._file(host, path)
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            self.stats['hits'] += 1
+            return data
+        except OSError:
+            pass
+        data = self.fetch(host, path)
+        if data is None:
+            return None
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, file_path)
+        return data
+
+    def fetch(self, host, path):
+        if time.time() < self._offline_until:
+            return None
+        url = f"{self.scheme}://{host}{path}"
+        try:
+            request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read()
+        except Exception as e:
+            self.stats['failures'] += 1
+            if not isinstance(e, urllib.error.HTTPError):
+                self._offline_until = time.time() + self.offline_backoff
+            print(f"下载地图资源失败 {url}: {e}")
+            return None
+        if path.endswith('.css'):
+            data = self.localize_css(data)
+        self.stats['downloads'] += 1
+        return data
+
+    def localize_css(self, data):
+        """CSS中以绝对地址引用的资源同样改为本地代理地址（相对地址不需要改）"""
+        def replace(match):
+            parts = urlsplit(match.group(2))
+            if parts.scheme not in ('http', 'https', '') or not parts.netloc:
+                return match.group(0)
+            return f"url({match.group(1)}{local_path(parts.netloc, parts.path)}{match.group(1)})"
+        return _CSS_URL.sub(replace, data.decode('utf-8', errors='replace')).encode('utf-8')
+
+    def css_references(self, host, path, data):
+        """CSS中引用的字体、图片 [(主机, 路径)]"""
+        base = local_path(host, path)
+        references = []
+        for match in _CSS_URL.finditer(data.decode('utf-8', errors='replace')):
+            target = match.group(2)
+            if target.startswith(('data:', '#')):
+                continue
+            split = self._split(urlsplit(urljoin(base, target)).path)
+            if split:
+                references.append(split)
+        return references
+
+    def route(self, path, query):
+        """MapServer.add_route(ASSET_ROUTE, assets.route) 的处理函数"""
+        split = self._split(path)
+        if split is None:
+            return None
+        data = self.get(*split)
+        if data is None:
+            return None
+        content_type = mimetypes.guess_type(split[1])[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        return 200, content_type, data
+
+    def prefetch(self, html):
+        """下载页面引用的全部资源和CSS中引用的资源，返回 (资源数, 失败数)"""
+        with self._lock:
+            self._offline_until = 0.0
+            pending = list(dict.fromkeys(self.referenced(html)))
+            seen = set(pending)
+            failed = 0
+            while pending:
+                host, path = pending.pop()
+                data = self.get(host, path)
+                if data is None:
+                    failed += 1
+                    continue
+                if path.endswith('.css'):
+                    for reference in self.css_references(host, path, data):
+                        if reference not in seen:
+                            seen.add(reference)
+                            pending.append(reference)
+            return len(seen), failed
@@ -0,0 +1,144 @@
+# map_server.py - 进程内地图HTTP服务
+"""
+在本机回环地址上提供地图页面和轨迹数据的HTTP服务（后台线程）。
+
+地图页面和轨迹数据都只保存在内存中：
+    publish(path, content)  发布一个资源，返回可供 QWebEngineView / 浏览器加载的URL
+    add_route(prefix, fn)   以 prefix 开头的路径交给 fn(path, query) 动态生成（瓦片代理等）
+
+不再把地图写入临时文件再读回，也不受 QWebEngineView.setHtml 的2MB大小限制。
+本模块不依赖Qt。
+"""
+import threading
+import mimetypes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class _Resource:
+    __slots__ = ('body', 'content_type')
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "GPSMapServer/1.0"
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        parts = urlsplit(self.path)
+        result = self.server.map_server.resolve(parts.path, parse_qs(parts.query))
+        if result is None:
+            self.send_error(404)
+            return
+        status, content_type, body, cache = result
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", cache)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        if send_body:
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 页面在加载过程中被切换
+
+    def log_message(self, format, *args):
+        pass  # 不在控制台输出每个请求
+
+
+class MapServer:
+    """
+    进程内HTTP服务（线程安全）
+
+    host 默认只监听本机回环地址；port 为0时由系统分配空闲端口。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self._resources = {}
+        self._routes = []
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def start(self):
+        if self._httpd is not None:
+            return self
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.map_server = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"地图服务已启动: {self.url('/')}")
+        return self
+
+    def stop(self):
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._httpd = None
+
+    @property
+    def running(self):
+        return self._httpd is not None
+
+    def url(self, path):
+        return f"http://{self.host}:{self.port}{path}"
+
+    def publish(self, path, content, content_type=None):
+        """发布（或替换）一个内存资源，返回其URL"""
+        body = content.encode('utf-8') if isinstance(content, str) else bytes(content)
+        if content_type is None:
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith(("text/", "application/json", "application/javascript")) \
+                and "charset" not in content_type:
+            content_type += "; charset=utf-8"
+        with self._lock:
+            self._resources[path] = _Resource(body, content_type)
+        return self.url(path)
+
+    def unpublish(self, path):
+        with self._lock:
+            self._resources.pop(path, None)
+
+    def add_route(self, prefix, handler):
+        """
+        以 prefix 开头的请求交给 handler(path, query) 处理
+
+        handler 返回 (状态码, Content-Type, bytes) 或 None（404）
+        """
+        with self._lock:
+            self._routes.append((prefix, handler))
+            self._routes.sort(key=lambda route: len(route[0]), reverse=True)
+
+    def resolve(self, path, query):
+        """返回 (状态码, Content-Type, bytes, Cache-Control) 或 None"""
+        with self._lock:
+            resource = self._resources.get(path)
+            routes = list(self._routes)
+        if resource is not None:
+            return 200, resource.content_type, resource.body, "no-store"
+        for prefix, handler in routes:
+            if path.startswith(prefix):
+                try:
+                    result = handler(path, query)
+                except Exception as e:
+                    print(f"地图服务处理 {path} 出错: {e}")
+                    return 500, "text/plain; charset=utf-8", str(e).encode('utf-8'), "no-store"
+                if result is None:
+                    return None
+                status, content_type, body = result
+                return status, content_type, body, "max-age=86400"
+        return None
@@ -0,0 +1,294 @@
+# map_tiles.py - 高德地图瓦片离线缓存（本地代理 + 预下载）
+"""
+地图页面不再直接请求高德瓦片服务器，而是请求本机地图服务的 /tiles/{z}/{x}/{y}.png：
+    - 磁盘上有缓存时直接返回，没有网络也能显示
+    - 没有缓存时从上游下载，保存后返回
+    - 缓存总大小超过上限时删除最久未使用的瓦片（LRU，按文件修改时间排序，重启后仍然有效）
+    - 上游连续失败时在一段时间内不再尝试，离线时缺失的瓦片立即返回404，不会逐个等待超时
+
+有网络时可以预先下载巡逻区域的全部瓦片：
+    python map_tiles.py prefetch --bbox 39.95,116.34,39.97,116.36 --zoom 14-19
+
+上游地址可以换成本地的替代瓦片服务器（--upstream），用于测试。
+本模块不依赖Qt。
+"""
+import os
+import re
+import sys
+import math
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+AMAP_TILES = 'http://webst02.is.autonavi.com/appmaptile?style=7&x={x}&y={y}&z={z}'
+TILE_ROUTE = '/tiles/'
+TILE_URL = TILE_ROUTE + '{z}/{x}/{y}.png'   # 地图页面使用的瓦片地址（相对地图服务）
+CACHE_DIR = 'tile_cache'
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+FETCH_TIMEOUT = 5.0
+OFFLINE_BACKOFF = 30.0   # 上游失败后暂停请求的秒数
+USER_AGENT = 'Mozilla/5.0 (GPSMapTileCache)'
+
+_TILE_PATH = re.compile(r'^' + re.escape(TILE_ROUTE) + r'(\d+)/(\d+)/(\d+)\.png$')
+
+
+def tile_xy(latitude, longitude, zoom):
+    """经纬度 → Web墨卡托瓦片坐标 (x, y)"""
+    n = 2 ** zoom
+    lat = math.radians(max(min(latitude, 85.05112878), -85.05112878))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_range(bbox, zoom):
+    """bbox = (最小纬度, 最小经度, 最大纬度, 最大经度) 在 zoom 级覆盖的瓦片 (x0, x1, y0, y1)，闭区间"""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    x0, y0 = tile_xy(max_lat, min_lon, zoom)   # 西北角
+    x1, y1 = tile_xy(min_lat, max_lon, zoom)   # 东南角
+    return x0, x1, y0, y1
+
+
+def iter_tiles(bbox, min_zoom, max_zoom):
+    """逐个生成 bbox 在各级覆盖的瓦片 (z, x, y)"""
+    for z in range(min_zoom, max_zoom + 1):
+        x0, x1, y0, y1 = tile_range(bbox, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+def count_tiles(bbox, min_zoom, max_zoom):
+    total = 0
+    for z in range(min_zoom, max_zoom + 1):
+        x0, x1, y0, y1 = tile_range(bbox, z)
+        total += (x1 - x0 + 1) * (y1 - y0 + 1)
+    return total
+
+
+def image_type(data):
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8'):
+        return 'image/jpeg'
+    return 'application/octet-stream'
+
+
+class TileCache:
+    """
+    磁盘瓦片缓存（线程安全）
+
+    cache_dir  缓存目录，瓦片保存为 {z}/{x}/{y}.tile
+    upstream   上游瓦片地址模板（含 {x} {y} {z}）
+    max_bytes  缓存总大小上限，超过时删除最久未使用的瓦片
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, upstream=AMAP_TILES, max_bytes=MAX_CACHE_BYTES,
+                 timeout=FETCH_TIMEOUT, offline_backoff=OFFLINE_BACKOFF):
+        self.cache_dir = cache_dir
+        self.upstream = upstream
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.offline_backoff = offline_backoff
+        self._lock = threading.Lock()
+        self._index = OrderedDict()   # (z, x, y) → 字节数，最久未使用的在前
+        self._total_bytes = 0
+        self._offline_until = 0.0
+        self.stats = {'hits': 0, 'misses': 0, 'downloads': 0, 'failures': 0, 'evictions': 0, 'offline_skips': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, z, x, y):
+        return os.path.join(self.cache_dir, str(z), str(x), f"{y}.tile")
+
+    def _load_index(self):
+        """扫描缓存目录，按修改时间恢复LRU顺序"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.tile'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    z, x = (int(part) for part in os.path.relpath(root, self.cache_dir).split(os.sep)[-2:])
+                    y = int(name[:-5])
+                    st = os.stat(path)
+                except (ValueError, OSError):
+                    continue
+                entries.append((st.st_mtime, (z, x, y), st.st_size))
+        entries.sort()
+        for _, key, size in entries:
+            self._index[key] = size
+            self._total_bytes += size
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._index
+
+    def cached(self, z, x, y):
+        """只读缓存（命中时更新LRU顺序），没有缓存返回None"""
+        key = (z, x, y)
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        path = self._path(z, x, y)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # 修改时间即最近使用时间
+        except OSError:
+            with self._lock:
+                size = self._index.pop(key, 0)
+                self._total_bytes -= size
+            return None
+        return data
+
+    def fetch(self, z, x, y):
+        """从上游下载一个瓦片，失败返回None；离线等待期内直接返回None"""
+        if time.time() < self._offline_until:
+            self.stats['offline_skips'] += 1
+            return None
+        url = self.upstream.format(x=x, y=y, z=z)
+        try:
+            request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read()
+        except Exception as e:
+            self.stats['failures'] += 1
+            # HTTP错误说明上游可达，只是没有这个瓦片；连接失败才认为离线
+            if not isinstance(e, urllib.error.HTTPError):
+                self._offline_until = time.time() + self.offline_backoff
+                print(f"瓦片服务器不可用，{self.offline_backoff:.0f} 秒内只使用缓存: {e}")
+            return None
+        if not data or image_type(data) == 'application/octet-stream':
+            self.stats['failures'] += 1
+            return None
+        self._offline_until = 0.0
+        self.stats['downloads'] += 1
+        return data
+
+    def store(self, z, x, y, data):
+        """写入缓存（先写临时文件再改名），然后按大小上限淘汰"""
+        path = self._path(z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        key = (z, x, y)
+        with self._lock:
+            self._total_bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, size = self._index.popitem(last=False)
+                self._total_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(*old_key))
+            except OSError:
+                pass
+        self.stats['evictions'] += len(evicted)
+
+    def get(self, z, x, y):
+        """缓存优先，未命中时下载并缓存；都失败返回None"""
+        data = self.cached(z, x, y)
+        if data is not None:
+            self.stats['hits'] += 1
+            return data
+        self.stats['misses'] += 1
+        data = self.fetch(z, x, y)
+        if data is not None:
+            self.store(z, x, y, data)
+        return data
+
+    def route(self, path, query):
+        """MapServer.add_route(TILE_ROUTE, cache.route) 的处理函数"""
+        match = _TILE_PATH.match(path)
+        if not match:
+            return None
+        data = self.get(*(int(v) for v in match.groups()))
+        if data is None:
+            return None
+        return 200, image_type(data), data
+
+    def prefetch(self, bbox, min_zoom, max_zoom, workers=4, progress_callback=None):
+        """
+        下载 bbox 在 min_zoom~max_zoom 级的全部瓦片（已缓存的跳过）
+
+        progress_callback(完成数, 总数) 每个瓦片调用一次；返回统计
+        """
+        tiles = [tile for tile in iter_tiles(bbox, min_zoom, max_zoom) if tile not in self]
+        total = count_tiles(bbox, min_zoom, max_zoom)
+        result = {'tiles': total, 'cached': total - len(tiles), 'downloaded': 0, 'failed': 0}
+        done = result['cached']
+        started = time.time()
+        self._offline_until = 0.0
+
+        def download(tile):
+            # 上游不可达时其余瓦片在离线等待期内立即失败，不逐个等待超时
+            data = self.fetch(*tile)
+            if data is not None:
+                self.store(*tile, data)
+            return data is not None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for ok in pool.map(download, tiles):
+                result['downloaded' if ok else 'failed'] += 1
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total)
+        result['elapsed'] = time.time() - started
+        result['cache_bytes'] = self._total_bytes
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='高德地图瓦片离线缓存')
+    sub = parser.add_subparsers(dest='command', required=True)
+    prefetch = sub.add_parser('prefetch', help='下载巡逻区域的瓦片')
+    prefetch.add_argument('--bbox', required=True, help='最小纬度,最小经度,最大纬度,最大经度（GCJ-02）')
+    prefetch.add_argument('--zoom', default='14-19', help='缩放级别范围，例如 14-19')
+    prefetch.add_argument('--workers', type=int, default=4)
+    sub.add_parser('info', help='显示缓存大小')
+    for command in (prefetch, sub.choices['info']):
+        command.add_argument('--cache', default=CACHE_DIR, help='缓存目录')
+        command.add_argument('--upstream', default=AMAP_TILES, help='上游瓦片地址模板')
+        command.add_argument('--max-mb', type=int, default=MAX_CACHE_BYTES // (1024 * 1024))
+    args = parser.parse_args(argv)
+
+    cache = TileCache(args.cache, args.upstream, args.max_mb * 1024 * 1024)
+    if args.command == 'info':
+        print(f"缓存目录: {args.cache}，{len(cache)} 个瓦片，{cache.total_bytes / 1024 / 1024:.1f} MB")
+        return 0
+
+    bbox = tuple(float(v) for v in args.bbox.split(','))
+    min_zoom, _, max_zoom = args.zoom.partition('-')
+    min_zoom, max_zoom = int(min_zoom), int(max_zoom or min_zoom)
+    print(f"需要 {count_tiles(bbox, min_zoom, max_zoom)} 个瓦片（{min_zoom}~{max_zoom} 级）")
+
+    def report(done, total):
+        if done == total or done % 100 == 0:
+            print(f"\r已完成 {done}/{total}", end='', flush=True)
+
+    result = cache.prefetch(bbox, min_zoom, max_zoom, args.workers, report)
+    print(f"\n下载 {result['downloaded']} 个，已有 {result['cached']} 个，失败 {result['failed']} 个，"
+          f"耗时 {result['elapsed']:.1f} 秒，缓存 {result['cache_bytes'] / 1024 / 1024:.1f} MB")
+    return 0 if not result['failed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
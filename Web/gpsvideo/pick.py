@@ -8,6 +8,9 @@ import json
 from threading import Thread, Lock
 from pathlib import Path
 
+from gps_framer import MarkerFramer
+from esp32_client import shared_client
+
 class ESP32FaceCatMonitor:
     def __init__(self, esp32_ip="192.168.4.1"):
         """
@@ -18,8 +21,8 @@ class ESP32FaceCatMonitor:
         """
         self.esp32_ip = esp32_ip
         self.stream_url = f"http://{esp32_ip}/stream"
-        self.gps_json_url = f"http://{esp32_ip}/gps/json"
-        self.status_url = f"http://{esp32_ip}/status"
+        # GPS轮询和连接测试共用的长连接客户端（视频流仍单独连接）
+        self.esp32 = shared_client(f"http://{esp32_ip}")
         self.base_save_dir = "detections"
         
         # 创建保存目录
@@ -82,7 +85,7 @@ class ESP32FaceCatMonitor:
         """持续更新GPS数据"""
         while self.is_monitoring:
             try:
-                response = requests.get(self.gps_json_url, timeout=2)
+                response = self.esp32.get('/gps/json')
                 if response.status_code == 200:
                     gps_data = response.json()
                     if gps_data.get("valid", False):
@@ -369,21 +372,14 @@ class ESP32FaceCatMonitor:
             print("✅ requests连接成功，开始监控...")
             print("按 'q' 键退出监控")
             
-            bytes_data = b""
+            framer = MarkerFramer(b'\xff\xd8', b'\xff\xd9')  # JPEG开始/结束标记
             frame_count = 0
             
             for chunk in response.iter_content(chunk_size=1024):
                 if not self.is_monitoring:
                     break
                 
-                bytes_data += chunk
-                a = bytes_data.find(b'\xff\xd8')  # JPEG开始标记
-                b = bytes_data.find(b'\xff\xd9')  # JPEG结束标记
-                
-                while a != -1 and b != -1:
-                    jpg_data = bytes_data[a:b+2]
-                    bytes_data = bytes_data[b+2:]
-                    
+                for jpg_data in framer.frames(chunk):
                     # 解码JPEG图像
                     frame = cv2.imdecode(
                         np.frombuffer(jpg_data, dtype=np.uint8), 
@@ -402,10 +398,6 @@ class ESP32FaceCatMonitor:
                         if cv2.waitKey(1) & 0xFF == ord('q'):
                             self.is_monitoring = False
                             break
-                    
-                    # 查找下一个JPEG帧
-                    a = bytes_data.find(b'\xff\xd8')
-                    b = bytes_data.find(b'\xff\xd9')
             
             return True
             
@@ -427,7 +419,7 @@ class ESP32FaceCatMonitor:
         
         # 测试基础连接
         try:
-            response = requests.get(f"http://{self.esp32_ip}", timeout=3)
+            response = self.esp32.get('/')
             print(f"✅ 成功连接到ESP32 (IP: {self.esp32_ip})")
         except Exception as e:
             print(f"❌ 无法连接到 {self.esp32_ip}: {e}")
@@ -439,7 +431,7 @@ class ESP32FaceCatMonitor:
         
         # 测试状态接口
         try:
-            response = requests.get(self.status_url, timeout=3)
+            response = self.esp32.get('/status')
             if response.status_code == 200:
                 print("✅ 摄像头状态正常")
             else:
@@ -449,7 +441,7 @@ class ESP32FaceCatMonitor:
         
         # 测试视频流
         try:
-            response = requests.get(self.stream_url, stream=True, timeout=5)
+            response = self.esp32.get('/stream', stream=True)
             if response.status_code == 200:
                 print("✅ 视频流可访问")
                 response.close()  # 关闭连接
@@ -460,7 +452,7 @@ class ESP32FaceCatMonitor:
         
         # 测试GPS
         try:
-            gps_response = requests.get(self.gps_json_url, timeout=3)
+            gps_response = self.esp32.get('/gps/json')
             gps_data = gps_response.json()
             if gps_data.get("valid", False):
                 sats = gps_data.get('satellites', 0)
@@ -470,6 +462,7 @@ class ESP32FaceCatMonitor:
         except Exception as e:
             print(f"⚠️  无法获取GPS数据: {e}")
         
+        print(f"请求统计: {self.esp32.format_stats()}")
         print("-" * 50)
         return True
     
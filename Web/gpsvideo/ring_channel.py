@@ -0,0 +1,133 @@
+# ring_channel.py - 有界环形通道（最新值合并 + 丢弃策略 + 溢出统计）
+"""
+线程之间传递数据用的有界通道，代替无界的 queue.Queue：
+    - 容量固定（deque(maxlen)），写满后按策略丢弃：DROP_OLDEST 丢弃最旧的（默认），DROP_NEWEST 丢弃新写入的
+    - latest() 取出最新的一项并丢弃其余积压（只关心当前状态的GPS、人脸、视频帧），
+      读取方不再用 empty()/get_nowait() 循环逐个取出
+    - 多个通道可以共用一个 threading.Event 作为"有新数据"信号，读取方 wait() 即可，不需要定时轮询
+    - 每个通道统计写入、读取、溢出丢弃、合并丢弃的数量和最高积压，
+      按名称登记，channel_stats() / format_channel_stats() 导出全部通道的统计
+
+    gps_channel = open_channel('gps', capacity=16, signal=data_ready)
+    gps_channel.put(gps_info)                  写入方，永不阻塞
+    data_ready.wait(0.05); data_ready.clear()
+    latest_gps = gps_channel.latest() or latest_gps
+
+长时间运行时内存上限为 容量 × 单项大小，不随运行时间增长。
+本模块不依赖Qt。
+"""
+import threading
+from collections import deque
+
+DROP_OLDEST = 'oldest'
+DROP_NEWEST = 'newest'
+
+
+class RingChannel:
+    """
+    有界环形通道（线程安全）
+
+    capacity  最多保留的项数
+    policy    写满时的丢弃策略，DROP_OLDEST / DROP_NEWEST
+    signal    可选的 threading.Event，每次写入后 set()
+    """
+
+    def __init__(self, name, capacity, policy=DROP_OLDEST, signal=None):
+        if capacity < 1:
+            raise ValueError("通道容量至少为1")
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"未知的丢弃策略: {policy}")
+        self.name = name
+        self.capacity = capacity
+        self.policy = policy
+        self.signal = signal
+        self._items = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self.stats = {'put': 0, 'get': 0, 'dropped': 0, 'coalesced': 0, 'high_water': 0}
+
+    def put(self, item):
+        """写入一项，返回是否保留（DROP_NEWEST 写满时返回False）"""
+        with self._lock:
+            stats = self.stats
+            stats['put'] += 1
+            if len(self._items) == self.capacity:
+                stats['dropped'] += 1
+                if self.policy == DROP_NEWEST:
+                    return False
+            self._items.append(item)   # 写满时 deque 自动丢弃最旧的一项
+            if len(self._items) > stats['high_water']:
+                stats['high_water'] = len(self._items)
+            self._not_empty.notify()
+        if self.signal is not None:
+            self.signal.set()
+        return True
+
+    def get(self, timeout=None):
+        """取出最旧的一项；timeout 秒内没有数据返回None（timeout=0 不等待）"""
+        with self._not_empty:
+            if not self._items and timeout != 0:
+                self._not_empty.wait_for(lambda: self._items, timeout)
+            if not self._items:
+                return None
+            self.stats['get'] += 1
+            return self._items.popleft()
+
+    def latest(self):
+        """取出最新的一项并丢弃其余积压；没有数据返回None"""
+        with self._lock:
+            if not self._items:
+                return None
+            item = self._items.pop()
+            self.stats['get'] += 1
+            self.stats['coalesced'] += len(self._items)
+            self._items.clear()
+            return item
+
+    def drain(self):
+        """取出全部积压（从旧到新）"""
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+            self.stats['get'] += len(items)
+            return items
+
+    def snapshot(self):
+        """当前积压的副本（不取出），例如查看最近的原始数据"""
+        with self._lock:
+            return list(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats, size=len(self._items), capacity=self.capacity, policy=self.policy)
+
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def open_channel(name, capacity, policy=DROP_OLDEST, signal=None):
+    """按名称创建并登记通道（同名通道返回已有实例）"""
+    with _channels_lock:
+        channel = _channels.get(name)
+        if channel is None:
+            channel = _channels[name] = RingChannel(name, capacity, policy, signal)
+        return channel
+
+
+def channel_stats():
+    """{通道名: 统计}"""
+    with _channels_lock:
+        channels = list(_channels.values())
+    return {channel.name: channel.summary() for channel in channels}
+
+
+def format_channel_stats():
+    lines = []
+    for name, s in channel_stats().items():
+        lines.append(f"{name}: 写入 {s['put']}，读取 {s['get']}，溢出丢弃 {s['dropped']}，合并丢弃 {s['coalesced']}，"
+                     f"最高积压 {s['high_water']}/{s['capacity']}")
+    return "\n".join(lines)
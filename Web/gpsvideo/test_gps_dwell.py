@@ -0,0 +1,96 @@
+# test_gps_dwell.py - 采集中停止时的停留段写出检查
+"""
+按 GPSDataSaver 的写入顺序（DwellCompressor.push → GPSTrackWriter.append，停止时 flush 后 close）
+保存轨迹，再用 load_track_columns 读回，检查停留中途停止采集时最后一段停留的时长和暂存的低速点。
+
+    python -m unittest test_gps_dwell
+
+本模块不依赖Qt。
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from gps_dwell import DwellCompressor, DWELL_MIN_SECONDS
+from gps_track import GPSTrackWriter, load_track_columns, read_track, FLAG_DWELL_START, FLAG_DWELL_END
+
+START = 1700000000.0
+LAT, LON = 39.9, 116.3
+
+
+def moving(count, start=START):
+    """每秒一个点、每秒向北约11米"""
+    return [{'time': start + i, 'lat': LAT + i * 1e-4, 'lon': LON, 'altitude': 50.0,
+             'speed_knots': 12.0, 'course': 0.0, 'satellites': 9} for i in range(count)]
+
+
+def stationary(count, start):
+    """每秒一个点、原地抖动不到1米"""
+    return [{'time': start + i, 'lat': LAT + 0.01 + (i % 2) * 5e-6, 'lon': LON, 'altitude': 50.0,
+             'speed_knots': 0.2, 'course': 0.0, 'satellites': 9} for i in range(count)]
+
+
+class StopMidDwellTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'track.gpstrk')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def save(self, fixes, flush_on_stop=True):
+        """与 GPSDataSaver.run 相同：逐点压缩写入，停止时写出压缩器中剩余的记录再关闭"""
+        # 批量写入间隔远大于测试时长：记录只在 close() 时写入文件
+        writer = GPSTrackWriter(self.path, flush_interval=60.0, fsync_interval=60.0)
+        dwell = DwellCompressor()
+
+        def write(records):
+            for fix, flags in records:
+                writer.append(fix['time'], fix['lat'], fix['lon'], fix['altitude'],
+                              fix['speed_knots'], fix['course'], fix['satellites'], flags)
+
+        for fix in fixes:
+            write(dwell.push(fix))
+        if flush_on_stop:
+            write(dwell.flush())
+        writer.close()
+
+    def test_final_dwell_duration(self):
+        fixes = moving(10) + stationary(20, START + 10)
+        self.save(fixes)
+
+        flags = read_track(self.path)['flags']
+        self.assertEqual(flags[-2], FLAG_DWELL_START)
+        self.assertEqual(flags[-1], FLAG_DWELL_END)
+
+        columns = load_track_columns(self.path)
+        self.assertEqual(len(columns), 11)
+        self.assertEqual(columns.time[-1], START + 10)
+        self.assertAlmostEqual(columns.dwell[-1], 19.0, places=3)
+        np.testing.assert_array_equal(columns.dwell[:-1], 0.0)
+
+    def test_pending_slow_points_are_kept(self):
+        # 停留时长不足 DWELL_MIN_SECONDS 时停止：暂存的低速点原样写出
+        short = int(DWELL_MIN_SECONDS) - 1
+        self.save(moving(10) + stationary(short, START + 10))
+
+        columns = load_track_columns(self.path)
+        self.assertEqual(len(columns), 10 + short)
+        self.assertEqual(columns.time[-1], START + 10 + short - 1)
+        np.testing.assert_array_equal(columns.dwell, 0.0)
+
+    def test_without_flush_dwell_is_lost(self):
+        # 对照：不调用 flush() 就关闭，停留开始没有结束记录，读回时停留时长为0
+        self.save(moving(10) + stationary(20, START + 10), flush_on_stop=False)
+
+        columns = load_track_columns(self.path)
+        self.assertEqual(read_track(self.path)['flags'][-1], FLAG_DWELL_START)
+        self.assertEqual(columns.dwell[-1], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,12 +4,18 @@ import socket
 import threading
 import time
 import os
-import queue
 import numpy as np
 from datetime import datetime
 import json
 import subprocess
 import platform
+import sys
+
+# 共享的GPS采集组件位于 ../gpsvideo
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gpsvideo'))
+from log_writer import open_log, close_all_logs
+from gps_framer import PacketFramer, KIND_GPS, KIND_FACE
+from ring_channel import open_channel, format_channel_stats, DROP_OLDEST
 
 # ========== 配置参数 ==========
 ESP32_IP = "192.168.4.1"  # ESP32热点IP
@@ -21,6 +27,11 @@ SAVE_DIR = "./captured_data"
 GPS_DATA_FILE = f"{SAVE_DIR}/gps_log.txt"
 FACE_DATA_FILE = f"{SAVE_DIR}/face_log.txt"
 SYNC_DATA_FILE = f"{SAVE_DIR}/sync_data.json"
+RAW_DATA_FILE = f"{SAVE_DIR}/raw_data.log"
+
+# 日志写入策略：文件常开，0.5秒批量写入，5秒落盘，单个文件超过20MB轮转
+LOG_OPTIONS = {'flush_interval': 0.5, 'fsync_interval': 5.0, 'max_bytes': 20 * 1024 * 1024}
+RECORD_SEPARATOR = "-" * 50 + "\n"  # GPS/人脸日志每条记录以分隔线结束
 
 # 创建保存目录
 if not os.path.exists(SAVE_DIR):
@@ -28,11 +39,14 @@ if not os.path.exists(SAVE_DIR):
 
 print(f"数据保存目录: {os.path.abspath(SAVE_DIR)}")
 
-# ========== 数据队列 ==========
-gps_data_queue = queue.Queue()
-face_data_queue = queue.Queue()
-frame_queue = queue.Queue(maxsize=10)  # 限制队列大小避免内存溢出
-raw_data_queue = queue.Queue()
+# ========== 数据通道 ==========
+# 有界环形通道：写满时丢弃最旧的数据，显示循环只取最新值，长时间运行内存不增长
+data_ready = threading.Event()  # 任一通道有新数据时置位，显示循环等待该信号而不是定时轮询
+gps_data_channel = open_channel('gps', capacity=16, policy=DROP_OLDEST, signal=data_ready)
+face_data_channel = open_channel('face', capacity=16, policy=DROP_OLDEST, signal=data_ready)
+frame_channel = open_channel('frame', capacity=2, policy=DROP_OLDEST, signal=data_ready)  # 每帧约900KB
+raw_data_channel = open_channel('raw', capacity=256, policy=DROP_OLDEST)  # 最近的原始数据包
+DISPLAY_REFRESH = 0.1  # 没有新数据时刷新状态和时间的间隔（秒）
 
 # ========== 全局状态变量 ==========
 running = True
@@ -219,7 +233,7 @@ def wifi_receiver_thread(sock):
     """接收WiFi数据的线程"""
     global running, socket_connected
     
-    buffer = ""
+    framer = PacketFramer(callback=handle_packet)  # 以换行符或#结束的数据包
     empty_counter = 0  # 空数据计数器
     
     # 发送启动命令
@@ -254,42 +268,12 @@ def wifi_receiver_thread(sock):
             
             empty_counter = 0  # 重置计数器
             
-            # 解码数据
-            decoded_data = data.decode('utf-8', errors='ignore')
-            buffer += decoded_data
-            
             # 输出原始数据（调试用）
-            if len(decoded_data.strip()) > 0:
-                print(f"收到原始数据: {decoded_data[:100]}...")
+            if data.strip():
+                print(f"收到原始数据: {data[:100].decode('utf-8', errors='ignore')}...")
             
             # 处理完整的数据包（以换行符或#结束）
-            while buffer and ('\n' in buffer or '#' in buffer):
-                # 先查找换行符
-                if '\n' in buffer:
-                    line_end = buffer.find('\n')
-                    packet = buffer[:line_end].strip()
-                    buffer = buffer[line_end + 1:]
-                # 再查找#作为分隔符
-                elif '#' in buffer:
-                    hash_end = buffer.find('#')
-                    packet = buffer[:hash_end].strip()
-                    buffer = buffer[hash_end + 1:]
-                    packet += '#'
-                else:
-                    break
-                
-                if packet:
-                    print(f"处理数据包: {packet[:80]}...")
-                    
-                    # 保存原始数据
-                    timestamp = datetime.now()
-                    raw_data_queue.put({
-                        'data': packet,
-                        'timestamp': timestamp
-                    })
-                    
-                    # 解析数据类型
-                    parse_data_packet(packet, timestamp)
+            framer.feed(data)
                     
         except socket.timeout:
             # 正常超时，继续循环
@@ -308,22 +292,36 @@ def wifi_receiver_thread(sock):
     print("WiFi接收线程结束")
 
 # ========== 数据包解析函数 ==========
-def parse_data_packet(packet, timestamp):
-    """解析接收到的数据包"""
+def handle_packet(record):
+    """分帧器回调：处理一个完整的数据包"""
+    packet = record.text
+    print(f"处理数据包: {packet[:80]}...")
+    
+    # 保存原始数据
+    timestamp = datetime.now()
+    raw_data_channel.put({
+        'data': packet,
+        'timestamp': timestamp
+    })
+    
+    # 解析数据类型
+    parse_data_packet(packet, timestamp, record.kind)
+
+def parse_data_packet(packet, timestamp, kind):
+    """解析接收到的数据包（kind 为分帧器判断的记录类型）"""
     
     # 保存原始数据到文件
     try:
-        with open(f"{SAVE_DIR}/raw_data.log", "a", encoding='utf-8') as f:
-            f.write(f"[{timestamp.strftime('%H:%M:%S.%f')[:-3]}] {packet}\n")
+        open_log(RAW_DATA_FILE, **LOG_OPTIONS).write(f"[{timestamp.strftime('%H:%M:%S.%f')[:-3]}] {packet}\n")
     except:
         pass
     
     # 解析GPS数据
-    if packet.startswith("$GPS,"):
+    if kind == KIND_GPS:
         parse_gps_data(packet, timestamp)
     
     # 解析人脸数据
-    elif packet.startswith("$FACE,"):
+    elif kind == KIND_FACE:
         parse_face_data(packet, timestamp)
     
     # 解析串口调试信息
@@ -361,7 +359,7 @@ def parse_gps_data(packet, timestamp):
         }
         
         # 添加到队列
-        gps_data_queue.put(gps_info)
+        gps_data_channel.put(gps_info)
         
         # 输出到控制台
         if gps_info['is_valid']:
@@ -401,7 +399,7 @@ def parse_face_data(packet, timestamp):
         }
         
         # 添加到队列
-        face_data_queue.put(face_info)
+        face_data_channel.put(face_info)
         
         # 输出到控制台
         print(f"👤 人脸检测: 位置({face_info['center_x']}, {face_info['center_y']}), "
@@ -427,26 +425,14 @@ def video_stream_thread(cap):
             if ret and frame is not None:
                 error_counter = 0  # 重置错误计数器
                 
-                # 限制帧率，避免队列溢出
+                # 限制帧率；通道写满时自动丢弃最旧的帧
                 frame_counter += 1
                 if frame_counter % 3 == 0:  # 大约10fps
-                    try:
-                        frame_queue.put_nowait({
-                            'frame': frame.copy(),
-                            'timestamp': datetime.now(),
-                            'frame_id': frame_counter
-                        })
-                    except queue.Full:
-                        # 队列已满，丢弃最旧的帧
-                        try:
-                            frame_queue.get_nowait()
-                            frame_queue.put_nowait({
-                                'frame': frame.copy(),
-                                'timestamp': datetime.now(),
-                                'frame_id': frame_counter
-                            })
-                        except:
-                            pass
+                    frame_channel.put({
+                        'frame': frame.copy(),
+                        'timestamp': datetime.now(),
+                        'frame_id': frame_counter
+                    })
             else:
                 error_counter += 1
                 if error_counter > 5:  # 连续5次读取失败
@@ -468,21 +454,21 @@ def video_stream_thread(cap):
 def save_gps_to_file(gps_info):
     """保存GPS数据到文件"""
     try:
-        with open(GPS_DATA_FILE, "a", encoding='utf-8') as f:
-            timestamp = gps_info['timestamp'].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-            f.write(f"时间: {timestamp}\n")
-            f.write(f"原始数据: {gps_info['raw']}\n")
-            
-            if gps_info['is_valid']:
-                f.write(f"UTC时间: {gps_info['utc_time']}\n")
-                f.write(f"纬度: {gps_info['latitude']} {gps_info['ns_indicator']}\n")
-                f.write(f"经度: {gps_info['longitude']} {gps_info['ew_indicator']}\n")
-                f.write(f"速度: {gps_info['speed']:.1f} 节\n")
-                f.write(f"航向: {gps_info['course']:.1f} 度\n")
-            else:
-                f.write("状态: 无GPS信号\n")
-            
-            f.write("-" * 50 + "\n")
+        timestamp = gps_info['timestamp'].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        lines = [f"时间: {timestamp}\n", f"原始数据: {gps_info['raw']}\n"]
+        
+        if gps_info['is_valid']:
+            lines.append(f"UTC时间: {gps_info['utc_time']}\n")
+            lines.append(f"纬度: {gps_info['latitude']} {gps_info['ns_indicator']}\n")
+            lines.append(f"经度: {gps_info['longitude']} {gps_info['ew_indicator']}\n")
+            lines.append(f"速度: {gps_info['speed']:.1f} 节\n")
+            lines.append(f"航向: {gps_info['course']:.1f} 度\n")
+        else:
+            lines.append("状态: 无GPS信号\n")
+        
+        lines.append(RECORD_SEPARATOR)
+        # 整条记录一次写入，断电时不完整的末尾记录在下次打开时被截掉
+        open_log(GPS_DATA_FILE, record_separator=RECORD_SEPARATOR, **LOG_OPTIONS).write("".join(lines))
             
     except Exception as e:
         print(f"保存GPS数据失败: {e}")
@@ -490,14 +476,14 @@ def save_gps_to_file(gps_info):
 def save_face_to_file(face_info):
     """保存人脸数据到文件"""
     try:
-        with open(FACE_DATA_FILE, "a", encoding='utf-8') as f:
-            timestamp = face_info['timestamp'].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-            f.write(f"时间: {timestamp}\n")
-            f.write(f"原始数据: {face_info['raw']}\n")
-            f.write(f"中心X: {face_info['center_x']}\n")
-            f.write(f"中心Y: {face_info['center_y']}\n")
-            f.write(f"人脸ID: {face_info['face_id']}\n")
-            f.write("-" * 50 + "\n")
+        timestamp = face_info['timestamp'].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        record = (f"时间: {timestamp}\n"
+                  f"原始数据: {face_info['raw']}\n"
+                  f"中心X: {face_info['center_x']}\n"
+                  f"中心Y: {face_info['center_y']}\n"
+                  f"人脸ID: {face_info['face_id']}\n"
+                  f"{RECORD_SEPARATOR}")
+        open_log(FACE_DATA_FILE, record_separator=RECORD_SEPARATOR, **LOG_OPTIONS).write(record)
             
     except Exception as e:
         print(f"保存人脸数据失败: {e}")
@@ -562,7 +548,8 @@ def main_display_loop():
     # 最新数据缓存
     latest_gps = None
     latest_face = None
-    latest_frame = None
+    latest_frame = None  # 保留上一帧用于显示
+    saved_frame_id = None  # 最近一次保存同步数据所用帧的ID，同一帧不重复保存
     
     while running:
         current_time = time.time()
@@ -574,26 +561,14 @@ def main_display_loop():
                 # 这里可以添加重新连接逻辑
             connection_check_time = current_time
         
-        # 获取最新GPS数据
-        try:
-            while not gps_data_queue.empty():
-                latest_gps = gps_data_queue.get_nowait()
-        except queue.Empty:
-            pass
-        
-        # 获取最新人脸数据
-        try:
-            while not face_data_queue.empty():
-                latest_face = face_data_queue.get_nowait()
-        except queue.Empty:
-            pass
-        
-        # 获取最新帧
-        try:
-            latest_frame = frame_queue.get_nowait()
+        # 取各通道的最新值（积压的旧数据合并丢弃），没有新数据时保留上一次的值
+        data_ready.clear()
+        latest_gps = gps_data_channel.latest() or latest_gps
+        latest_face = face_data_channel.latest() or latest_face
+        frame = frame_channel.latest()
+        if frame:
+            latest_frame = frame
             frame_counter += 1
-        except queue.Empty:
-            latest_frame = None
         
         # 显示帧
         display_frame = None
@@ -661,10 +636,11 @@ def main_display_loop():
         # 显示窗口
         cv2.imshow('ESP32摄像头+GPS监控系统 (按q退出)', display_frame)
         
-        # 每2秒保存一次同步数据
+        # 每2秒保存一次同步数据（只在上次保存后收到过新帧时保存，视频流中断后不重复写旧帧）
         if current_time - last_sync_time > 2.0:
-            if latest_frame:
+            if latest_frame and latest_frame['frame_id'] != saved_frame_id:
                 save_sync_data(latest_gps, latest_face, latest_frame)
+                saved_frame_id = latest_frame['frame_id']
                 last_sync_time = current_time
         
         # 按键处理
@@ -678,6 +654,7 @@ def main_display_loop():
             print("手动保存当前状态...")
             if latest_frame:
                 save_sync_data(latest_gps, latest_face, latest_frame)
+                saved_frame_id = latest_frame['frame_id']
         elif key == ord('r'):
             # 重新连接
             print("重新连接...")
@@ -689,8 +666,8 @@ def main_display_loop():
             test_port_connection()
             test_http_stream()
         
-        # 控制循环频率
-        time.sleep(0.01)
+        # 等待新数据（最多 DISPLAY_REFRESH 秒，以便刷新状态和时间）
+        data_ready.wait(DISPLAY_REFRESH)
 
 # ========== 主函数 ==========
 def main():
@@ -762,6 +739,9 @@ def main():
         
         cv2.destroyAllWindows()
         
+        # 写出缓冲区中的日志并关闭文件
+        close_all_logs()
+        
         # 保存总结
         save_summary()
         
@@ -781,6 +761,8 @@ def save_summary():
             f.write(f"GPS数据文件: {GPS_DATA_FILE}\n")
             f.write(f"人脸数据文件: {FACE_DATA_FILE}\n")
             f.write(f"同步数据文件: {SYNC_DATA_FILE}\n")
+            f.write("数据通道统计:\n")
+            f.write(format_channel_stats() + "\n")
             f.write("=" * 40 + "\n")
         print(f"会话总结已保存到: {summary_file}")
     except Exception as e:
@@ -8,14 +8,29 @@ import sys
 import os
 import subprocess
 
+# 共享的GPS采集组件位于 ../gpsvideo
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gpsvideo'))
+from log_writer import open_log, close_all_logs
+from gps_framer import KIND_BINARY
+from gps_ingest import IngestServer
+from gps_telemetry import TelemetryFramer, FrameError, decode_frame
+
+CSV_HEADER = "local_time,client_ip,utc_time,latitude,lat_dir,longitude,lon_dir,status,lat_decimal,lon_decimal\n"
+
 class EnhancedGPSReceiver:
-    def __init__(self, host='0.0.0.0', port=8080):
+    def __init__(self, host='0.0.0.0', port=8080, mode='selector'):
         self.host = host
         self.port = port
+        # 'selector': 单线程事件循环处理全部连接（gps_ingest）；'thread': 每个连接一个线程
+        self.mode = mode
         self.server_socket = None
+        self.ingest = None
         self.running = False
         self.clients = {}
+        self.bad_frames = 0  # 校验失败的二进制帧数
         self.debug_mode = True  # 开启调试模式
+        # 日志写入策略：1秒批量写入，5秒落盘，单个文件超过50MB轮转
+        self.log_options = {'flush_interval': 1.0, 'fsync_interval': 5.0, 'max_bytes': 50 * 1024 * 1024}
         
     def display_network_info(self):
         """显示网络信息"""
@@ -60,6 +75,8 @@ class EnhancedGPSReceiver:
     
     def start_server(self):
         """启动TCP服务器"""
+        if self.mode == 'selector':
+            return self.start_selector_server()
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -87,6 +104,52 @@ class EnhancedGPSReceiver:
             print(f"❌ 未知错误: {e}")
             return False
     
+    def start_selector_server(self):
+        """启动单线程事件循环服务器，所有设备连接在同一个线程中处理"""
+        self.ingest = IngestServer(
+            self.host, self.port,
+            handler=lambda record, client: self.process_client_data(record, client.address, client.id),
+            framer_class=TelemetryFramer,
+            on_connect=self.on_client_connect,
+            on_disconnect=self.on_client_disconnect)
+        try:
+            self.ingest.start()
+        except PermissionError:
+            print(f"❌ 权限错误: 请尝试使用管理员权限运行")
+            return False
+        except OSError as e:
+            print(f"❌ 启动服务器失败: {e}")
+            print(f"💡 尝试: 1. 更换端口 2. 检查防火墙 3. 使用管理员权限")
+            return False
+
+        self.running = True
+        print(f"\n✅ 服务器启动成功！（单线程事件循环）")
+        print(f"📡 监听地址: {self.host}:{self.port}")
+        print(f"🔧 调试模式: {'开启' if self.debug_mode else '关闭'}")
+        print("\n等待设备连接...")
+        print("按 Ctrl+C 停止服务器\n")
+        try:
+            self.ingest.serve_forever()
+        except KeyboardInterrupt:
+            print("\n\n🛑 收到停止信号，正在关闭服务器...")
+        finally:
+            self.cleanup()
+        return True
+
+    def on_client_connect(self, client):
+        print(f"\n📱 新设备连接: {client.id}")
+        print(f"   🕐 时间: {datetime.now().strftime('%H:%M:%S')}")
+
+    def on_client_disconnect(self, client, reason):
+        if reason == 'closed':
+            print(f"\n🔌 设备断开连接: {client.id}")
+        elif reason == 'reset':
+            print(f"\n❌ 连接重置: {client.id}")
+        elif reason == 'idle':
+            print(f"\n⏱️  设备 {self.ingest.idle_timeout:.0f} 秒没有数据，关闭连接: {client.id}")
+        if reason != 'shutdown':
+            print(f"🗑️  清理客户端: {client.id}")
+
     def accept_clients(self):
         """接受客户端连接"""
         try:
@@ -131,8 +194,11 @@ class EnhancedGPSReceiver:
     
     def handle_client(self, client_socket, client_address):
         """处理客户端通信"""
-        buffer = ""
         client_id = f"{client_address[0]}:{client_address[1]}"
+        # 按行（或二进制帧）分帧，每条完整的记录交给 process_client_data
+        framer = TelemetryFramer(
+            callback=lambda record: self.process_client_data(record, client_address, client_id),
+            delimiters=b'\n')
         
         try:
             while self.running:
@@ -147,24 +213,11 @@ class EnhancedGPSReceiver:
                     if client_id in self.clients:
                         self.clients[client_id]['last_active'] = datetime.now()
                     
-                    # 解码数据
-                    try:
-                        data_str = data.decode('utf-8', errors='ignore')
-                    except:
-                        data_str = data.decode('latin-1', errors='ignore')
-                    
-                    if self.debug_mode and len(data_str.strip()) > 0:
-                        print(f"[DEBUG {client_id}] 收到原始数据: {data_str[:100]}")
-                    
-                    buffer += data_str
+                    if self.debug_mode and data.strip():
+                        print(f"[DEBUG {client_id}] 收到原始数据: {data[:100].decode('utf-8', errors='ignore')}")
                     
                     # 处理完整的数据行
-                    while '\n' in buffer:
-                        line, buffer = buffer.split('\n', 1)
-                        line = line.strip()
-                        
-                        if line:
-                            self.process_client_data(line, client_address, client_id)
+                    framer.feed(data)
                             
                 except socket.timeout:
                     # 发送心跳或保持连接
@@ -192,8 +245,12 @@ class EnhancedGPSReceiver:
                 del self.clients[client_id]
                 print(f"🗑️  清理客户端: {client_id}")
     
-    def process_client_data(self, data_str, client_address, client_id):
-        """处理客户端发送的数据"""
+    def process_client_data(self, record, client_address, client_id):
+        """处理客户端发送的一条记录（gps_framer.Record，二进制遥测帧或文本行）"""
+        if record.kind == KIND_BINARY:
+            self.process_telemetry_frame(record.data, client_address, client_id)
+            return
+        data_str = record.text
         # 过滤AT指令响应
         if any(at_cmd in data_str for at_cmd in ["AT", "OK", "ERROR", "SEND", "CONNECT", "CLOSED"]):
             if self.debug_mode:
@@ -224,6 +281,32 @@ class EnhancedGPSReceiver:
             if self.debug_mode:
                 print(f"解析错误 [{client_id}]: {e}")
     
+    def process_telemetry_frame(self, frame, client_address, client_id):
+        """解码二进制遥测帧（gps_telemetry），坐标直接是十进制度，不经过JSON和度分字符串"""
+        try:
+            fix = decode_frame(frame)
+        except FrameError as e:
+            self.bad_frames += 1
+            if self.debug_mode:
+                print(f"[BIN {client_id}] 丢弃: {e}")
+            return
+        seconds = int(fix.time) % 86400
+        gps_data = {
+            'time': f"{seconds // 3600:02d}{seconds // 60 % 60:02d}{seconds % 60:02d}",
+            'status': 'A' if fix.valid else 'V',
+            'lat': self.decimal_to_nmea(abs(fix.lat), 2),
+            'lat_dir': 'N' if fix.lat >= 0 else 'S',
+            'lon': self.decimal_to_nmea(abs(fix.lon), 3),
+            'lon_dir': 'E' if fix.lon >= 0 else 'W',
+            'lat_decimal': fix.lat,
+            'lon_decimal': fix.lon,
+            'speed_knots': fix.speed_knots,
+            'satellites': fix.satellites,
+            'source': 'BIN'
+        }
+        self.display_gps_info(gps_data, client_address, client_id)
+        self.save_gps_data(gps_data, client_address)
+
     def parse_nmea_data(self, nmea_str, client_address, client_id):
         """解析NMEA格式数据"""
         try:
@@ -306,9 +389,12 @@ class EnhancedGPSReceiver:
                 print(f"📍 纬度: {lat} {lat_dir}")
                 print(f"📍 经度: {lon} {lon_dir}")
                 
-                # 转换坐标
-                lat_dec = self.nmea_to_decimal(lat, lat_dir)
-                lon_dec = self.nmea_to_decimal(lon, lon_dir)
+                # 转换坐标（二进制帧已带十进制度）
+                lat_dec = gps_data.get('lat_decimal', None)
+                lon_dec = gps_data.get('lon_decimal', None)
+                if lat_dec is None or lon_dec is None:
+                    lat_dec = self.nmea_to_decimal(lat, lat_dir)
+                    lon_dec = self.nmea_to_decimal(lon, lon_dir)
                 
                 if lat_dec != 0.0 and lon_dec != 0.0:
                     print(f"🔢 纬度(度): {lat_dec:.6f}°")
@@ -352,11 +438,17 @@ class EnhancedGPSReceiver:
                 print(f"坐标转换错误: {e}")
             return 0.0
     
+    def decimal_to_nmea(self, value, degree_digits):
+        """十进制度转NMEA度分格式（纬度 ddmm.mmmm，经度 dddmm.mmmm）"""
+        # 以万分之一分为单位取整，避免出现 60.0000 分
+        total = int(value * 600000.0 + 0.5)
+        degrees, minutes = divmod(total, 600000)
+        return f"{degrees:0{degree_digits}d}{minutes // 10000:02d}.{minutes % 10000:04d}"
+
     def save_gps_data(self, gps_data, client_address):
         """保存GPS数据"""
         try:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            csv_file = "gps_data.csv"
             
             # 准备数据
             lat = gps_data.get('lat', '')
@@ -366,27 +458,23 @@ class EnhancedGPSReceiver:
             status = gps_data.get('status', 'V')
             utc_time = gps_data.get('time', '')
             
-            lat_dec = self.nmea_to_decimal(lat, lat_dir)
-            lon_dec = self.nmea_to_decimal(lon, lon_dir)
-            
-            # 检查文件是否存在
-            file_exists = os.path.isfile(csv_file)
+            lat_dec = gps_data.get('lat_decimal', None)
+            lon_dec = gps_data.get('lon_decimal', None)
+            if lat_dec is None or lon_dec is None:
+                lat_dec = self.nmea_to_decimal(lat, lat_dir)
+                lon_dec = self.nmea_to_decimal(lon, lon_dir)
             
-            with open(csv_file, 'a', encoding='utf-8') as f:
-                if not file_exists:
-                    f.write("local_time,client_ip,utc_time,latitude,lat_dir,longitude,lon_dir,status,lat_decimal,lon_decimal\n")
-                
-                f.write(f"{timestamp},{client_address[0]},{utc_time},{lat},{lat_dir},{lon},{lon_dir},{status},{lat_dec:.6f},{lon_dec:.6f}\n")
+            # 共享写入器保持文件常开，所有客户端线程的数据批量写入
+            csv_log = open_log("gps_data.csv", header=CSV_HEADER, **self.log_options)
+            csv_log.write(f"{timestamp},{client_address[0]},{utc_time},{lat},{lat_dir},{lon},{lon_dir},{status},{lat_dec:.6f},{lon_dec:.6f}\n")
             
             # 同时保存到日志
-            log_file = "gps_log.txt"
-            with open(log_file, 'a', encoding='utf-8') as f:
-                log_entry = f"[{timestamp}] {client_address[0]} - "
-                if status == 'A':
-                    log_entry += f"定位: {lat}{lat_dir}, {lon}{lon_dir} ({lat_dec:.6f}, {lon_dec:.6f})\n"
-                else:
-                    log_entry += "无效定位\n"
-                f.write(log_entry)
+            log_entry = f"[{timestamp}] {client_address[0]} - "
+            if status == 'A':
+                log_entry += f"定位: {lat}{lat_dir}, {lon}{lon_dir} ({lat_dec:.6f}, {lon_dec:.6f})\n"
+            else:
+                log_entry += "无效定位\n"
+            open_log("gps_log.txt", **self.log_options).write(log_entry)
                 
         except Exception as e:
             if self.debug_mode:
@@ -398,7 +486,7 @@ class EnhancedGPSReceiver:
         
         print("\n🛑 正在关闭服务器...")
         
-        # 关闭所有客户端连接
+        # 关闭所有客户端连接（事件循环模式下 serve_forever 结束时已经关闭）
         for client_id, client_info in list(self.clients.items()):
             try:
                 client_info['socket'].close()
@@ -413,8 +501,16 @@ class EnhancedGPSReceiver:
             except:
                 pass
         
+        # 写出缓冲区中的数据并关闭日志文件
+        close_all_logs()
+        
         print(f"\n📊 服务器统计:")
-        print(f"   总连接数: {len(self.clients)}")
+        if self.bad_frames:
+            print(f"   校验失败的二进制帧: {self.bad_frames}")
+        if self.ingest is not None:
+            print(f"   {self.ingest.format_stats()}")
+        else:
+            print(f"   总连接数: {len(self.clients)}")
         print(f"   运行时间: {datetime.now().strftime('%H:%M:%S')}")
         print("=" * 60)
         print("✅ 服务器已安全关闭")
@@ -448,7 +544,11 @@ class EnhancedGPSReceiver:
             sys.exit(0)
         
         # 启动服务器
-        if self.start_server():
+        if self.mode == 'selector':
+            # 事件循环在 start_server 中阻塞运行，返回时服务器已经关闭
+            if not self.start_server():
+                print("\n❌ 服务器启动失败")
+        elif self.start_server():
             print("\n🎉 服务器运行中...")
         else:
             print("\n❌ 服务器启动失败")